@@ -0,0 +1,47 @@
+"""Add stations market_id
+
+Revision ID: d221053d5d07
+Revises: 2920a950c2dc
+Create Date: 2025-05-24 14:12:31.508122
+
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d221053d5d07"
+down_revision: str | None = "2920a950c2dc"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("stations", sa.Column("market_id", sa.BigInteger(), nullable=True), schema="core")
+
+    # Spansh station ids are Frontier market ids. Carriers that moved can have left stale rows behind with the same
+    # id, so only the most recently updated row per id gets it.
+    op.execute(
+        """
+        update core.stations as st
+        set market_id = st.id_spansh
+        from (
+            select distinct on (id_spansh) id
+            from core.stations
+            where id_spansh is not null
+            order by id_spansh, spansh_updated_at desc nulls last, id desc
+        ) as latest
+        where st.id = latest.id
+        """
+    )
+
+    op.create_index(op.f("ix_core_stations_market_id"), "stations", ["market_id"], unique=True, schema="core")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_core_stations_market_id"), table_name="stations", schema="core")
+    op.drop_column("stations", "market_id", schema="core")
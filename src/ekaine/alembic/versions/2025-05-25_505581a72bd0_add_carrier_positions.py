@@ -0,0 +1,69 @@
+"""Add carrier positions
+
+Revision ID: 505581a72bd0
+Revises: d221053d5d07
+Create Date: 2025-05-25 10:42:07.913554
+
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+from ekaine.common.constants import SQL_DIR
+
+views_sql_dir = SQL_DIR / "views"
+
+# revision identifiers, used by Alembic.
+revision: str = "505581a72bd0"
+down_revision: str | None = "d221053d5d07"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "carrier_positions",
+        sa.Column("station_id", sa.Integer(), nullable=False),
+        sa.Column("system_address", sa.BigInteger(), nullable=False),
+        sa.Column("system_id", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["station_id"], ["core.stations.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("station_id"),
+        schema="core",
+        postgresql_with={"fillfactor": 50},
+    )
+    op.create_index(
+        op.f("ix_core_carrier_positions_system_id"), "carrier_positions", ["system_id"], unique=False, schema="core"
+    )
+
+    op.create_table(
+        "carrier_jumps",
+        sa.Column("id", sa.Integer(), nullable=False, autoincrement=True),
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("station_id", sa.Integer(), nullable=False),
+        sa.Column("system_address", sa.BigInteger(), nullable=False),
+        sa.Column("system_id", sa.Integer(), nullable=True),
+        sa.Column("is_backfilled", sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint("id", "timestamp"),
+        schema="timescaledb",
+    )
+    op.execute("SELECT create_hypertable('timescaledb.carrier_jumps', by_range('timestamp'), if_not_exists => TRUE);")
+
+    with open(views_sql_dir / "derived_resolved_stations_view_v2.sql") as f:
+        op.execute(f.read())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("drop view if exists derived.station_commodities_view")
+    with open(views_sql_dir / "derived_resolved_stations_view_v1.sql") as f:
+        op.execute(f.read())
+    with open(views_sql_dir / "derived_station_commodities_view_v1.sql") as f:
+        op.execute(f.read())
+
+    op.drop_table("carrier_jumps", schema="timescaledb")
+    op.drop_index(op.f("ix_core_carrier_positions_system_id"), table_name="carrier_positions", schema="core")
+    op.drop_table("carrier_positions", schema="core")
@@ -0,0 +1,50 @@
+"""Add systems coords N-D index
+
+Revision ID: 64750ca98b15
+Revises: 505581a72bd0
+Create Date: 2025-05-26 09:12:44.301872
+
+"""
+
+from typing import Sequence
+
+from alembic import op
+
+from ekaine.common.constants import SQL_DIR
+
+functions_sql_dir = SQL_DIR / "functions"
+
+# revision identifiers, used by Alembic.
+revision: str = "64750ca98b15"
+down_revision: str | None = "505581a72bd0"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # N-D so the z axis is indexed too. The range functions prefilter with the 3D `&&&` operator.
+    op.create_index(
+        "ix_core_systems_coords_nd",
+        "systems",
+        ["coords"],
+        unique=False,
+        schema="core",
+        postgresql_using="gist",
+        postgresql_ops={"coords": "gist_geometry_ops_nd"},
+    )
+
+    with open(functions_sql_dir / "derived_get_acquirable_systems_from_origin_v2.sql") as f:
+        op.execute(f.read())
+    with open(functions_sql_dir / "derived_get_expandable_systems_in_range_v2.sql") as f:
+        op.execute(f.read())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with open(functions_sql_dir / "derived_get_acquirable_systems_from_origin_v1.sql") as f:
+        op.execute(f.read())
+    with open(functions_sql_dir / "derived_get_expandable_systems_in_range_v1.sql") as f:
+        op.execute(f.read())
+
+    op.drop_index("ix_core_systems_coords_nd", table_name="systems", schema="core")
@@ -0,0 +1,91 @@
+"""Add station commodities table
+
+Revision ID: 839395475e93
+Revises: 64750ca98b15
+Create Date: 2025-05-26 15:37:09.584120
+
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+from ekaine.common.constants import SQL_DIR
+
+functions_sql_dir = SQL_DIR / "functions"
+views_sql_dir = SQL_DIR / "views"
+
+# revision identifiers, used by Alembic.
+revision: str = "839395475e93"
+down_revision: str | None = "64750ca98b15"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "station_commodities",
+        sa.Column("station_id", sa.Integer(), nullable=False),
+        sa.Column("commodity_sym", sa.Text(), nullable=False),
+        sa.Column("system_id", sa.Integer(), nullable=True),
+        sa.Column("system_name", sa.Text(), nullable=True),
+        sa.Column("station_name", sa.Text(), nullable=False),
+        sa.Column("type", sa.Text(), nullable=True),
+        sa.Column("distance_to_arrival", sa.Float(), nullable=True),
+        sa.Column("sell_price", sa.Integer(), nullable=True),
+        sa.Column("demand", sa.Integer(), nullable=True),
+        sa.Column("buy_price", sa.Integer(), nullable=True),
+        sa.Column("supply", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["station_id"], ["core.stations.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("station_id", "commodity_sym"),
+        schema="derived",
+    )
+    op.create_index(
+        op.f("ix_derived_station_commodities_system_id"),
+        "station_commodities",
+        ["system_id"],
+        unique=False,
+        schema="derived",
+    )
+    op.create_index(
+        "ix_derived_station_commodities_commodity_sym_sell_price",
+        "station_commodities",
+        ["commodity_sym", "sell_price"],
+        unique=False,
+        schema="derived",
+    )
+
+    with open(functions_sql_dir / "derived_refresh_station_commodities_v1.sql") as f:
+        op.execute(f.read())
+    op.execute(
+        "select derived.refresh_station_commodities(array(select distinct station_id from core.market_commodities))"
+    )
+
+    with open(views_sql_dir / "derived_station_commodities_view_v2.sql") as f:
+        op.execute(f.read())
+    with open(functions_sql_dir / "derived_get_top_sell_commodities_in_system_v2.sql") as f:
+        op.execute(f.read())
+    with open(functions_sql_dir / "derived_get_top_buy_commodities_in_system_v2.sql") as f:
+        op.execute(f.read())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with open(functions_sql_dir / "derived_get_top_sell_commodities_in_system_v1.sql") as f:
+        op.execute(f.read())
+    with open(functions_sql_dir / "derived_get_top_buy_commodities_in_system_v1.sql") as f:
+        op.execute(f.read())
+    # v1 has fewer columns, which `create or replace view` can't do
+    op.execute("drop view if exists derived.station_commodities_view")
+    with open(views_sql_dir / "derived_station_commodities_view_v1.sql") as f:
+        op.execute(f.read())
+
+    op.execute("drop function if exists derived.refresh_station_commodities")
+    op.drop_index(
+        "ix_derived_station_commodities_commodity_sym_sell_price", table_name="station_commodities", schema="derived"
+    )
+    op.drop_index(op.f("ix_derived_station_commodities_system_id"), table_name="station_commodities", schema="derived")
+    op.drop_table("station_commodities", schema="derived")
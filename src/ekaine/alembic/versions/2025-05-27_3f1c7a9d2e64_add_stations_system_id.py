@@ -0,0 +1,94 @@
+"""Add stations system_id and body_id
+
+Revision ID: 3f1c7a9d2e64
+Revises: 839395475e93
+Create Date: 2025-05-27 10:12:41.208853
+
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+from ekaine.common.constants import SQL_DIR
+
+functions_sql_dir = SQL_DIR / "functions"
+views_sql_dir = SQL_DIR / "views"
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c7a9d2e64"
+down_revision: str | None = "839395475e93"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("stations", sa.Column("system_id", sa.Integer(), nullable=True), schema="core")
+    op.add_column("stations", sa.Column("body_id", sa.Integer(), nullable=True), schema="core")
+
+    op.execute(
+        """update core.stations as st set system_id = sy.id
+        from core.systems as sy
+        where st.owner_type = 'system' and st.owner_id = sy.id"""
+    )
+    op.execute(
+        """update core.stations as st set system_id = b.system_id, body_id = b.id
+        from core.bodies as b
+        where st.owner_type = 'body' and st.owner_id = b.id"""
+    )
+    # Stations whose owner row is gone can still be placed if they're carriers with a known position
+    op.execute(
+        """update core.stations as st set system_id = cp.system_id
+        from core.carrier_positions as cp
+        join core.systems as sy on sy.id = cp.system_id
+        where st.system_id is null and st.id = cp.station_id"""
+    )
+
+    # Anything left has no system we can resolve. Rather than guess (or delete the stations and their market data),
+    # stop here so whoever is running the migration can fix or remove those rows first.
+    conn = op.get_bind()
+    unresolved = conn.execute(sa.text("select count(*) from core.stations where system_id is null")).scalar_one()
+    if unresolved:
+        # The migration's transaction (and with it the new column) is rolled back, so describe them without it
+        raise RuntimeError(
+            f"{unresolved} stations are owned by a system or body that isn't in core.systems/core.bodies and have no "
+            "carrier position to fall back on. Fix or delete them, then rerun the migration."
+        )
+    op.alter_column("stations", "system_id", nullable=False, schema="core")
+
+    op.create_index(op.f("ix_core_stations_system_id"), "stations", ["system_id"], unique=False, schema="core")
+    op.create_index(op.f("ix_core_stations_body_id"), "stations", ["body_id"], unique=False, schema="core")
+    op.create_foreign_key(
+        "stations_system_id_fkey",
+        "stations",
+        "systems",
+        ["system_id"],
+        ["id"],
+        source_schema="core",
+        referent_schema="core",
+    )
+    op.create_foreign_key(
+        "stations_body_id_fkey", "stations", "bodies", ["body_id"], ["id"], source_schema="core", referent_schema="core"
+    )
+
+    with open(views_sql_dir / "derived_resolved_stations_view_v3.sql") as f:
+        op.execute(f.read())
+    with open(functions_sql_dir / "derived_refresh_station_commodities_v2.sql") as f:
+        op.execute(f.read())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with open(functions_sql_dir / "derived_refresh_station_commodities_v1.sql") as f:
+        op.execute(f.read())
+    with open(views_sql_dir / "derived_resolved_stations_view_v2.sql") as f:
+        op.execute(f.read())
+
+    op.drop_constraint("stations_body_id_fkey", "stations", schema="core", type_="foreignkey")
+    op.drop_constraint("stations_system_id_fkey", "stations", schema="core", type_="foreignkey")
+    op.drop_index(op.f("ix_core_stations_body_id"), table_name="stations", schema="core")
+    op.drop_index(op.f("ix_core_stations_system_id"), table_name="stations", schema="core")
+    op.drop_column("stations", "body_id", schema="core")
+    op.drop_column("stations", "system_id", schema="core")
@@ -0,0 +1,92 @@
+"""Add reinforcement mining routes table
+
+Revision ID: a8d40e1f5b37
+Revises: 3f1c7a9d2e64
+Create Date: 2025-05-27 14:48:03.551902
+
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+from ekaine.common.constants import SQL_DIR
+
+functions_sql_dir = SQL_DIR / "functions"
+
+# revision identifiers, used by Alembic.
+revision: str = "a8d40e1f5b37"
+down_revision: str | None = "3f1c7a9d2e64"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "reinforcement_mining_routes",
+        sa.Column("ring_id", sa.Integer(), nullable=False),
+        sa.Column("station_id", sa.Integer(), nullable=False),
+        sa.Column("commodity_sym", sa.Text(), nullable=False),
+        sa.Column("system_id", sa.Integer(), nullable=False),
+        sa.Column("system_name", sa.Text(), nullable=False),
+        sa.Column("body_name", sa.Text(), nullable=False),
+        sa.Column("ring_name", sa.Text(), nullable=False),
+        sa.Column("ring_type", sa.Text(), nullable=True),
+        sa.Column("count", sa.Integer(), nullable=True),
+        sa.Column("controlling_power", sa.Text(), nullable=False),
+        sa.Column("power_state", sa.Text(), nullable=True),
+        sa.Column("station_name", sa.Text(), nullable=False),
+        sa.Column("distance_to_arrival", sa.Float(), nullable=True),
+        sa.Column("sell_price", sa.Integer(), nullable=True),
+        sa.Column("demand", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["ring_id"], ["core.rings.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["station_id"], ["core.stations.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("ring_id", "station_id", "commodity_sym"),
+        schema="derived",
+    )
+    op.create_index(
+        op.f("ix_derived_reinforcement_mining_routes_system_id"),
+        "reinforcement_mining_routes",
+        ["system_id"],
+        unique=False,
+        schema="derived",
+    )
+    op.create_index(
+        "ix_derived_reinforcement_mining_routes_power_updated_at",
+        "reinforcement_mining_routes",
+        ["controlling_power", "updated_at"],
+        unique=False,
+        schema="derived",
+    )
+
+    with open(functions_sql_dir / "derived_refresh_reinforcement_mining_routes_v1.sql") as f:
+        op.execute(f.read())
+    op.execute(
+        "select derived.refresh_reinforcement_mining_routes("
+        "array(select id from core.systems where controlling_power is not null))"
+    )
+
+    with open(functions_sql_dir / "api_get_top_reinforcement_mining_routes_v2.sql") as f:
+        op.execute(f.read())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with open(functions_sql_dir / "api_get_top_reinforcement_mining_routes_v1.sql") as f:
+        op.execute(f.read())
+
+    op.execute("drop function if exists derived.refresh_reinforcement_mining_routes")
+    op.drop_index(
+        "ix_derived_reinforcement_mining_routes_power_updated_at",
+        table_name="reinforcement_mining_routes",
+        schema="derived",
+    )
+    op.drop_index(
+        op.f("ix_derived_reinforcement_mining_routes_system_id"),
+        table_name="reinforcement_mining_routes",
+        schema="derived",
+    )
+    op.drop_table("reinforcement_mining_routes", schema="derived")
@@ -1,5 +1,6 @@
 # Data comes from Spansh and EDSM dumps
 from pathlib import Path
+from typing import Any
 
 import yaml
 
@@ -35,6 +36,9 @@ STRINGS_YAML_FMT = "strings.*.yaml"
 GEN_DIR = REL_ROOT_PATH / "src" / "gen"  # Hehe...
 EDDN_SCHEMAS_DIR = DATA_DIR / "eddn" / "schemas"
 EDDN_SCHEMA_MAPPING_FILE = GEN_DIR / "eddn_schema_to_model_mapping.json"
+EDDN_SPOOL_DIR = DATA_DIR / "eddn_spool"
+EDDN_ARCHIVE_DIR = DATA_DIR / "eddn_archives"
+EDDN_CACHE_SNAPSHOT_FILE = DATA_DIR / "eddn_caches.snapshot"
 
 # Others
 SQL_DIR = REL_ROOT_PATH / "src" / "ekaine" / "postgresql" / "sql"
@@ -49,3 +53,11 @@ if not CONFIG_FILE.exists():
 with CONFIG_FILE.open("r") as file:
     data = yaml.safe_load(file)
     DISCORD_BOT_TOKEN = data.get("discord_bot", {}).get("token", "NO_TOKEN")
+
+    eddn_config = data.get("eddn") or {}
+    EDDN_SYSTEM_COALESCE_SECONDS = float(eddn_config.get("system_coalesce_seconds", 30))
+    EDDN_TIMESERIES_GRANULARITY_SECONDS = float(eddn_config.get("timeseries_granularity_seconds", 300))
+    EDDN_DEGRADED_LAG_SECONDS = float(eddn_config.get("degraded_lag_seconds", 60))
+    EDDN_RECORD_CARRIER_JUMPS = bool(eddn_config.get("record_carrier_jumps", True))
+    EDDN_CACHE_SNAPSHOT_SECONDS = float(eddn_config.get("cache_snapshot_seconds", 300))
+    EDDN_LANES_CONFIG: dict[str, dict[str, Any]] | None = eddn_config.get("lanes")
@@ -0,0 +1,214 @@
+import bisect
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+from ekaine.common.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Minimal Prometheus text exposition (format 0.0.4) so the long running processes can be scraped without pulling
+# in a client library. Only what we use is implemented: labelled counters, gauges and cumulative histograms.
+
+type LabelValues = tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def format_labels(names: tuple[str, ...], values: LabelValues, extra: dict[str, str] | None = None) -> str:
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{escape_label_value(value)}"' for name, value in (extra or {}).items())
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+
+    def label_values(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric '{self.name}' expects labels {self.labelnames} but got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError("Metric.samples() unimplemented")
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError(f"Counter '{self.name}' can only be incremented!")
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(self.label_values(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            yield f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+
+
+class Gauge(Metric):
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(self.label_values(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            yield f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: (non-cumulative bucket counts incl. +Inf, sum, count)
+        self.values: dict[LabelValues, tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.label_values(labels)
+        with self.lock:
+            counts, total, count = self.values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def get_count(self, **labels: str) -> int:
+        entry = self.values.get(self.label_values(labels))
+        return entry[2] if entry is not None else 0
+
+    def samples(self) -> Iterator[str]:
+        with self.lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self.values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                labels = format_labels(self.labelnames, key, {"le": format_value(bound)})
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(total)}"
+            yield f"{self.name}_count{format_labels(self.labelnames, key)} {count}"
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.metrics: dict[str, Metric] = {}
+        self.lock = threading.Lock()
+
+    def register[M: Metric](self, metric: M) -> M:
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"A metric named '{metric.name}' is already registered!")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def make_handler(registry: MetricsRegistry) -> type[BaseHTTPRequestHandler]:
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: object) -> None:
+            pass  # Scrapes every few seconds would drown out the actual logs
+
+    return MetricsHandler
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0", registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    """Serves `registry` in the Prometheus text format on http://host:port/metrics from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), make_handler(registry))
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logger.info(f"[Metrics] Serving Prometheus metrics on http://{host}:{server.server_port}/metrics")
+    return server
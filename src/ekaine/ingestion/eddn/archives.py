@@ -0,0 +1,49 @@
+import bz2
+import gzip
+import lzma
+from pathlib import Path
+from typing import IO, Callable, Iterator, cast
+
+# EDDN archive dumps are JSONL files of full relay messages (`$schemaRef`, `header`, `message`), usually compressed
+ARCHIVE_OPENERS: dict[str, Callable[[Path], IO[bytes]]] = {
+    ".gz": lambda path: cast(IO[bytes], gzip.open(path, "rb")),
+    ".bz2": lambda path: bz2.open(path, "rb"),
+    ".xz": lambda path: lzma.open(path, "rb"),
+    ".jsonl": lambda path: path.open("rb"),
+}
+
+
+def is_archive(path: Path) -> bool:
+    return path.is_file() and path.suffix in ARCHIVE_OPENERS and ".jsonl" in path.suffixes
+
+
+def list_archives(paths: list[Path]) -> list[Path]:
+    """Expands directories to the archives in them. Returned in name order, which for dated dumps is time order."""
+    archives: set[Path] = set()
+    for path in paths:
+        if path.is_dir():
+            archives.update(child for child in path.iterdir() if is_archive(child))
+        elif is_archive(path):
+            archives.add(path)
+        else:
+            raise ValueError(f"Not an EDDN archive (*.jsonl, *.jsonl.gz, *.jsonl.bz2, *.jsonl.xz): '{path}'")
+    return sorted(archives)
+
+
+def read_archive_chunks(path: Path, chunk_lines: int) -> Iterator[list[bytes]]:
+    """Yields the non-blank lines of the archive at `path` in chunks of up to `chunk_lines`
+
+    Chunks only depend on the file and `chunk_lines`, so re-running a backfill sees the exact same chunks.
+    """
+    chunk: list[bytes] = []
+    with ARCHIVE_OPENERS[path.suffix](path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            chunk.append(line)
+            if len(chunk) >= chunk_lines:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,217 @@
+import json
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, fields
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, cast
+
+from sqlalchemy import CursorResult, Table, text
+from sqlalchemy.orm import Session
+
+from ekaine.common.constants import EDDN_TIMESERIES_GRANULARITY_SECONDS
+from ekaine.common.logging import get_logger
+from ekaine.ingestion.eddn.archives import list_archives, read_archive_chunks
+from ekaine.ingestion.eddn.caches import faction_ids, system_addresses
+from ekaine.ingestion.eddn.coalescer import TimeseriesSampler
+from ekaine.ingestion.eddn.listener import cache_snapshotter
+from ekaine.ingestion.eddn.metrics import EDDN_SCHEMA_PREFIX
+from ekaine.ingestion.eddn.processors.journal_v1_0 import (
+    model_to_faction_name_to_id_mapping,
+)
+from ekaine.ingestion.eddn.routing import MessageRouter
+from ekaine.postgresql import BaseModel, SessionLocal, engine
+from ekaine.postgresql.timeseries import (
+    FactionPresencesTimeseries,
+    PowerConflictProgressTimeseries,
+    SystemsTimeseries,
+)
+from ekaine.postgresql.utils import copy_rows
+from gen.eddn_models import journal_v1_0
+
+logger = get_logger(__name__)
+
+DEFAULT_CHUNK_LINES = 20_000
+
+# The journal events the live listener writes timeseries from
+BACKFILL_EVENTS = frozenset({"FSDJump", "Location"})
+
+# Rows are only inserted if their table doesn't have a row for the same key in the same timeseries granularity
+# bucket yet, which is what makes re-runs (and backfilling periods the live listener already covered) safe
+BACKFILL_KEYS: dict[type[BaseModel], tuple[str, ...]] = {
+    SystemsTimeseries: ("system_id",),
+    FactionPresencesTimeseries: ("system_id", "faction_id"),
+    PowerConflictProgressTimeseries: ("system_id", "power_name"),
+}
+
+
+@dataclass
+class BackfillStats:
+    lines: int = 0
+    invalid: int = 0
+    dropped: int = 0
+    unknown_systems: int = 0
+    copied: int = 0
+    inserted: int = 0
+
+    def add(self, other: "BackfillStats") -> None:
+        for field in fields(self):
+            setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+
+
+def backfill_columns(model: type[BaseModel]) -> list[str]:
+    return [col.name for col in model.__table__.columns if col.name != "id"]
+
+
+def rows_from_chunk(session: Session, lines: list[bytes], stats: BackfillStats) -> dict[type[BaseModel], list[Any]]:
+    """Converts a chunk of archived messages to timeseries rows with the same converters the journal processor uses"""
+    router = MessageRouter()
+    router.add_route(f"{EDDN_SCHEMA_PREFIX}journal/1", journal_v1_0, BACKFILL_EVENTS)
+    # Archives are in time order, so only the first message per system per granularity bucket is converted
+    sampler: TimeseriesSampler[int] = TimeseriesSampler(EDDN_TIMESERIES_GRANULARITY_SECONDS)
+    rows: dict[type[BaseModel], list[Any]] = {model: [] for model in BACKFILL_KEYS}
+
+    for line in lines:
+        stats.lines += 1
+        try:
+            d = json.loads(line)
+            route = router.route(d) if isinstance(d, dict) else None
+            if route is None:
+                stats.dropped += 1
+                continue
+            model = journal_v1_0.Model.model_validate(d)
+        except Exception:
+            logger.debug(traceback.format_exc())
+            stats.invalid += 1
+            continue
+
+        msg = model.message
+        system_id = system_addresses.resolve(session, msg.SystemAddress) if msg.SystemAddress is not None else None
+        if system_id is None:
+            stats.unknown_systems += 1
+            continue
+        if not sampler.should_sample(system_id, msg.timestamp):
+            stats.dropped += 1
+            continue
+
+        faction_id_mapping = model_to_faction_name_to_id_mapping(session, model)
+        controlling_faction_name = (getattr(msg, "SystemFaction", None) or {}).get("Name")
+        controlling_faction_id = faction_id_mapping.get(controlling_faction_name) if controlling_faction_name else None
+        rows[SystemsTimeseries].append(SystemsTimeseries.to_dict_from_eddn(model, system_id, controlling_faction_id))
+        rows[FactionPresencesTimeseries].extend(
+            FactionPresencesTimeseries.to_dicts_from_eddn(model, system_id, faction_id_mapping)
+        )
+        rows[PowerConflictProgressTimeseries].extend(
+            PowerConflictProgressTimeseries.to_dicts_from_eddn(model, system_id)
+        )
+
+    for model_rows in rows.values():
+        for row in model_rows:
+            row["is_backfilled"] = True
+    return rows
+
+
+def insert_backfilled_rows(session: Session, model: type[BaseModel], rows: list[dict[str, Any]]) -> tuple[int, int]:
+    """COPYs `rows` into a staging table and moves over the ones not already covered. Returns (copied, inserted)."""
+    if not rows:
+        return 0, 0
+
+    model_table = cast(Table, model.__table__)
+    table = model_table.fullname
+    staging = f"backfill_{model_table.name}"
+    columns = backfill_columns(model)
+    keys = BACKFILL_KEYS[model]
+
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    session.execute(
+        text(
+            f"create temp table if not exists {staging} on commit delete rows as "
+            f"select {column_list} from {table} with no data"
+        )
+    )
+    copied = copy_rows(session, staging, columns, rows)
+
+    key_list = ", ".join(f'"{key}"' for key in keys)
+    key_matches = " and ".join(f't."{key}" = s."{key}"' for key in keys)
+    # Serializes concurrent chunks writing the same table, so two chunks can't both decide a bucket is empty
+    session.execute(text("select pg_advisory_xact_lock(hashtext(:table))"), {"table": table})
+    result = session.execute(
+        text(
+            f"""insert into {table} ({column_list})
+            select distinct on ({key_list}, bucket) {column_list}
+            from (
+                select *, date_bin(:granularity, "timestamp", timestamp '1970-01-01') as bucket from {staging}
+            ) as s
+            where not exists (
+                select 1 from {table} as t
+                where {key_matches} and t."timestamp" >= s.bucket and t."timestamp" < s.bucket + :granularity
+            )
+            order by {key_list}, bucket, "timestamp"
+            """
+        ),
+        {"granularity": timedelta(seconds=max(EDDN_TIMESERIES_GRANULARITY_SECONDS, 1))},
+    )
+    return copied, cast(CursorResult[Any], result).rowcount
+
+
+def backfill_chunk(lines: list[bytes]) -> BackfillStats:
+    """Runs in a worker process. Each chunk is written (or not) in a single transaction."""
+    stats = BackfillStats()
+    session = SessionLocal()
+    try:
+        rows = rows_from_chunk(session, lines, stats)
+        for model, model_rows in rows.items():
+            copied, inserted = insert_backfilled_rows(session, model, model_rows)
+            stats.copied += copied
+            stats.inserted += inserted
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return stats
+
+
+def init_worker() -> None:
+    # Connections inherited from the parent process must not be shared with it
+    engine.dispose(close=False)
+    session = SessionLocal()
+    try:
+        cache_snapshotter.restore(session)
+        system_addresses.ensure_loaded(session)
+        faction_ids.ensure_loaded(session)
+    finally:
+        session.close()
+
+
+def backfill_archives(paths: list[Path], workers: int = 4, chunk_lines: int = DEFAULT_CHUNK_LINES) -> BackfillStats:
+    """Backfills timeseries from EDDN archives, decompressing in this process and converting + writing in `workers`"""
+    archives = list_archives(paths)
+    logger.info(f"[EDDN Backfill] Backfilling from {len(archives)} archives with {workers} workers")
+
+    total = BackfillStats()
+    started_at = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        pending: list[Future[BackfillStats]] = []
+        for archive in archives:
+            logger.info(f"[EDDN Backfill] Reading '{archive}'")
+            for chunk in read_archive_chunks(archive, chunk_lines):
+                # Bounds how many decompressed chunks are held in memory at once
+                while len(pending) >= workers * 2:
+                    total.add(pending.pop(0).result())
+                pending.append(pool.submit(backfill_chunk, chunk))
+        for future in pending:
+            total.add(future.result())
+
+    logger.info(
+        f"[EDDN Backfill] {total.lines} lines in {time.monotonic() - started_at:.1f}s: {total.inserted} rows inserted "
+        f"of {total.copied} copied, {total.unknown_systems} messages for unknown systems, {total.dropped} dropped, "
+        f"{total.invalid} invalid"
+    )
+    return total
+
+
+def main(paths: list[Path], workers: int = 4, chunk_lines: int = DEFAULT_CHUNK_LINES) -> None:
+    backfill_archives(paths, workers, chunk_lines)
@@ -0,0 +1,385 @@
+import json
+import random
+import threading
+import time
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import zmq
+from sqlalchemy import create_engine, event, make_url, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from tabulate import tabulate
+
+from ekaine.common.logging import get_logger
+from ekaine.common.utils import seconds_to_str
+from ekaine.ingestion.eddn.listener import (
+    build_router,
+    decode_frame,
+    flush_processors,
+    import_generated_models,
+    process_routed_message,
+)
+from ekaine.ingestion.eddn.spool import read_spool
+from ekaine.postgresql import DATABASE_URL, session_scope
+
+logger = get_logger(__name__)
+
+DEFAULT_RELAY_PORT = 9599
+END_OF_CORPUS = b""
+
+# Unix socket connections (no host) are local too
+LOCAL_DB_HOSTS = frozenset({None, "localhost", "127.0.0.1", "::1"})
+
+COMMODITY_SCHEMA = "https://eddn.edcd.io/schemas/commodity/3"
+JOURNAL_SCHEMA = "https://eddn.edcd.io/schemas/journal/1"
+FSSSIGNALDISCOVERED_SCHEMA = "https://eddn.edcd.io/schemas/fsssignaldiscovered/1"
+
+# Rough shape of live relay traffic for the message types we have processors for
+SYNTHETIC_MIX = {
+    "commodity": 0.30,
+    "FSDJump": 0.35,
+    "Location": 0.15,
+    "fsssignaldiscovered": 0.20,
+}
+
+
+class LocalRelay(threading.Thread):
+    """Stand-in for the EDDN relay: a local ZMQ PUB socket publishing a fixed corpus of frames
+
+    Publishes `END_OF_CORPUS` once every frame has been sent so subscribers know when to stop.
+    """
+
+    def __init__(self, ctx: zmq.Context[Any], url: str, frames: list[bytes], warmup_seconds: float = 1.0) -> None:
+        super().__init__(name="eddn-local-relay", daemon=True)
+        self.pub = ctx.socket(zmq.PUB)
+        self.pub.setsockopt(zmq.SNDHWM, 0)  # Never drop; the benchmark measures the consumer, not the relay
+        self.pub.bind(url)
+        self.frames = frames
+        self.warmup_seconds = warmup_seconds
+
+    def run(self) -> None:
+        time.sleep(self.warmup_seconds)  # Give subscribers time to connect (ZMQ "slow joiner")
+        for frame in self.frames:
+            self.pub.send_multipart([frame])
+        self.pub.send_multipart([END_OF_CORPUS])
+        self.pub.close(linger=-1)
+
+
+class RoundTripCounter:
+    """Counts DB round-trips (cursor executions) issued through `engine` while active"""
+
+    def __init__(self, counted_engine: Engine) -> None:
+        self.engine = counted_engine
+        self.count = 0
+
+    def on_execute(self, *args: Any) -> None:
+        self.count += 1
+
+    def __enter__(self) -> "RoundTripCounter":
+        event.listen(self.engine, "before_cursor_execute", self.on_execute)
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        event.remove(self.engine, "before_cursor_execute", self.on_execute)
+
+
+@dataclass
+class BenchmarkStats:
+    latencies: list[float] = field(default_factory=list)
+    round_trips: int = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies)
+
+    def record(self, latency: float, round_trips: int) -> None:
+        self.latencies.append(latency)
+        self.round_trips += round_trips
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def to_frame(d: dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(d).encode("utf-8"))
+
+
+def eddn_timestamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def synthetic_envelope(schema: str, message: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "$schemaRef": schema,
+        "header": {
+            "uploaderID": "ekaine-benchmark",
+            "softwareName": "ekaine-benchmark",
+            "softwareVersion": "0.1.0",
+            "gatewayTimestamp": eddn_timestamp(),
+        },
+        "message": message,
+    }
+
+
+def build_synthetic_corpus(session: Session, count: int, seed: int = 0) -> list[bytes]:
+    """Builds `count` EDDN frames that reference real systems/stations/factions so processors do real work"""
+    rng = random.Random(seed)
+
+    systems = session.execute(
+        text("select id, name, id64, x, y, z from core.systems order by random() limit 500")
+    ).all()
+    if not systems:
+        raise RuntimeError("No systems in the database! Import a Spansh dump before benchmarking.")
+
+    factions_by_system: dict[int, list[str]] = defaultdict(list)
+    for system_id, faction_name in session.execute(
+        text(
+            """select fp.system_id, f.name
+            from core.faction_presences fp
+            join core.factions f on f.id = fp.faction_id
+            where fp.system_id = any(:system_ids)"""
+        ),
+        {"system_ids": [s.id for s in systems]},
+    ).all():
+        factions_by_system[system_id].append(faction_name)
+
+    stations = session.execute(
+        text(
+            """select st.name as station_name, st.market_id, sy.name as system_name
+            from derived.resolved_stations_view rs
+            join core.stations st on st.id = rs.id
+            join core.systems sy on sy.id = rs.system_id
+            where st.market_id is not null
+            order by random() limit 500"""
+        )
+    ).all()
+    commodity_names = [row[0].lower() for row in session.execute(text("select symbol from core.commodities")).all()]
+
+    def journal_message(event_name: str) -> dict[str, Any]:
+        system = rng.choice(systems)
+        factions = factions_by_system.get(system.id) or []
+        influences = [rng.random() for _ in factions]
+        total = sum(influences) or 1.0
+        message: dict[str, Any] = {
+            "timestamp": eddn_timestamp(),
+            "event": event_name,
+            "StarSystem": system.name,
+            "StarPos": [system.x, system.y, system.z],
+            "SystemAddress": system.id64 or 0,
+            "Population": rng.randint(1_000, 1_000_000_000),
+            "SystemEconomy": "$economy_Industrial;",
+            "SystemSecondEconomy": "$economy_Extraction;",
+            "SystemSecurity": "$SYSTEM_SECURITY_medium;",
+            "SystemGovernment": "$government_Corporate;",
+            "SystemAllegiance": "Independent",
+            "Factions": [
+                {
+                    "Name": name,
+                    "Influence": influence / total,
+                    "FactionState": "None",
+                    "Government": "Corporate",
+                    "Allegiance": "Independent",
+                    "Happiness": "$Faction_HappinessBand2;",
+                }
+                for name, influence in zip(factions, influences)
+            ],
+        }
+        if factions:
+            message["SystemFaction"] = {"Name": factions[0]}
+        return synthetic_envelope(JOURNAL_SCHEMA, message)
+
+    def commodity_message() -> dict[str, Any]:
+        if not stations:
+            return journal_message("FSDJump")
+        station = rng.choice(stations)
+        return synthetic_envelope(
+            COMMODITY_SCHEMA,
+            {
+                "systemName": station.system_name,
+                "stationName": station.station_name,
+                "marketId": station.market_id or 0,
+                "timestamp": eddn_timestamp(),
+                "commodities": [
+                    {
+                        "name": name,
+                        "meanPrice": rng.randint(100, 100_000),
+                        "buyPrice": rng.randint(0, 100_000),
+                        "stock": rng.randint(0, 10_000),
+                        "stockBracket": rng.randint(0, 3),
+                        "sellPrice": rng.randint(0, 100_000),
+                        "demand": rng.randint(0, 10_000),
+                        "demandBracket": rng.randint(0, 3),
+                    }
+                    for name in rng.sample(commodity_names, min(len(commodity_names), 100))
+                ],
+            },
+        )
+
+    def fsssignaldiscovered_message() -> dict[str, Any]:
+        system = rng.choice(systems)
+        return synthetic_envelope(
+            FSSSIGNALDISCOVERED_SCHEMA,
+            {
+                "event": "FSSSignalDiscovered",
+                "timestamp": eddn_timestamp(),
+                "StarSystem": system.name,
+                "StarPos": [system.x, system.y, system.z],
+                "SystemAddress": system.id64 or 0,
+                "signals": [
+                    {"timestamp": eddn_timestamp(), "SignalName": f"Benchmark Signal {idx}", "SignalType": "Generic"}
+                    for idx in range(rng.randint(1, 20))
+                ],
+            },
+        )
+
+    kinds = list(SYNTHETIC_MIX.keys())
+    weights = list(SYNTHETIC_MIX.values())
+    frames: list[bytes] = []
+    for kind in rng.choices(kinds, weights, k=count):
+        match kind:
+            case "commodity":
+                d = commodity_message()
+            case "fsssignaldiscovered":
+                d = fsssignaldiscovered_message()
+            case _:
+                d = journal_message(kind)
+        frames.append(to_frame(d))
+
+    return frames
+
+
+def load_spool_corpus(spool_dir: Path, limit: int | None = None) -> list[bytes]:
+    frames: list[bytes] = []
+    for _, frame in read_spool(spool_dir):
+        frames.append(frame)
+        if limit is not None and len(frames) >= limit:
+            break
+    return frames
+
+
+def run_benchmark(session: Session, frames: list[bytes], relay_url: str) -> dict[tuple[str, str], BenchmarkStats]:
+    """Publishes `frames` from a local relay stand-in and consumes them through the listener's processors"""
+    import_generated_models()
+    router = build_router()
+
+    ctx: zmq.Context[Any] = zmq.Context()
+    sub = ctx.socket(zmq.SUB)
+    sub.setsockopt(zmq.RCVHWM, 0)
+    sub.setsockopt_string(zmq.SUBSCRIBE, "")
+    relay = LocalRelay(ctx, relay_url, frames)
+    sub.connect(relay_url)
+    relay.start()
+
+    stats: dict[tuple[str, str], BenchmarkStats] = defaultdict(BenchmarkStats)
+    with RoundTripCounter(session.get_bind().engine) as round_trips:
+        while True:
+            frame = sub.recv_multipart()[0]
+            if frame == END_OF_CORPUS:
+                break
+
+            started_at = time.perf_counter()
+            round_trips_before = round_trips.count
+
+            d = decode_frame(frame)
+            route = router.route(d) if d is not None else None
+            if d is None or route is None:
+                key = ("dropped", "-")
+            else:
+                message = d.get("message", {})
+                key = (route.module.__name__.split(".")[-1], str(message.get("event", "-")))
+                process_routed_message(session, route, d)
+
+            stats[key].record(time.perf_counter() - started_at, round_trips.count - round_trips_before)
+
+        # Coalesced writes land here, so they're attributed to the flush rather than to individual messages
+        started_at = time.perf_counter()
+        round_trips_before = round_trips.count
+        flush_processors(session, force=True)
+        stats[("flush", "-")].record(time.perf_counter() - started_at, round_trips.count - round_trips_before)
+
+    relay.join()
+    sub.close()
+    ctx.term()
+    return stats
+
+
+def log_report(stats: dict[tuple[str, str], BenchmarkStats], elapsed: float) -> None:
+    headers = ["Schema", "Event", "Messages", "Msgs/sec", "p50 (ms)", "p99 (ms)", "DB round-trips/msg"]
+
+    def row(schema: str, event_name: str, s: BenchmarkStats) -> list[Any]:
+        busy = sum(s.latencies)
+        return [
+            schema,
+            event_name,
+            s.count,
+            f"{s.count / busy:,.1f}" if busy else "-",
+            f"{percentile(s.latencies, 50) * 1000:.2f}",
+            f"{percentile(s.latencies, 99) * 1000:.2f}",
+            f"{s.round_trips / s.count:.2f}" if s.count else "-",
+        ]
+
+    total = BenchmarkStats()
+    table = []
+    for (schema, event_name), s in sorted(stats.items()):
+        table.append(row(schema, event_name, s))
+        total.latencies.extend(s.latencies)
+        total.round_trips += s.round_trips
+    table.append(row("TOTAL", "", total))
+
+    logger.info("")
+    logger.info("====== EDDN INGEST BENCHMARK ======")
+    throughput = total.count / elapsed if elapsed else 0.0
+    logger.info(f"{total.count} messages in {seconds_to_str(elapsed)} ({throughput:,.1f} msgs/sec end-to-end)")
+    logger.info(tabulate(table, headers))
+    logger.info("")
+
+
+def check_scratch_database_url(database_url: str, allow_any_db: bool = False) -> None:
+    """Raises unless `database_url` looks like a scratch DB: local, and not the DB everything else is configured with
+
+    The benchmark writes made up populations, prices and influences, so it mustn't be pointed at a real DB by accident.
+    """
+    if allow_any_db:
+        return
+    url = make_url(database_url)
+    if url.host not in LOCAL_DB_HOSTS:
+        raise ValueError(f"Refusing to benchmark against non-local DB host '{url.host}'")
+    configured = make_url(DATABASE_URL)
+    if (url.host, url.port, url.database) == (configured.host, configured.port, configured.database):
+        raise ValueError(f"Refusing to benchmark against the configured DB '{url.database}', use a scratch DB")
+
+
+def main(
+    database_url: str,
+    spool_dir: Path | None = None,
+    synthetic_count: int = 5000,
+    relay_port: int = DEFAULT_RELAY_PORT,
+    seed: int = 0,
+    allow_any_db: bool = False,
+) -> None:
+    check_scratch_database_url(database_url, allow_any_db)
+    scratch_engine = create_engine(database_url, pool_pre_ping=True)
+    try:
+        with session_scope(sessionmaker(bind=scratch_engine, autoflush=False)) as session:
+            if spool_dir is not None:
+                frames = load_spool_corpus(spool_dir, synthetic_count or None)
+                logger.info(f"Loaded {len(frames)} recorded frames from '{spool_dir}'")
+            else:
+                frames = build_synthetic_corpus(session, synthetic_count, seed)
+                logger.info(f"Built {len(frames)} synthetic frames")
+
+            started_at = time.perf_counter()
+            stats = run_benchmark(session, frames, f"tcp://127.0.0.1:{relay_port}")
+            log_report(stats, time.perf_counter() - started_at)
+    finally:
+        scratch_engine.dispose()
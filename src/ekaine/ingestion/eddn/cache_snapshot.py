@@ -0,0 +1,110 @@
+import json
+import os
+import struct
+import time
+import traceback
+import zlib
+from pathlib import Path
+from typing import Any, Protocol
+
+from sqlalchemy.orm import Session
+
+from ekaine.common.logging import get_logger
+from ekaine.ingestion.eddn.metrics import CACHE_SNAPSHOTS
+
+logger = get_logger(__name__)
+
+# A header of (magic, format version) followed by the zlib compressed JSON of `{cache name: cache snapshot}`
+SNAPSHOT_HEADER = struct.Struct("<4sH")
+SNAPSHOT_MAGIC = b"EKCS"
+SNAPSHOT_VERSION = 1
+
+
+class SnapshotCache(Protocol):
+    name: str
+
+    def snapshot(self) -> dict[str, Any] | None: ...
+
+    def restore(self, session: Session, snapshot: dict[str, Any]) -> int | None: ...
+
+
+def write_snapshot(path: Path, snapshots: dict[str, dict[str, Any]]) -> int:
+    """Atomically replaces the snapshot at `path`. Returns the number of bytes written."""
+    payload = zlib.compress(json.dumps(snapshots, separators=(",", ":")).encode("utf-8"))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Partitioned consumers share the file, so every process writes its own temp file before swapping it in
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with tmp_path.open("wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return SNAPSHOT_HEADER.size + len(payload)
+
+
+def read_snapshot(path: Path) -> dict[str, dict[str, Any]] | None:
+    """Returns the snapshots in `path`, or None if there's no usable snapshot there"""
+    if not path.exists():
+        return None
+
+    data = path.read_bytes()
+    if len(data) < SNAPSHOT_HEADER.size:
+        logger.warning(f"[EDDN Cache Snapshot] Ignoring truncated snapshot '{path}'")
+        return None
+    magic, version = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        logger.warning(f"[EDDN Cache Snapshot] Ignoring snapshot '{path}' with unknown format {magic!r} v{version}")
+        return None
+
+    try:
+        snapshots = json.loads(zlib.decompress(data[SNAPSHOT_HEADER.size :]))
+    except Exception:
+        logger.warning(traceback.format_exc())
+        logger.warning(f"[EDDN Cache Snapshot] Ignoring unreadable snapshot '{path}'")
+        return None
+    return snapshots if isinstance(snapshots, dict) else None
+
+
+class CacheSnapshotter:
+    """Periodically snapshots the listener's resolution caches to `path` and restores them from it on startup
+
+    Keeps a restart from starting with cold caches (and a burst of lookups for the same hot systems and stations).
+    Each cache validates its snapshot against the DB and patches in what changed since it was taken, so a stale or
+    missing snapshot only costs the full load the cache would have done anyway.
+    """
+
+    def __init__(self, path: Path, caches: list[SnapshotCache], every_seconds: float = 5 * 60) -> None:
+        self.path = path
+        self.caches = caches
+        self.every_seconds = every_seconds
+        self.saved_at = time.monotonic()
+
+    def restore(self, session: Session) -> None:
+        snapshots = read_snapshot(self.path) or {}
+        for cache in self.caches:
+            snapshot = snapshots.get(cache.name)
+            if snapshot is None:
+                CACHE_SNAPSHOTS.inc(cache=cache.name, outcome="missing")
+                continue
+            try:
+                patched = cache.restore(session, snapshot)
+            except Exception:
+                logger.error(traceback.format_exc())
+                session.rollback()
+                patched = None
+            CACHE_SNAPSHOTS.inc(cache=cache.name, outcome="restored" if patched is not None else "stale")
+
+    def save(self) -> None:
+        snapshots = {cache.name: snapshot for cache in self.caches if (snapshot := cache.snapshot()) is not None}
+        self.saved_at = time.monotonic()
+        if not snapshots:
+            return
+
+        written = write_snapshot(self.path, snapshots)
+        for name in snapshots:
+            CACHE_SNAPSHOTS.inc(cache=name, outcome="saved")
+        logger.debug(f"[EDDN Cache Snapshot] Saved {', '.join(snapshots)} to '{self.path}' ({written} bytes)")
+
+    def flush(self, session: Session, force: bool = False) -> None:
+        """Saves a snapshot every `every_seconds`. Matches the listener's processor flush hook signature."""
+        if force or time.monotonic() - self.saved_at >= self.every_seconds:
+            self.save()
@@ -0,0 +1,377 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable, cast
+
+from sqlalchemy import ColumnElement, func, or_, select, text, update
+from sqlalchemy.orm import Session
+
+from ekaine.common.logging import get_logger
+from ekaine.postgresql import BaseModelWithId
+from ekaine.postgresql.db import (
+    BodiesDB,
+    CarrierPositionsDB,
+    FactionsDB,
+    RingsDB,
+    StationsDB,
+    SystemsDB,
+)
+from ekaine.postgresql.unit_of_work import UnitOfWork
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class Watermark:
+    """How far into a table an in-memory map was loaded: its max id, row count and latest update"""
+
+    max_id: int
+    count: int
+    updated_at: datetime | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "max_id": self.max_id,
+            "count": self.count,
+            "updated_at": self.updated_at.isoformat() if self.updated_at is not None else None,
+        }
+
+    @staticmethod
+    def from_dict(d: dict[str, Any]) -> "Watermark":
+        updated_at = d.get("updated_at")
+        return Watermark(
+            int(d["max_id"]), int(d["count"]), datetime.fromisoformat(updated_at) if updated_at is not None else None
+        )
+
+
+class IdMapCache[K]:
+    """Base for in-memory `key -> id` maps that are loaded in full on first use and reloaded every
+    `reload_every_seconds`
+
+    Subclasses set the model, the key column and optionally an "updated at" expression. The map can be snapshotted
+    along with the `Watermark` it was loaded at and restored from that snapshot on the next start, fetching only the
+    rows added (or updated) since. Anything the watermark can't account for (eg, deleted rows) triggers a full load.
+    """
+
+    name = "ids"
+    model: type[BaseModelWithId]
+    key_column: Any
+
+    def __init__(self, reload_every_seconds: float = 60 * 60) -> None:
+        self.reload_every_seconds = reload_every_seconds
+        self.ids: dict[K, int] = {}
+        self.watermark: Watermark | None = None
+        self.loaded_at: float | None = None
+
+    def updated_at_column(self) -> ColumnElement[datetime] | None:
+        return None
+
+    def row_filter(self) -> ColumnElement[bool]:
+        return cast(ColumnElement[bool], self.key_column.is_not(None))
+
+    def query_watermark(self, session: Session) -> Watermark:
+        updated_at_column = self.updated_at_column()
+        columns: list[Any] = [func.coalesce(func.max(self.model.id), 0), func.count()]
+        if updated_at_column is not None:
+            columns.append(func.max(updated_at_column))
+        row = session.execute(select(*columns).select_from(self.model).where(self.row_filter())).one()
+        return Watermark(row[0], row[1], row[2] if updated_at_column is not None else None)
+
+    def load(self, session: Session) -> None:
+        # Watermark first, so rows written while the map is being loaded are still picked up by the next restore
+        self.watermark = self.query_watermark(session)
+        rows = session.execute(select(self.key_column, self.model.id).where(self.row_filter()))
+        self.ids = {key: pk for key, pk in rows}
+        self.loaded_at = time.monotonic()
+        logger.info(f"[{type(self).__name__}] Loaded {len(self.ids)} {self.name}")
+
+    def ensure_loaded(self, session: Session) -> None:
+        if self.loaded_at is None or time.monotonic() - self.loaded_at >= self.reload_every_seconds:
+            self.load(session)
+
+    def add(self, key: K, pk: int) -> None:
+        self.ids[key] = pk
+
+    def snapshot(self) -> dict[str, Any] | None:
+        if self.watermark is None:
+            return None
+        return {"watermark": self.watermark.to_dict(), "keys": list(self.ids.keys()), "ids": list(self.ids.values())}
+
+    def restore(self, session: Session, snapshot: dict[str, Any]) -> int | None:
+        """Loads the map from `snapshot` and patches in what changed since. Returns how many rows were patched.
+
+        Returns None, leaving the cache to load in full on first use, if the snapshot can't be brought up to date.
+        """
+        snapshot_watermark = Watermark.from_dict(snapshot["watermark"])
+        watermark = self.query_watermark(session)
+
+        changed = self.model.id > snapshot_watermark.max_id
+        updated_at_column = self.updated_at_column()
+        if updated_at_column is not None and snapshot_watermark.updated_at is not None:
+            changed = or_(changed, updated_at_column > snapshot_watermark.updated_at)
+        rows = session.execute(select(self.key_column, self.model.id).where(self.row_filter(), changed)).all()
+
+        # Updated rows keep the count as is, so the count only adds up if nothing was deleted (or had its key unset)
+        added = sum(1 for _, pk in rows if pk > snapshot_watermark.max_id)
+        if watermark.count != snapshot_watermark.count + added:
+            logger.info(
+                f"[{type(self).__name__}] Snapshot is out of date, expected {snapshot_watermark.count + added} "
+                f"{self.name} but found {watermark.count}"
+            )
+            return None
+
+        ids: dict[K, int] = dict(zip(snapshot["keys"], snapshot["ids"]))
+        patched_pks = {pk for _, pk in rows}
+        if patched_pks:
+            # A patched row may have changed key, so drop whatever the snapshot had it under first
+            ids = {key: pk for key, pk in ids.items() if pk not in patched_pks}
+        for key, pk in rows:
+            ids[key] = pk
+
+        self.ids = ids
+        self.watermark = watermark
+        self.loaded_at = time.monotonic()
+        logger.info(f"[{type(self).__name__}] Restored {len(self.ids)} {self.name}, {len(rows)} patched from the DB")
+        return len(rows)
+
+
+class MarketStationCache(IdMapCache[int]):
+    """In-memory EDDN `marketId` -> `StationsDB.id` map
+
+    Periodically reloaded so market ids released by a Spansh import (eg, a carrier that moved) are picked up. Market
+    ids we can't resolve are remembered for `miss_ttl_seconds` so the steady stream of messages from untracked
+    carriers doesn't turn into a stream of lookups.
+    """
+
+    name = "market_ids"
+    model = StationsDB
+    key_column = StationsDB.market_id
+
+    def __init__(self, reload_every_seconds: float = 60 * 60, miss_ttl_seconds: float = 10 * 60) -> None:
+        super().__init__(reload_every_seconds)
+        self.miss_ttl_seconds = miss_ttl_seconds
+        self.misses: dict[int, float] = {}  # market id -> time.monotonic() the miss expires at
+
+    def updated_at_column(self) -> ColumnElement[datetime] | None:
+        return func.greatest(StationsDB.spansh_updated_at, StationsDB.eddn_updated_at)
+
+    def load(self, session: Session) -> None:
+        super().load(session)
+        self.misses.clear()
+
+    def resolve(self, uow: UnitOfWork, market_id: int, system_name: str, station_name: str) -> int | None:
+        self.ensure_loaded(uow.session)
+
+        station_id = self.ids.get(market_id)
+        if station_id is not None:
+            return station_id
+
+        now = time.monotonic()
+        if self.misses.get(market_id, 0.0) > now:
+            return None
+
+        station_id = self.adopt_market_id(uow, market_id, system_name, station_name)
+        if station_id is None:
+            self.misses[market_id] = now + self.miss_ttl_seconds
+        return station_id
+
+    def add(self, market_id: int, station_id: int) -> None:
+        """Records a station that was just written with `market_id`"""
+        self.ids[market_id] = station_id
+        self.misses.pop(market_id, None)
+
+    def adopt_market_id(self, uow: UnitOfWork, market_id: int, system_name: str, station_name: str) -> int | None:
+        """Finds a station without a market id by system + station name and assigns it `market_id`
+
+        Covers stations that were never in a Spansh dump with a market id (eg, new construction sites). The id is only
+        cached once `uow` commits.
+        """
+        row = uow.session.execute(
+            text(
+                """select st.id, st.market_id
+                from derived.resolved_stations_view as rs
+                inner join core.stations as st on rs.id = st.id
+                inner join core.systems as sy on rs.system_id = sy.id
+                where rs.name = :station_name and sy.name = :system_name"""
+            ),
+            {"station_name": station_name, "system_name": system_name},
+        ).first()
+        if row is None:
+            return None
+
+        station_id, existing_market_id = row
+        if existing_market_id == market_id:
+            self.ids[market_id] = int(station_id)
+            return int(station_id)
+        if existing_market_id is not None:
+            # A different market with the same name in the same system. Don't guess.
+            logger.warning(
+                f"Station '{station_name}' in '{system_name}' has market id {existing_market_id} "
+                f"but EDDN sent {market_id}!"
+            )
+            return None
+
+        uow.session.execute(update(StationsDB).where(StationsDB.id == station_id).values(market_id=market_id))
+        uow.on_commit(lambda: self.add(market_id, int(station_id)))
+        logger.info(f"[Stations DB Updated] {system_name} - {station_name} - market id {market_id}")
+        return int(station_id)
+
+
+class SystemAddressCache(IdMapCache[int]):
+    """In-memory EDDN `SystemAddress` -> `SystemsDB.id` map
+
+    Only populated systems are tracked, so most addresses seen on EDDN won't resolve. Loading the whole map means
+    those misses don't cost a query, which also makes it the listener's known-system filter.
+    """
+
+    name = "system_addresses"
+    model = SystemsDB
+    key_column = SystemsDB.id64
+
+    def resolve(self, session: Session, system_address: int) -> int | None:
+        self.ensure_loaded(session)
+        return self.ids.get(system_address)
+
+
+class FactionIdCache(IdMapCache[str]):
+    """In-memory faction name -> `FactionsDB.id` map"""
+
+    name = "factions"
+    model = FactionsDB
+    key_column = FactionsDB.name
+
+    def resolve(self, session: Session, faction_name: str) -> int | None:
+        self.ensure_loaded(session)
+        return self.ids.get(faction_name)
+
+
+# Columns left out of a body's digest. Mean anomaly moves with time so it'd make every scan look like a change.
+BODY_DIGEST_EXCLUDED_COLUMNS = frozenset({"mean_anomaly", "mean_anomaly_updated_at", "distance_to_arrival_updated_at"})
+
+
+def body_digest(row: dict[str, Any]) -> str:
+    values = sorted((k, v) for k, v in row.items() if k not in BODY_DIGEST_EXCLUDED_COLUMNS)
+    return hashlib.blake2b(repr(values).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class BodyIdCache:
+    """LRU of `(system_id, body_id) -> (BodiesDB.id, digest of the last row written)`, loaded a system at a time
+
+    The digest is None for bodies loaded from the DB, so the first scan of a body after a (re)load is always written.
+    """
+
+    def __init__(self, max_systems: int = 20_000) -> None:
+        self.max_systems = max_systems
+        self.bodies: OrderedDict[int, dict[int, tuple[int, str | None]]] = OrderedDict()
+
+    def load_systems(self, session: Session, system_ids: Iterable[int]) -> None:
+        wanted = set(system_ids)
+        missing = wanted - self.bodies.keys()
+        for system_id in wanted - missing:
+            self.bodies.move_to_end(system_id)
+        if not missing:
+            return
+
+        for system_id in missing:
+            self.bodies[system_id] = {}
+        rows = session.execute(
+            select(BodiesDB.system_id, BodiesDB.body_id, BodiesDB.id).where(
+                BodiesDB.system_id.in_(missing), BodiesDB.body_id.is_not(None)
+            )
+        )
+        for system_id, body_id, pk in rows:
+            self.bodies[system_id][cast(int, body_id)] = (pk, None)
+
+        while len(self.bodies) > self.max_systems:
+            self.bodies.popitem(last=False)
+
+    def get(self, system_id: int, body_id: int) -> tuple[int, str | None] | None:
+        return self.bodies.get(system_id, {}).get(body_id)
+
+    def store(self, system_id: int, body_id: int, pk: int, digest: str) -> None:
+        self.bodies.setdefault(system_id, {})[body_id] = (pk, digest)
+
+
+class RingIdCache:
+    """LRU of `system_id -> {ring name: RingsDB.id}`, loaded a system at a time
+
+    Systems without rings are cached too (as empty) so repeated signal messages for untracked rings don't each cost
+    a query. Everything is dropped every `reload_every_seconds` to pick up rings added by Spansh imports.
+    """
+
+    def __init__(self, max_systems: int = 20_000, reload_every_seconds: float = 60 * 60) -> None:
+        self.max_systems = max_systems
+        self.reload_every_seconds = reload_every_seconds
+        self.rings: OrderedDict[int, dict[str, int]] = OrderedDict()
+        self.cleared_at = time.monotonic()
+
+    def load_systems(self, session: Session, system_ids: Iterable[int]) -> None:
+        if time.monotonic() - self.cleared_at >= self.reload_every_seconds:
+            self.rings.clear()
+            self.cleared_at = time.monotonic()
+
+        wanted = set(system_ids)
+        missing = wanted - self.rings.keys()
+        for system_id in wanted - missing:
+            self.rings.move_to_end(system_id)
+        if not missing:
+            return
+
+        for system_id in missing:
+            self.rings[system_id] = {}
+        rows = session.execute(
+            select(BodiesDB.system_id, RingsDB.name, RingsDB.id)
+            .join(BodiesDB, RingsDB.body_id == BodiesDB.id)
+            .where(BodiesDB.system_id.in_(missing))
+        )
+        for system_id, ring_name, ring_id in rows:
+            self.rings[system_id][ring_name] = ring_id
+
+        while len(self.rings) > self.max_systems:
+            self.rings.popitem(last=False)
+
+    def get(self, system_id: int, ring_name: str) -> int | None:
+        return self.rings.get(system_id, {}).get(ring_name)
+
+
+class CarrierPositionCache:
+    """`StationsDB.id -> (SystemAddress, time.monotonic() last written)` for fleet carriers, loaded in full on first use
+
+    Used to tell carrier jumps from repeat sightings (every commander aboard sends the same CarrierJump) and to only
+    refresh a carrier's position every `refresh_every_seconds` while it stays put.
+    """
+
+    def __init__(self, refresh_every_seconds: float = 15 * 60) -> None:
+        self.refresh_every_seconds = refresh_every_seconds
+        self.positions: dict[int, tuple[int, float]] | None = None
+
+    def load(self, session: Session) -> dict[int, tuple[int, float]]:
+        # Loaded positions count as stale so the first sighting of each carrier still refreshes it
+        stale = time.monotonic() - self.refresh_every_seconds
+        rows = session.execute(select(CarrierPositionsDB.station_id, CarrierPositionsDB.system_address))
+        self.positions = {station_id: (system_address, stale) for station_id, system_address in rows}
+        logger.info(f"[Carrier Position Cache] Loaded {len(self.positions)} carrier positions")
+        return self.positions
+
+    def check(self, session: Session, station_id: int, system_address: int) -> tuple[int | None, bool]:
+        """Returns the carrier's last known SystemAddress, if any, and whether its position is due to be written"""
+        positions = self.positions if self.positions is not None else self.load(session)
+        cached = positions.get(station_id)
+        if cached is None:
+            return None, True
+        previous_address, written_at = cached
+        due = previous_address != system_address or time.monotonic() - written_at >= self.refresh_every_seconds
+        return previous_address, due
+
+    def store(self, station_id: int, system_address: int) -> None:
+        if self.positions is not None:
+            self.positions[station_id] = (system_address, time.monotonic())
+
+
+# Shared by every processor resolving EDDN market ids / system addresses / faction names
+market_stations = MarketStationCache()
+system_addresses = SystemAddressCache()
+faction_ids = FactionIdCache()
+carrier_positions = CarrierPositionCache()
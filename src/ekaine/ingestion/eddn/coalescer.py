@@ -0,0 +1,111 @@
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Hashable
+
+from ekaine.ingestion.eddn.metrics import PendingLag, defer_ingest_lag
+
+
+@dataclass
+class PendingValue[V]:
+    first_offered_at: float  # time.monotonic()
+    window_started_at: datetime  # Message timestamp of the first value offered in this window
+    timestamp: datetime  # Message timestamp of `value`
+    value: V
+    lags: list[PendingLag] = field(default_factory=list)  # Of every message merged into `value`
+
+
+class LatestByKeyCoalescer[K: Hashable, V]:
+    """Holds only the newest value per key for `window_seconds` of message time after the key was first offered
+
+    Values are released by `pop_due()` once their window has passed, so a burst of updates for the same key turns
+    into a single write of the latest one. Windows are measured in message time, like `TimeseriesSampler`'s buckets,
+    so replaying hours of messages in seconds still writes once per window rather than once per `window_seconds` of
+    wall time. A value held for `window_seconds` of wall time is released too, in case messages stop coming.
+    A `window_seconds` of 0 releases values on the next `pop_due()`. At most `max_pending` keys are held; past that
+    the oldest keys are released early.
+
+    Offering a value defers the ingest lag of the message being processed. Values are released along with the lags
+    of every message merged into them, for the caller to observe once the value is written.
+    """
+
+    def __init__(self, window_seconds: float, max_pending: int = 50_000) -> None:
+        self.window_seconds = window_seconds
+        self.max_pending = max_pending
+        # Dict order is first-offered order
+        self.pending: dict[K, PendingValue[V]] = {}
+        # Values whose window was closed by a newer message for the same key, released on the next `pop_due()`
+        self.closed: list[PendingValue[V]] = []
+        # The newest message timestamp offered, ie how far message time has got
+        self.latest_timestamp: datetime | None = None
+
+    def __len__(self) -> int:
+        return len(self.pending) + len(self.closed)
+
+    def window_passed(self, window_started_at: datetime, timestamp: datetime) -> bool:
+        return (timestamp - window_started_at).total_seconds() >= self.window_seconds
+
+    def offer(self, key: K, value: V, timestamp: datetime) -> bool:
+        """Returns True if a value was already pending for `key`, ie one of the two was coalesced away"""
+        lag = defer_ingest_lag()
+        lags = [lag] if lag is not None else []
+        if self.latest_timestamp is None or timestamp > self.latest_timestamp:
+            self.latest_timestamp = timestamp
+
+        existing = self.pending.get(key)
+        if existing is not None and self.window_passed(existing.window_started_at, timestamp):
+            # The message is past the pending value's window, which gets its own write
+            del self.pending[key]
+            self.closed.append(existing)
+            existing = None
+        if existing is None:
+            self.pending[key] = PendingValue(time.monotonic(), timestamp, timestamp, value, lags)
+            return False
+
+        existing.lags.extend(lags)
+        if timestamp >= existing.timestamp:
+            existing.timestamp = timestamp
+            existing.value = value
+        return True
+
+    def pop_due(self, now: float | None = None) -> list[tuple[V, list[PendingLag]]]:
+        now = time.monotonic() if now is None else now
+        due = [(pending.value, pending.lags) for pending in self.closed]
+        self.closed = []
+        while self.pending:
+            key = next(iter(self.pending))
+            pending = self.pending[key]
+            window_passed = now - pending.first_offered_at >= self.window_seconds or (
+                self.latest_timestamp is not None
+                and self.window_passed(pending.window_started_at, self.latest_timestamp)
+            )
+            if not window_passed and len(self.pending) <= self.max_pending:
+                break
+            del self.pending[key]
+            due.append((pending.value, pending.lags))
+        return due
+
+    def drain(self) -> list[tuple[V, list[PendingLag]]]:
+        values = [(pending.value, pending.lags) for pending in [*self.closed, *self.pending.values()]]
+        self.closed = []
+        self.pending.clear()
+        return values
+
+
+class TimeseriesSampler[K: Hashable]:
+    """Allows at most one timeseries sample per key per `granularity_seconds` bucket of message time"""
+
+    def __init__(self, granularity_seconds: float) -> None:
+        self.granularity_seconds = granularity_seconds
+        self.last_bucket: dict[K, int] = {}
+
+    def should_sample(self, key: K, timestamp: datetime) -> bool:
+        if self.granularity_seconds <= 0:
+            return True
+
+        bucket = int(timestamp.timestamp() // self.granularity_seconds)
+        last_bucket = self.last_bucket.get(key)
+        if last_bucket is not None and bucket <= last_bucket:
+            return False
+        self.last_bucket[key] = bucket
+        return True
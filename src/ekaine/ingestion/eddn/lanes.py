@@ -0,0 +1,208 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any
+
+from ekaine.common.logging import get_logger
+from ekaine.ingestion.eddn.metrics import (
+    DEGRADED_MODE,
+    HWM_DROPS,
+    LANE_LAG,
+    RECEIVE_QUEUE_DEPTH,
+    SHED_MESSAGES,
+)
+
+logger = get_logger(__name__)
+
+DEFAULT_LANE = "default"
+
+# What a lane does with its messages while the listener is degraded
+KEEP = "keep"
+SAMPLE = "sample"
+SHED = "shed"
+DEGRADED_POLICIES = (KEEP, SAMPLE, SHED)
+
+
+@dataclass(frozen=True)
+class Lane:
+    name: str
+    weight: int
+    # Either "<schema>" or "<schema>:<event>", with schemas as in metric labels (eg, "journal/1:FSDJump")
+    matches: tuple[str, ...] = ()
+    degraded_policy: str = KEEP
+    sample_every: int = 10  # With the "sample" policy, keep 1 in `sample_every` messages
+
+
+# Market updates feed the user facing route queries so they go first. Signals are high volume and low value.
+DEFAULT_LANES = (
+    Lane("market", 8, ("commodity/3",)),
+    Lane("system", 4, ("journal/1:FSDJump", "journal/1:Location", "journal/1:Docked", "journal/1:CarrierJump")),
+    Lane("signals", 1, ("fsssignaldiscovered/1",), degraded_policy=SHED),
+    Lane(DEFAULT_LANE, 2, degraded_policy=SAMPLE),
+)
+
+
+def lanes_from_config(config: dict[str, Any] | None) -> tuple[Lane, ...]:
+    """Builds lanes from the `eddn.lanes` config section, falling back to `DEFAULT_LANES`
+
+    eddn:
+      lanes:
+        market: {weight: 8, match: [commodity/3]}
+        signals: {weight: 1, match: [fsssignaldiscovered/1], degraded: shed}
+    """
+    if not config:
+        return DEFAULT_LANES
+
+    lanes = []
+    for name, lane_config in config.items():
+        policy = lane_config.get("degraded", KEEP)
+        if policy not in DEGRADED_POLICIES:
+            raise ValueError(
+                f"Lane '{name}' has unknown degraded policy '{policy}'! Expected one of {DEGRADED_POLICIES}"
+            )
+        weight = int(lane_config.get("weight", 1))
+        if weight < 1:
+            raise ValueError(f"Lane '{name}' must have a weight of at least 1!")
+        lanes.append(
+            Lane(
+                name,
+                weight,
+                tuple(lane_config.get("match", [])),
+                policy,
+                int(lane_config.get("sample_every", 10)),
+            )
+        )
+
+    if not any(lane.name == DEFAULT_LANE for lane in lanes):
+        lanes.append(Lane(DEFAULT_LANE, 1, degraded_policy=SAMPLE))
+    return tuple(lanes)
+
+
+class PriorityLanes[T]:
+    """Bounded per-lane queues between the receiver thread and the processors, drained by smooth weighted round robin
+
+    While the age of the oldest queued message exceeds `degraded_lag_seconds` the lanes are "degraded" and each lane's
+    `degraded_policy` applies to messages entering or leaving it. Degraded mode ends once the lag falls below half of
+    the threshold.
+    """
+
+    def __init__(
+        self,
+        lanes: tuple[Lane, ...] = DEFAULT_LANES,
+        max_items_per_lane: int = 10_000,
+        degraded_lag_seconds: float = 60.0,
+    ) -> None:
+        self.lanes = {lane.name: lane for lane in lanes}
+        if DEFAULT_LANE not in self.lanes:
+            raise ValueError(f"A '{DEFAULT_LANE}' lane is required!")
+
+        self.by_match: dict[str, str] = {match: lane.name for lane in lanes for match in lane.matches}
+        self.max_items_per_lane = max_items_per_lane
+        self.degraded_lag_seconds = degraded_lag_seconds
+
+        self.queues: dict[str, deque[tuple[float, T]]] = {name: deque() for name in self.lanes}
+        self.current_weights: dict[str, int] = {name: 0 for name in self.lanes}
+        self.sampled: dict[str, int] = {name: 0 for name in self.lanes}
+        self.degraded = False
+        self.cond = threading.Condition()
+
+    def classify(self, schema: str, event: str | None) -> str:
+        if event is not None:
+            lane = self.by_match.get(f"{schema}:{event}")
+            if lane is not None:
+                return lane
+        return self.by_match.get(schema, DEFAULT_LANE)
+
+    def lag(self, now: float) -> float:
+        heads = [queue[0][0] for queue in self.queues.values() if queue]
+        return now - min(heads) if heads else 0.0
+
+    def update_degraded(self, now: float) -> None:
+        lag = self.lag(now)
+        LANE_LAG.set(lag)
+        if not self.degraded and lag > self.degraded_lag_seconds:
+            self.degraded = True
+            logger.warning(f"[EDDN Lanes] Entering degraded mode! Oldest queued message is {lag:.1f}s old")
+        elif self.degraded and lag < self.degraded_lag_seconds / 2:
+            self.degraded = False
+            logger.warning(f"[EDDN Lanes] Leaving degraded mode. Oldest queued message is {lag:.1f}s old")
+        DEGRADED_MODE.set(1 if self.degraded else 0)
+
+    def should_shed(self, lane: Lane) -> str | None:
+        """Returns why a message in `lane` should be dropped right now, if it should"""
+        if not self.degraded or lane.degraded_policy == KEEP:
+            return None
+        if lane.degraded_policy == SHED:
+            return SHED
+
+        self.sampled[lane.name] += 1
+        return None if self.sampled[lane.name] % max(1, lane.sample_every) == 0 else SAMPLE
+
+    def put(self, lane_name: str, item: T) -> bool:
+        """Queues `item` in `lane_name`. Returns False if it was dropped instead."""
+        lane = self.lanes.get(lane_name) or self.lanes[DEFAULT_LANE]
+        with self.cond:
+            now = time.monotonic()
+            self.update_degraded(now)
+
+            reason = self.should_shed(lane)
+            if reason is not None:
+                SHED_MESSAGES.inc(lane=lane.name, reason=reason)
+                return False
+
+            queue = self.queues[lane.name]
+            if len(queue) >= self.max_items_per_lane:
+                HWM_DROPS.inc()
+                SHED_MESSAGES.inc(lane=lane.name, reason="full")
+                return False
+
+            queue.append((now, item))
+            RECEIVE_QUEUE_DEPTH.set(len(queue), lane=lane.name)
+            self.cond.notify()
+            return True
+
+    def next_lane(self) -> str | None:
+        """Smooth weighted round robin over the non-empty lanes"""
+        ready = [name for name, queue in self.queues.items() if queue]
+        if not ready:
+            return None
+
+        total = 0
+        for name in ready:
+            self.current_weights[name] += self.lanes[name].weight
+            total += self.lanes[name].weight
+        picked = max(ready, key=lambda name: self.current_weights[name])
+        self.current_weights[picked] -= total
+        return picked
+
+    def get(self, timeout: float | None = None) -> tuple[str, T] | None:
+        """Returns the next (lane name, item) to process, or None if nothing arrived within `timeout`"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                self.update_degraded(now)
+
+                lane_name = self.next_lane()
+                if lane_name is None:
+                    remaining = deadline - now if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        return None
+                    self.cond.wait(remaining)
+                    continue
+
+                queue = self.queues[lane_name]
+                _, item = queue.popleft()
+                RECEIVE_QUEUE_DEPTH.set(len(queue), lane=lane_name)
+
+                # Also shed what was queued before degraded mode kicked in, that's where the backlog is
+                if self.degraded and self.lanes[lane_name].degraded_policy == SHED:
+                    SHED_MESSAGES.inc(lane=lane_name, reason=SHED)
+                    continue
+
+                return lane_name, item
+
+    def __len__(self) -> int:
+        with self.cond:
+            return sum(len(queue) for queue in self.queues.values())
@@ -1,20 +1,44 @@
 #!python
 import importlib
 import json
+import threading
+import time
 import traceback
 import zlib
+from pathlib import Path
 from pprint import pformat
 from types import ModuleType
 from typing import Any, Callable
 
 import zmq
-from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
+from ekaine.common.constants import (
+    EDDN_CACHE_SNAPSHOT_FILE,
+    EDDN_CACHE_SNAPSHOT_SECONDS,
+    EDDN_DEGRADED_LAG_SECONDS,
+    EDDN_LANES_CONFIG,
+)
 from ekaine.common.logging import get_logger
+from ekaine.common.metrics import start_metrics_server
 from ekaine.ingestion.eddn import processors
+from ekaine.ingestion.eddn.cache_snapshot import CacheSnapshotter
+from ekaine.ingestion.eddn.caches import faction_ids, market_stations, system_addresses
+from ekaine.ingestion.eddn.lanes import PriorityLanes, lanes_from_config
+from ekaine.ingestion.eddn.metrics import (
+    MESSAGES,
+    PROCESSOR_DB_SECONDS,
+    PROCESSOR_SECONDS,
+    DBTimeTracker,
+    ingest_lag_scope,
+    pending_lag,
+    schema_label,
+)
+from ekaine.ingestion.eddn.routing import MessageRouter, Route
+from ekaine.ingestion.eddn.scheduler import scheduler
 from ekaine.ingestion.eddn.schemas import get_schema_model_mapping
-from ekaine.postgresql import SessionLocal
+from ekaine.ingestion.eddn.spool import SpoolWriter, read_spool
+from ekaine.postgresql import SessionLocal, engine
 from ekaine.postgresql.adapter import FactionsAdapter
 from gen.eddn_models import (
     approachsettlement_v1_0,
@@ -36,17 +60,8 @@ def import_generated_models() -> None:
         module_mapping[schema] = module
 
 
-def get_module_from_schema(schema: str) -> ModuleType:
-    module = module_mapping.get(schema)
-    if module is None:
-        raise ValueError(f"Tried getting a module for a schema we didn't know about! '{schema}'")
-    return module
-
-
-# TODO: Consider dependency ordering of inserts for new system/stations
-# Eg, if we're seeing market commodities for a system we don't have in the DB, there should be a pending
-# upsert for the station/system that needs to go through before we can upsert the market commodities themselves,
-# which have a FK on the stations table, ie station needs to be upserted first.
+# Messages referencing a station/system we don't have yet are parked with the write scheduler until a journal event
+# lets the processors insert it (system from FSDJump/Location, station from Docked). See `scheduler.py`.
 processor_mapping: dict[type[Any], Callable[[Session, Any], None]] = {
     commodity_v3_0.Model: processors.commodities_v3_0.process_model,
     # approachsettlement_v1_0.Model: self.process_approachsettlement_v1_0,
@@ -55,13 +70,44 @@ processor_mapping: dict[type[Any], Callable[[Session, Any], None]] = {
     # fssbodysignals_v1_0.Model: processors.fssbodysignals_v1_0,
 }
 
+# Events consumed per model. Models not listed here consume every message of their schema.
+processor_events: dict[type[Any], frozenset[str]] = {
+    journal_v1_0.Model: processors.journal_v1_0.CONSUMED_EVENTS,
+}
+
+# Name/id caches shared by the processors are snapshotted to disk so a restart can pick up where it left off
+cache_snapshotter = CacheSnapshotter(
+    EDDN_CACHE_SNAPSHOT_FILE, [market_stations, system_addresses, faction_ids], EDDN_CACHE_SNAPSHOT_SECONDS
+)
+
+# Processors that buffer (eg, coalesce) writes expose a `flush(session, force)` the listener calls periodically
+processor_flushers: list[Callable[[Session, bool], None]] = [
+    processors.journal_v1_0.flush,
+    scheduler.flush,
+    cache_snapshotter.flush,
+]
 
-def approachsettlement_v1_0_model_to_controlling_faction_id(model: approachsettlement_v1_0.Model) -> int | None:
+ROUTER_SUMMARY_EVERY = 10_000
+FLUSH_EVERY_SECONDS = 1.0
+
+db_time = DBTimeTracker(engine)
+
+EDDN_RELAY_URL = "tcp://eddn.edcd.io:9500"
+
+# Messages buffered per priority lane between the relay socket and the processors. Once full, new messages are
+# dropped (and counted) here rather than silently by ZMQ's own high water mark on the relay side.
+LANE_MAX_MESSAGES = 10_000
+RECEIVE_POLL_TIMEOUT_MS = 1000
+
+
+def approachsettlement_v1_0_model_to_controlling_faction_id(
+    session: Session, model: approachsettlement_v1_0.Model
+) -> int | None:
     faction_id = None
     controlling_faction = getattr(model.message, "SystemFaction", None)
     if controlling_faction is not None:
         faction_name = controlling_faction.get("Name")
-        faction = FactionsAdapter().get_faction(faction_name)
+        faction = FactionsAdapter(session).get_faction(faction_name)
         if faction is not None:
             faction_id = faction.id
 
@@ -70,55 +116,237 @@ def approachsettlement_v1_0_model_to_controlling_faction_id(model: approachsettl
 
 def process_approachsettlement_v1_0(session: Session, model: approachsettlement_v1_0.Model) -> None:
     pass
-    # controlling_faction_id = EDDNListener.approachsettlement_v1_0_model_to_controlling_faction_id(model)
+    # controlling_faction_id = EDDNListener.approachsettlement_v1_0_model_to_controlling_faction_id(session, model)
     # system_dict = SystemsDB.to_dict_from_eddn(model, controlling_faction_id)
     # logger.info(pformat(system_dict))
 
 
-def run_listener(session: Session) -> None:
-    ctx = zmq.Context()
+def build_router() -> MessageRouter:
+    """Builds the `$schemaRef` -> model routing table for every schema that has a processor"""
+    router = MessageRouter()
+    for schema, module in module_mapping.items():
+        if module.Model not in processor_mapping:
+            continue
+        router.add_route(schema, module, processor_events.get(module.Model))
+    return router
+
+
+def process_message(session: Session, router: MessageRouter, d: dict[str, Any]) -> None:
+    route = router.route(d)
+    if route is None:
+        MESSAGES.inc(schema=schema_label(d.get("$schemaRef")), outcome="dropped")
+        return
+    process_routed_message(session, route, d)
+
+
+def process_routed_message(session: Session, route: Route, d: dict[str, Any]) -> None:
+    schema = schema_label(route.schema_ref)
+    message = d.get("message")
+    event_name = str(message.get("event", "")) if isinstance(message, dict) else ""
+
+    started_at = time.perf_counter()
+    db_time.reset()
+    try:
+        obj = route.module.Model.model_validate(d)
+    except Exception:
+        logger.error(traceback.format_exc())
+        logger.error(pformat(d))
+        MESSAGES.inc(schema=schema, outcome="invalid")
+        return
+
+    try:
+        with ingest_lag_scope(pending_lag(schema, d)):
+            processor_mapping[type(obj)](session, obj)
+    except Exception:
+        logger.error(traceback.format_exc())
+        MESSAGES.inc(schema=schema, outcome="failed")
+        return
+    finally:
+        PROCESSOR_SECONDS.observe(time.perf_counter() - started_at, schema=schema, event=event_name)
+        PROCESSOR_DB_SECONDS.observe(db_time.elapsed, schema=schema, event=event_name)
+
+    MESSAGES.inc(schema=schema, outcome="processed")
+
+
+def flush_processors(session: Session, force: bool = False) -> None:
+    for flush in processor_flushers:
+        try:
+            flush(session, force)
+        except Exception:
+            logger.error(traceback.format_exc())
+            session.rollback()
+
+
+def decode_frame(frame: bytes) -> dict[str, Any] | None:
+    try:
+        d = json.loads(zlib.decompress(frame))
+    except Exception:
+        logger.error(traceback.format_exc())
+        logger.error("Could not decode EDDN frame!")
+        return None
+
+    if not isinstance(d, dict) or d.get("$schemaRef") is None:
+        logger.warning("Could not find a valid $schemaRef field in decoded EDDN message!")
+        logger.warning(pformat(d))
+        return None
+    return d
+
+
+def process_frame(session: Session, router: MessageRouter, frame: bytes) -> None:
+    d = decode_frame(frame)
+    if d is None:
+        return
+    process_message(session, router, d)
+
+
+type RoutedMessage = tuple[Route, dict[str, Any]]
+
+
+def receive_frames(
+    ctx: zmq.Context[Any],
+    relay_url: str,
+    router: MessageRouter,
+    lanes: PriorityLanes[RoutedMessage],
+    spool: SpoolWriter | None,
+    stop: threading.Event,
+) -> None:
+    """Receives, decodes and routes frames from the relay into the priority lanes until `stop` is set
+
+    Runs on its own thread so a slow processor shows up as lane depth and counted drops instead of as silent drops
+    on the relay's side of the socket. Frames are spooled before anything else so the spool has everything received.
+    """
     sub = ctx.socket(zmq.SUB)
-    sub.connect("tcp://eddn.edcd.io:9500")
+    sub.connect(relay_url)
     sub.setsockopt_string(zmq.SUBSCRIBE, "")
+    received = 0
+    try:
+        while not stop.is_set():
+            if not sub.poll(RECEIVE_POLL_TIMEOUT_MS):
+                continue
+            frame = sub.recv_multipart()[0]
+            if spool is not None:
+                spool.append(frame)
+
+            received += 1
+            if received % ROUTER_SUMMARY_EVERY == 0:
+                router.log_summary()
+
+            d = decode_frame(frame)
+            if d is None:
+                continue
+            route = router.route(d)
+            if route is None:
+                MESSAGES.inc(schema=schema_label(d.get("$schemaRef")), outcome="dropped")
+                continue
 
+            message = d.get("message")
+            event_name = message.get("event") if isinstance(message, dict) else None
+            lanes.put(lanes.classify(schema_label(route.schema_ref), event_name), (route, d))
+    finally:
+        sub.close()
+
+
+def run_listener(session: Session, spool: SpoolWriter | None = None, relay_url: str = EDDN_RELAY_URL) -> None:
     import_generated_models()
+    router = build_router()
+    cache_snapshotter.restore(session)
+
+    ctx: zmq.Context[Any] = zmq.Context()
+    lanes: PriorityLanes[RoutedMessage] = PriorityLanes(
+        lanes_from_config(EDDN_LANES_CONFIG), LANE_MAX_MESSAGES, EDDN_DEGRADED_LAG_SECONDS
+    )
+    stop = threading.Event()
+    receiver = threading.Thread(
+        target=receive_frames, args=(ctx, relay_url, router, lanes, spool, stop), name="eddn-receiver", daemon=True
+    )
+    receiver.start()
 
     print("Listening for messages...")
-    while True:
-        msg = sub.recv_multipart()
-        d = json.loads(zlib.decompress(msg[0]))
-        schema = d.get("$schemaRef")
-        if schema is None:
-            logger.warning("Could not find a valid $schemaRef field in decoded EDDN message!")
-            logger.warning(pformat(d))
-            continue
+    flushed_at = time.monotonic()
+    try:
+        while True:
+            if time.monotonic() - flushed_at >= FLUSH_EVERY_SECONDS:
+                flush_processors(session)
+                flushed_at = time.monotonic()
 
-        try:
-            module = get_module_from_schema(schema)
-            obj = module.Model.model_validate(d)
-        except ValueError:
-            logger.error(traceback.format_exc())
-            logger.error(f"Got an unknown schema! '{schema}'")
-        except Exception:
-            logger.error(traceback.format_exc())
-            logger.error(pformat(d))
-            continue
+            next_message = lanes.get(timeout=FLUSH_EVERY_SECONDS)
+            if next_message is None:
+                if not receiver.is_alive():
+                    raise RuntimeError("EDDN receiver thread died!")
+                continue
+
+            _, (route, d) = next_message
+            process_routed_message(session, route, d)
+    finally:
+        stop.set()
+        receiver.join()
+        flush_processors(session, force=True)
+        if spool is not None:
+            spool.close()
+        ctx.term()
+
+
+def replay_spool(session: Session, spool_dir: Path, speed: float = 0.0, start_segment: int = 0) -> None:
+    """Feeds spooled EDDN frames through the same processors as the live listener
+
+    `speed` is a multiple of the original receive rate (eg, 2.0 replays twice as fast as the frames were received).
+    A `speed` of 0 (or less) replays as fast as the processors allow.
+    """
+    import_generated_models()
+    router = build_router()
 
-        obj_type = type(obj)
-        if issubclass(obj_type, BaseModel) and obj_type in processor_mapping:
-            try:
-                event = d.get("message", {}).get("event")
-                if event not in ["Scan", "FSDJump", "Docked"]:
-                    logger.trace("\n")
-                    logger.trace(d)
-                processor_mapping[obj_type](session, obj)
-            except Exception:
-                logger.error(traceback.format_exc())
+    replayed = 0
+    first_received_at: float | None = None
+    replay_started_at = time.monotonic()
+    for received_at, frame in read_spool(spool_dir, start_segment):
+        if speed > 0:
+            if first_received_at is None:
+                first_received_at = received_at
+            due_at = replay_started_at + (received_at - first_received_at) / speed
+            delay = due_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        process_frame(session, router, frame)
+        flush_processors(session)
+
+        replayed += 1
+        if replayed % ROUTER_SUMMARY_EVERY == 0:
+            router.log_summary()
+
+    flush_processors(session, force=True)
+    router.log_summary()
+    logger.info(f"[EDDN Replay] Replayed {replayed} frames from '{spool_dir}'")
+
+
+def main(
+    spool_dir: Path | None = None,
+    spool_segment_bytes: int | None = None,
+    relay_url: str = EDDN_RELAY_URL,
+    metrics_port: int | None = None,
+    cache_snapshot_file: Path = EDDN_CACHE_SNAPSHOT_FILE,
+) -> None:
+    if metrics_port is not None:
+        start_metrics_server(metrics_port)
+    cache_snapshotter.path = cache_snapshot_file
+
+    # Every message is processed on this one session, so the listener holds at most one connection at a time
+    session = SessionLocal()
+    spool = None
+    if spool_dir is not None:
+        spool = SpoolWriter(spool_dir) if spool_segment_bytes is None else SpoolWriter(spool_dir, spool_segment_bytes)
+    try:
+        run_listener(session, spool, relay_url)
+    finally:
+        SessionLocal.remove()
 
 
-def main() -> None:
+def main_replay(spool_dir: Path, speed: float = 0.0, start_segment: int = 0) -> None:
     session = SessionLocal()
-    run_listener(session)
+    try:
+        replay_spool(session, spool_dir, speed, start_segment)
+    finally:
+        SessionLocal.remove()
 
 
 if __name__ == "__main__":
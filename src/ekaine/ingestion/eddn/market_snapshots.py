@@ -0,0 +1,93 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from ekaine.common.logging import get_logger
+
+logger = get_logger(__name__)
+
+# The market_commodities columns that make up a station's market "state". `updated_at` is deliberately excluded so
+# a resend of an unchanged market hashes the same.
+SNAPSHOT_COLUMNS = ("buy_price", "sell_price", "supply", "demand")
+
+type MarketRow = tuple[Any, ...]
+
+
+@dataclass
+class MarketSnapshot:
+    digest: str
+    timestamp: datetime
+    rows: dict[str, MarketRow]  # commodity_sym -> SNAPSHOT_COLUMNS values
+    written_at: float  # time.monotonic() of the last time every row was written
+
+
+@dataclass
+class MarketDiff:
+    """What needs writing for an incoming market message. Apply `snapshot` to the cache once the write succeeded."""
+
+    outcome: str  # "duplicate", "stale", "changed" or "full"
+    rows: list[dict[str, Any]]
+    snapshot: MarketSnapshot | None
+
+    @property
+    def skipped(self) -> bool:
+        return self.snapshot is None
+
+
+def snapshot_rows(rows: list[dict[str, Any]]) -> dict[str, MarketRow]:
+    return {row["commodity_sym"]: tuple(row[col] for col in SNAPSHOT_COLUMNS) for row in rows}
+
+
+def snapshot_digest(rows: dict[str, MarketRow]) -> str:
+    return hashlib.blake2b(repr(sorted(rows.items())).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class MarketSnapshotCache:
+    """Bounded LRU of the last market snapshot written per station
+
+    Used to drop exact resends of a market (EDDN sees the same market from every commander docked there) and to
+    write only the commodities whose values changed otherwise. Every `full_write_every_seconds` a station's whole
+    market is written regardless so unchanged rows' `updated_at` doesn't fall too far behind.
+    """
+
+    def __init__(self, max_stations: int = 10_000, full_write_every_seconds: float = 60 * 60) -> None:
+        self.max_stations = max_stations
+        self.full_write_every_seconds = full_write_every_seconds
+        self.snapshots: OrderedDict[int, MarketSnapshot] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.snapshots)
+
+    def diff(self, station_id: int, rows: list[dict[str, Any]], timestamp: datetime) -> MarketDiff:
+        now = time.monotonic()
+        current = snapshot_rows(rows)
+        digest = snapshot_digest(current)
+
+        previous = self.snapshots.get(station_id)
+        if previous is not None:
+            self.snapshots.move_to_end(station_id)
+
+        if previous is None:
+            return MarketDiff("full", rows, MarketSnapshot(digest, timestamp, current, now))
+        # Before the full write check, so a late snapshot can never replace a newer one
+        if timestamp < previous.timestamp:
+            return MarketDiff("stale", [], None)
+        if now - previous.written_at >= self.full_write_every_seconds:
+            return MarketDiff("full", rows, MarketSnapshot(digest, timestamp, current, now))
+        if digest == previous.digest:
+            return MarketDiff("duplicate", [], None)
+
+        changed = [row for row in rows if previous.rows.get(row["commodity_sym"]) != current[row["commodity_sym"]]]
+        return MarketDiff("changed", changed, MarketSnapshot(digest, timestamp, current, previous.written_at))
+
+    def store(self, station_id: int, snapshot: MarketSnapshot) -> None:
+        self.snapshots[station_id] = snapshot
+        self.snapshots.move_to_end(station_id)
+        while len(self.snapshots) > self.max_stations:
+            self.snapshots.popitem(last=False)
+
+    def invalidate(self, station_id: int) -> None:
+        self.snapshots.pop(station_id, None)
@@ -0,0 +1,205 @@
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Iterable, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from ekaine.common.metrics import REGISTRY
+
+EDDN_SCHEMA_PREFIX = "https://eddn.edcd.io/schemas/"
+
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+MESSAGES = REGISTRY.counter(
+    "eddn_messages_total",
+    "EDDN messages received, by schema and outcome (processed/dropped/invalid/failed)",
+    ("schema", "outcome"),
+)
+INGEST_LAG = REGISTRY.histogram(
+    "eddn_ingest_lag_seconds",
+    "Seconds between a message's EDDN gatewayTimestamp and it being committed, incl. time spent coalesced or parked",
+    ("schema",),
+    LAG_BUCKETS,
+)
+PROCESSOR_SECONDS = REGISTRY.histogram(
+    "eddn_processor_seconds",
+    "Wall time spent validating and processing a single message",
+    ("schema", "event"),
+)
+PROCESSOR_DB_SECONDS = REGISTRY.histogram(
+    "eddn_processor_db_seconds",
+    "Time spent waiting on the DB while processing a single message",
+    ("schema", "event"),
+)
+UNKNOWN_ENTITY_DROPS = REGISTRY.counter(
+    "eddn_unknown_entity_drops_total",
+    "Messages dropped because they referenced a system/station we don't track",
+    ("schema", "entity"),
+)
+MARKET_SNAPSHOTS = REGISTRY.counter(
+    "eddn_market_snapshots_total",
+    "Commodity messages by what the market snapshot cache decided (full/changed/duplicate/stale)",
+    ("outcome",),
+)
+MARKET_ROWS = REGISTRY.counter(
+    "eddn_market_rows_total",
+    "Commodity rows in processed market messages, by whether they were written or skipped as unchanged",
+    ("outcome",),
+)
+BODY_ROWS = REGISTRY.counter(
+    "eddn_body_rows_total",
+    "Bodies from journal Scan events, by whether they were inserted, updated or skipped as unchanged",
+    ("outcome",),
+)
+HOTSPOT_ROWS = REGISTRY.counter(
+    "eddn_hotspot_rows_total",
+    "Ring hotspot rows upserted from journal SAASignalsFound events",
+)
+CARRIER_POSITIONS = REGISTRY.counter(
+    "eddn_carrier_positions_total",
+    "Fleet carrier sightings from Docked/CarrierJump, by whether the carrier jumped, was refreshed or left as is",
+    ("outcome",),
+)
+PENDING_CHILDREN = REGISTRY.counter(
+    "eddn_pending_children_total",
+    "Messages held back until the entity they reference is written, by what happened to them",
+    ("kind", "outcome"),
+)
+PENDING_CHILDREN_SIZE = REGISTRY.gauge(
+    "eddn_pending_parent_keys",
+    "Entities (eg, markets or systems) that held back messages are currently waiting on",
+    ("kind",),
+)
+CACHE_SNAPSHOTS = REGISTRY.counter(
+    "eddn_cache_snapshots_total",
+    "Resolution cache snapshots by cache and outcome (saved/restored/stale/missing)",
+    ("cache", "outcome"),
+)
+COALESCED_MESSAGES = REGISTRY.counter(
+    "eddn_coalesced_messages_total",
+    "Messages merged into a pending update for the same key instead of being written on their own",
+    ("schema", "event"),
+)
+TIMESERIES_SAMPLES = REGISTRY.counter(
+    "eddn_timeseries_samples_total",
+    "Per-system timeseries samples, by whether they were written or skipped by the sampling granularity",
+    ("outcome",),
+)
+HWM_DROPS = REGISTRY.counter(
+    "eddn_hwm_drops_total",
+    "Messages dropped because their receive queue between the relay socket and the processors was full",
+)
+RECEIVE_QUEUE_DEPTH = REGISTRY.gauge(
+    "eddn_receive_queue_depth",
+    "Messages received from the relay and waiting to be processed, per priority lane",
+    ("lane",),
+)
+SHED_MESSAGES = REGISTRY.counter(
+    "eddn_shed_messages_total",
+    "Messages dropped by the priority lanes, by lane and reason (shed/sample while degraded, full)",
+    ("lane", "reason"),
+)
+LANE_LAG = REGISTRY.gauge(
+    "eddn_lane_lag_seconds",
+    "Age of the oldest message waiting in any priority lane",
+)
+DEGRADED_MODE = REGISTRY.gauge(
+    "eddn_degraded_mode",
+    "1 while the listener is shedding/sampling low priority lanes because it's fallen behind",
+)
+
+
+PARTITIONED_MESSAGES = REGISTRY.counter(
+    "eddn_partitioned_messages_total",
+    "Frames forwarded by the partition router, by consumer partition",
+    ("partition",),
+)
+
+
+def schema_label(schema_ref: Any) -> str:
+    """Shortens eg 'https://eddn.edcd.io/schemas/journal/1' to 'journal/1' for use as a metric label"""
+    return str(schema_ref).removeprefix(EDDN_SCHEMA_PREFIX)
+
+
+def parse_gateway_timestamp(d: dict[str, Any]) -> datetime | None:
+    header = d.get("header")
+    gateway_timestamp = header.get("gatewayTimestamp") if isinstance(header, dict) else None
+    if not isinstance(gateway_timestamp, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(gateway_timestamp)
+    except ValueError:
+        return None
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
+
+
+# (schema label, gatewayTimestamp) of a message whose ingest lag is yet to be observed
+type PendingLag = tuple[str, datetime]
+
+# The lag of the message currently being processed on this thread, and whether its processor deferred it
+ingest_context = threading.local()
+
+
+def pending_lag(schema: str, d: dict[str, Any]) -> PendingLag | None:
+    gateway_dt = parse_gateway_timestamp(d)
+    return (schema, gateway_dt) if gateway_dt is not None else None
+
+
+def observe_ingest_lags(lags: Iterable[PendingLag]) -> None:
+    now = datetime.now(timezone.utc)
+    for schema, gateway_dt in lags:
+        INGEST_LAG.observe(max(0.0, (now - gateway_dt).total_seconds()), schema=schema)
+
+
+@contextmanager
+def ingest_lag_scope(lag: PendingLag | None) -> Iterator[None]:
+    """Observes `lag` once the message processed in the block is committed, ie when the block completes without the
+    processor deferring the message with `defer_ingest_lag()`. Scopes nest, eg for parked messages being released."""
+    previous = (getattr(ingest_context, "lag", None), getattr(ingest_context, "deferred", False))
+    ingest_context.lag, ingest_context.deferred = lag, False
+    try:
+        yield
+        if lag is not None and not ingest_context.deferred:
+            observe_ingest_lags([lag])
+    finally:
+        ingest_context.lag, ingest_context.deferred = previous
+
+
+def defer_ingest_lag() -> PendingLag | None:
+    """For processors that hold on to the current message (coalescing or parking it) instead of committing it
+
+    Returns the message's lag, to pass to `observe_ingest_lags()` (or a nested `ingest_lag_scope()`) once it's been
+    committed, and stops the enclosing `ingest_lag_scope()` from observing it now.
+    """
+    ingest_context.deferred = True
+    return getattr(ingest_context, "lag", None)
+
+
+class DBTimeTracker:
+    """Accumulates time spent in cursor executions on `engine`, per thread
+
+    Usage: `reset()` before processing a message and read `elapsed` after.
+    """
+
+    def __init__(self, tracked_engine: Engine) -> None:
+        self.local = threading.local()
+        event.listen(tracked_engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(tracked_engine, "after_cursor_execute", self.after_cursor_execute)
+
+    def before_cursor_execute(self, conn: Any, *args: Any) -> None:
+        conn.info.setdefault("eddn_query_started_at", []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn: Any, *args: Any) -> None:
+        started = conn.info.get("eddn_query_started_at")
+        if started:
+            self.local.elapsed = self.elapsed + time.perf_counter() - started.pop()
+
+    def reset(self) -> None:
+        self.local.elapsed = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        return float(getattr(self.local, "elapsed", 0.0))
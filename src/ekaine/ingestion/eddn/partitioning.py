@@ -0,0 +1,136 @@
+import json
+import threading
+import traceback
+import zlib
+from pathlib import Path
+from typing import Any
+
+import zmq
+
+from ekaine.common.logging import get_logger
+from ekaine.common.metrics import start_metrics_server
+from ekaine.ingestion.eddn.metrics import PARTITIONED_MESSAGES, schema_label
+
+logger = get_logger(__name__)
+
+DEFAULT_PARTITION_BASE_PORT = 9510
+PARTITION_HOST = "127.0.0.1"
+RECEIVE_POLL_TIMEOUT_MS = 1000
+
+# Messages whose writes are keyed on the market (station) rather than the system, as "<schema>" or "<schema>:<event>"
+MARKET_KEYED = frozenset({"commodity/3", "journal/1:Docked", "journal/1:CarrierJump"})
+
+
+def partition_url(partition: int, base_port: int = DEFAULT_PARTITION_BASE_PORT, host: str = PARTITION_HOST) -> str:
+    return f"tcp://{host}:{base_port + partition}"
+
+
+def partition_path(path: Path, partition: int) -> Path:
+    """Gives each partition's consumer its own copy of a file or directory, eg 'eddn_spool' -> 'eddn_spool_p1'"""
+    return path.with_name(f"{path.stem}_p{partition}{path.suffix}")
+
+
+def partition_key(d: dict[str, Any]) -> int | str | None:
+    """The entity a message's writes are keyed on: its MarketID for market messages, else its SystemAddress
+
+    Falls back to the system name for schemas without a SystemAddress.
+    """
+    message = d.get("message")
+    if not isinstance(message, dict):
+        return None
+
+    schema = schema_label(d.get("$schemaRef"))
+    if schema in MARKET_KEYED or f"{schema}:{message.get('event')}" in MARKET_KEYED:
+        market_id = message.get("MarketID") or message.get("marketId")
+        if market_id is not None:
+            return int(market_id)
+
+    system_address = message.get("SystemAddress")
+    if system_address is not None:
+        return int(system_address)
+    system_name = message.get("StarSystem") or message.get("systemName")
+    return str(system_name) if system_name is not None else None
+
+
+def partition_for(key: int | str | None, partitions: int) -> int:
+    """Stable across processes and restarts, unlike `hash()`. Messages without a key all go to partition 0."""
+    if key is None:
+        return 0
+    return zlib.crc32(str(key).encode("utf-8")) % partitions
+
+
+class PartitionRouter:
+    """Subscribes to the relay and forwards each frame, unchanged, to one of `partitions` local PUB sockets
+
+    Every message for the same market/system goes to the same partition, so each consumer (a regular listener
+    subscribed to its partition's url) owns the core rows it writes and consumers don't race on those upserts.
+    What's derived from both market and system data is still shared: `derived.reinforcement_mining_routes` is
+    refreshed for the same systems by market consumers (commodity messages) and system consumers (power changes,
+    ring hotspots), so those refreshes can contend and rely on ordered writes and deadlock retries. The one
+    cross-partition dependency is a Docked for a station in a system we don't have yet: it waits on its market's
+    consumer until a later Docked finds the system inserted by the system's consumer, or it expires.
+    """
+
+    def __init__(
+        self,
+        ctx: zmq.Context[Any],
+        relay_url: str,
+        partitions: int,
+        base_port: int = DEFAULT_PARTITION_BASE_PORT,
+        host: str = PARTITION_HOST,
+    ) -> None:
+        if partitions < 1:
+            raise ValueError("At least one partition is required!")
+        self.ctx = ctx
+        self.relay_url = relay_url
+        self.partitions = partitions
+        self.urls = [partition_url(partition, base_port, host) for partition in range(partitions)]
+
+    def run(self, stop: threading.Event) -> None:
+        sub = self.ctx.socket(zmq.SUB)
+        sub.connect(self.relay_url)
+        sub.setsockopt_string(zmq.SUBSCRIBE, "")
+
+        pubs = []
+        for url in self.urls:
+            pub = self.ctx.socket(zmq.PUB)
+            pub.bind(url)
+            pubs.append(pub)
+        logger.info(f"[EDDN Partition Router] Forwarding '{self.relay_url}' to {', '.join(self.urls)}")
+
+        try:
+            while not stop.is_set():
+                if not sub.poll(RECEIVE_POLL_TIMEOUT_MS):
+                    continue
+                frame = sub.recv_multipart()[0]
+                partition = self.route(frame)
+                pubs[partition].send_multipart([frame])
+                PARTITIONED_MESSAGES.inc(partition=str(partition))
+        finally:
+            sub.close()
+            for pub in pubs:
+                pub.close()
+
+    def route(self, frame: bytes) -> int:
+        try:
+            d = json.loads(zlib.decompress(frame))
+        except Exception:
+            # Let the consumer log it. It has the same decoding (and error handling) as the standalone listener.
+            logger.debug(traceback.format_exc())
+            return 0
+        return partition_for(partition_key(d) if isinstance(d, dict) else None, self.partitions)
+
+
+def main(
+    relay_url: str, partitions: int, base_port: int = DEFAULT_PARTITION_BASE_PORT, metrics_port: int | None = None
+) -> None:
+    if metrics_port is not None:
+        start_metrics_server(metrics_port)
+
+    ctx: zmq.Context[Any] = zmq.Context()
+    stop = threading.Event()
+    try:
+        PartitionRouter(ctx, relay_url, partitions, base_port).run(stop)
+    finally:
+        stop.set()
+        ctx.term()
@@ -1,13 +1,22 @@
 from sqlalchemy.orm import Session
 
 from ekaine.common.logging import get_logger
-from ekaine.postgresql.adapter import StationsAdapter
-from ekaine.postgresql.db import MarketCommoditiesDB
-from ekaine.postgresql.utils import upsert_all
+from ekaine.ingestion.eddn.caches import market_stations
+from ekaine.ingestion.eddn.market_snapshots import MarketSnapshotCache
+from ekaine.ingestion.eddn.metrics import MARKET_ROWS, MARKET_SNAPSHOTS
+from ekaine.ingestion.eddn.scheduler import MARKET, scheduler
+from ekaine.postgresql.db import (
+    MarketCommoditiesDB,
+    ReinforcementMiningRoutesDB,
+    StationCommoditiesDB,
+)
+from ekaine.postgresql.unit_of_work import UnitOfWork, in_unit_of_work
 from gen.eddn_models import commodity_v3_0
 
 logger = get_logger(__name__)
 
+market_snapshots = MarketSnapshotCache()
+
 
 def process_model(session: Session, model: commodity_v3_0.Model) -> None:
     """
@@ -15,22 +24,54 @@ def process_model(session: Session, model: commodity_v3_0.Model) -> None:
 
     Updates:
     - MarketCommoditiesDB
+    - StationCommoditiesDB
+    - ReinforcementMiningRoutesDB
 
     """
     # May want to filter any stations with "invalid characters" like '$' or ';'
     # Some station names come through like '$EXT_PANEL_ColonisationShip; Skvortsov Territory'
     station_name = model.message.stationName
+    market_id = model.message.marketId
 
-    try:
-        station = StationsAdapter().get_station(station_name)
-    except ValueError:
-        logger.warning(f"Encountered station name that we don't know about! '{station_name}'")
+    station_id = in_unit_of_work(
+        session,
+        lambda uow: market_stations.resolve(uow, market_id, model.message.systemName, station_name),
+        "commodity/3 station",
+    )
+    if station_id is None:
+        # Held until a journal Docked event for the market lets us insert the station, or dropped on expiry
+        logger.debug(f"Encountered market that we don't know about! '{station_name}' ({market_id})")
+        scheduler.park(MARKET, market_id, model)
+        return
+
+    commodity_dicts = MarketCommoditiesDB.to_dicts_from_eddn(model, station_id)
+    diff = market_snapshots.diff(station_id, commodity_dicts, model.message.timestamp)
+    MARKET_SNAPSHOTS.inc(outcome=diff.outcome)
+    MARKET_ROWS.inc(len(diff.rows), outcome="written")
+    MARKET_ROWS.inc(len(commodity_dicts) - len(diff.rows), outcome="unchanged")
+    if diff.snapshot is None:
+        logger.debug(f"[Market Commodities DB Skipped] {model.message.systemName} - {station_name} - {diff.outcome}")
         return
 
-    commodity_dicts = MarketCommoditiesDB.to_dicts_from_eddn(model, station.id)
-    upsert_all(session, MarketCommoditiesDB, commodity_dicts)
+    snapshot = diff.snapshot
+
+    def write(uow: UnitOfWork) -> None:
+        uow.upsert(MarketCommoditiesDB, diff.rows)
+        StationCommoditiesDB.refresh(uow.session, [station_id], commit=False)
+        ReinforcementMiningRoutesDB.refresh_stations(uow.session, [station_id], commit=False)
+        uow.on_commit(lambda: market_snapshots.store(station_id, snapshot))
+
+    try:
+        in_unit_of_work(session, write, "commodity/3")
+    except Exception:
+        market_snapshots.invalidate(station_id)
+        raise
 
     logger.info(
         "[Market Commodities DB Updated] "
-        f"{model.message.systemName} - {station_name} - {len(model.message.commodities)} Commodities"
+        f"{model.message.systemName} - {station_name} - {len(diff.rows)}/{len(commodity_dicts)} Commodities"
     )
+
+
+# Only the latest market per station is worth keeping around
+scheduler.register(MARKET, process_model, ttl_seconds=10 * 60, max_keys=2_000, max_per_key=1)
@@ -3,6 +3,7 @@ from typing import cast
 from sqlalchemy.orm import Session
 
 from ekaine.common.logging import get_logger
+from ekaine.ingestion.eddn.metrics import UNKNOWN_ENTITY_DROPS
 from ekaine.postgresql.adapter import SystemsAdapter
 from gen.eddn_models import fssbodysignals_v1_0
 
@@ -23,6 +24,7 @@ def process_model(session: Session, model: fssbodysignals_v1_0.Model) -> None:
     except ValueError:
         # We currently only track systems with population > 0, so plenty of systems won't be found.
         logger.debug(f"Encountered system we didn't know about! '{system_name}'")
+        UNKNOWN_ENTITY_DROPS.inc(schema="fssbodysignals/1", entity="system")
         return
 
     logger.info(system)
@@ -3,6 +3,7 @@ from typing import cast
 from sqlalchemy.orm import Session
 
 from ekaine.common.logging import get_logger
+from ekaine.ingestion.eddn.metrics import UNKNOWN_ENTITY_DROPS
 from ekaine.postgresql.adapter import SystemsAdapter
 from ekaine.postgresql.timeseries import SignalsTimeseries
 from ekaine.postgresql.utils import upsert_all
@@ -21,10 +22,11 @@ def process_model(session: Session, model: fsssignaldiscovered_v1_0.Model) -> No
     """
     system_name = cast(str, model.message.StarSystem)
     try:
-        system = SystemsAdapter().get_system(system_name)
+        system = SystemsAdapter(session).get_system(system_name)
     except ValueError:
         # We currently only track systems with population > 0, so plenty of systems won't be found.
         logger.debug(f"Encountered system we didn't know about! '{system_name}'")
+        UNKNOWN_ENTITY_DROPS.inc(schema="fsssignaldiscovered/1", entity="system")
         return
 
     signal_timeseries_dicts = SignalsTimeseries.to_dicts_from_fsssignaldiscovered_v1_0(model, system.id)
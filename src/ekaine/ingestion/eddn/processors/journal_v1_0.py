@@ -1,45 +1,139 @@
 import traceback
 from pprint import pformat
-from typing import cast
+from typing import Any, Callable, cast
 
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
+from ekaine.common.constants import (
+    EDDN_RECORD_CARRIER_JUMPS,
+    EDDN_SYSTEM_COALESCE_SECONDS,
+    EDDN_TIMESERIES_GRANULARITY_SECONDS,
+)
 from ekaine.common.logging import get_logger
+from ekaine.ingestion.eddn.caches import (
+    BodyIdCache,
+    RingIdCache,
+    body_digest,
+    carrier_positions,
+    faction_ids,
+    market_stations,
+    system_addresses,
+)
+from ekaine.ingestion.eddn.coalescer import LatestByKeyCoalescer, TimeseriesSampler
+from ekaine.ingestion.eddn.metrics import (
+    BODY_ROWS,
+    CARRIER_POSITIONS,
+    COALESCED_MESSAGES,
+    HOTSPOT_ROWS,
+    TIMESERIES_SAMPLES,
+    UNKNOWN_ENTITY_DROPS,
+    observe_ingest_lags,
+)
+from ekaine.ingestion.eddn.scheduler import MARKET, SYSTEM, scheduler
 from ekaine.postgresql.adapter import FactionsAdapter, SystemsAdapter
-from ekaine.postgresql.db import FactionPresencesDB, SystemsDB
+from ekaine.postgresql.db import (
+    BodiesDB,
+    CarrierPositionsDB,
+    FactionPresencesDB,
+    FactionsDB,
+    HotspotsDB,
+    ReinforcementMiningRoutesDB,
+    StationsDB,
+    SystemsDB,
+)
 from ekaine.postgresql.timeseries import (
+    CarrierJumpsTimeseries,
     FactionPresencesTimeseries,
     PowerConflictProgressTimeseries,
     SystemsTimeseries,
 )
-from ekaine.postgresql.utils import upsert_all
+from ekaine.postgresql.unit_of_work import UnitOfWork, in_unit_of_work
 from gen.eddn_models import journal_v1_0
 
 logger = get_logger(__name__)
 
+# Journal events process_model() does anything with. Everything else is dropped by the listener's router before
+# model validation, so add the event here when adding a handler for it below.
+CONSUMED_EVENTS = frozenset({"FSDJump", "Location", "Docked", "CarrierJump", "Scan", "SAASignalsFound"})
+
+# Events that only carry system state. Within the coalescing window only the latest per system is written.
+COALESCED_EVENTS = frozenset({"FSDJump", "Location"})
+
+system_updates: LatestByKeyCoalescer[int | str, journal_v1_0.Model] = LatestByKeyCoalescer(EDDN_SYSTEM_COALESCE_SECONDS)
+timeseries_sampler: TimeseriesSampler[int] = TimeseriesSampler(EDDN_TIMESERIES_GRANULARITY_SECONDS)
+
+# Scans are by far the most common journal event. They're written in batches every `BODY_SCAN_BATCH_SECONDS`, keeping
+# only the latest scan per (system id, BodyID) and skipping bodies whose row wouldn't change.
+BODY_SCAN_BATCH_SECONDS = 5.0
+body_scans: LatestByKeyCoalescer[tuple[int, int], tuple[int, journal_v1_0.Model]] = LatestByKeyCoalescer(
+    BODY_SCAN_BATCH_SECONDS
+)
+body_ids = BodyIdCache()
+
+# Ring hotspots from SAASignalsFound are batched the same way, keyed on (system id, ring name)
+ring_signals: LatestByKeyCoalescer[tuple[int, str], tuple[int, journal_v1_0.Model]] = LatestByKeyCoalescer(
+    BODY_SCAN_BATCH_SECONDS
+)
+ring_ids = RingIdCache()
+
+# Called with the ids of the systems whose hotspots changed after each hotspot batch, so tables derived from hotspots
+# can be refreshed for just those systems. Run inside the batch's unit of work with `commit=False`.
+hotspot_refreshers: list[Callable[[Session, set[int], bool], None]] = []
+
 
-def model_to_faction_name_to_id_mapping(model: journal_v1_0.Model) -> dict[str, int]:
+def model_to_faction_name_to_id_mapping(
+    session: Session, model: journal_v1_0.Model, insert_missing: bool = False
+) -> dict[str, int]:
+    """Resolves the message's factions from the cache, and whatever the cache doesn't have with a single query
+
+    Factions found (or, with `insert_missing`, inserted) by that query aren't added to the cache, since they may only
+    exist in the caller's uncommitted transaction.
+    """
     mapping: dict[str, int] = {}
+    missing: list[str] = []
     for faction in model.message.Factions or []:
         faction_name = faction.Name
         if faction_name is None:
             logger.warning(f"Encountered Faction object with no Name! '{pformat(faction)}'")
             continue
-        faction_obj = FactionsAdapter().get_faction(faction_name)
-        if faction_obj is not None:
-            mapping[faction_name] = faction_obj.id
+        faction_id = faction_ids.resolve(session, faction_name)
+        if faction_id is not None:
+            mapping[faction_name] = faction_id
+        else:
+            missing.append(faction_name)
 
+    if missing:
+        mapping.update(FactionsAdapter(session).get_factions(missing, insert_missing=insert_missing))
     return mapping
 
 
-def process_saa_signals_found(model: journal_v1_0.Model) -> None:
+def process_saa_signals_found(session: Session, model: journal_v1_0.Model) -> None:
     if model.message.event.value != "SAASignalsFound":
         raise ValueError(f"Expected a SAASignalsFound Journal event but got '{model.message.event}'!")
-    pass
+
+    msg = model.message
+    body_name = getattr(msg, "BodyName", None)
+    # Bodies get SAASignalsFound for bio/geo signals too. Only ring hotspots are tracked.
+    if msg.SystemAddress is None or body_name is None or not body_name.endswith(" Ring"):
+        return
+
+    system_id = system_addresses.resolve(session, msg.SystemAddress)
+    if system_id is None:
+        UNKNOWN_ENTITY_DROPS.inc(schema="journal/1", entity="system")
+        return
+
+    if ring_signals.offer((system_id, body_name), (system_id, model), msg.timestamp):
+        COALESCED_MESSAGES.inc(schema="journal/1", event="SAASignalsFound")
 
 
 def process_system_entities(
-    session: Session, model: journal_v1_0.Model, system: SystemsDB, faction_id_mapping: dict[str, int]
+    uow: UnitOfWork,
+    model: journal_v1_0.Model,
+    system: SystemsDB,
+    faction_id_mapping: dict[str, int],
+    sample_timeseries: bool = True,
 ) -> None:
     """Process System related entries from the journal-v1.0 EDDN event"""
     controlling_faction_name = getattr(model.message, "SystemFaction", {}).get("Name")
@@ -48,56 +142,66 @@ def process_system_entities(
     )
 
     system_dict = SystemsDB.to_dict_from_eddn(model, controlling_faction_id)
-    systems = upsert_all(session, SystemsDB, [system_dict])
+    # `system` is as it was before this update
+    power_changed = (system.controlling_power, system.power_state) != (
+        system_dict.get("controlling_power"),
+        system_dict.get("power_state"),
+    )
+    # A message without a SystemAddress mustn't unset the id64 everything resolves the system by
+    systems = uow.upsert(SystemsDB, [system_dict], exclude_update_cols=["id64"])
     logger.info(f"[System DB Updated] {system.name}")
 
     if len(systems) == 0:
         raise RuntimeError("Upserted a system but got no object back!")
     system = systems[0]
+    if power_changed:
+        ReinforcementMiningRoutesDB.refresh(uow.session, [system.id], commit=False)
 
-    system_dict = SystemsTimeseries.to_dict_from_eddn(model, system.id, controlling_faction_id)
-    upsert_all(session, SystemsTimeseries, [system_dict])
+    if sample_timeseries:
+        system_dict = SystemsTimeseries.to_dict_from_eddn(model, system.id, controlling_faction_id)
+        uow.queue(SystemsTimeseries, [system_dict])
 
 
 def process_faction_entities(
-    session: Session, model: journal_v1_0.Model, system: SystemsDB, faction_id_mapping: dict[str, int]
+    uow: UnitOfWork,
+    model: journal_v1_0.Model,
+    system: SystemsDB,
+    faction_id_mapping: dict[str, int],
+    sample_timeseries: bool = True,
 ) -> None:
     """Process Factions related entries from the journal-v1.0 EDDN event"""
     faction_presence_dicts = FactionPresencesDB.to_dicts_from_eddn(model, system.id, faction_id_mapping)
-    faction_presence_ts_dicts = FactionPresencesTimeseries.to_dicts_from_eddn(model, system.id, faction_id_mapping)
-    try:
-        upsert_all(session, FactionPresencesDB, faction_presence_dicts)
-        upsert_all(session, FactionPresencesTimeseries, faction_presence_ts_dicts)
-    except Exception:
-        logger.warning(traceback.format_exc())
-        logger.warning(pformat(faction_presence_dicts))
-        logger.warning(pformat(model.message.Factions))
-        return
-
-    if len(faction_presence_dicts) == len(faction_presence_ts_dicts):
-        logger.info(
-            f"[Faction Presence DB + Timeseries Updated] {system.name} - {len(faction_presence_dicts)} factions"
-        )
-    else:
-        logger.warning("?? Updated different numbers of rows in the DB vs Timeseries for Faction Presence!")
-        logger.info(
-            f"[Faction Presence DB + Timeseries Updated] {system.name} - {len(faction_presence_dicts)} factions"
-        )
-        logger.info(f"[Faction Presence Timeseries Updated] {system.name} - {len(faction_presence_ts_dicts)} factions")
+    faction_presence_ts_dicts = (
+        FactionPresencesTimeseries.to_dicts_from_eddn(model, system.id, faction_id_mapping) if sample_timeseries else []
+    )
+    # A bad faction presence shouldn't lose the system update it came with
+    with uow.isolated("faction presences"):
+        uow.upsert(FactionPresencesDB, faction_presence_dicts)
+        uow.upsert(FactionPresencesTimeseries, faction_presence_ts_dicts)
+        if not sample_timeseries:
+            logger.info(f"[Faction Presence DB Updated] {system.name} - {len(faction_presence_dicts)} factions")
+        elif len(faction_presence_dicts) == len(faction_presence_ts_dicts):
+            logger.info(
+                f"[Faction Presence DB + Timeseries Updated] {system.name} - {len(faction_presence_dicts)} factions"
+            )
+        else:
+            logger.warning("?? Updated different numbers of rows in the DB vs Timeseries for Faction Presence!")
+            logger.info(
+                f"[Faction Presence DB + Timeseries Updated] {system.name} - {len(faction_presence_dicts)} factions"
+            )
+            logger.info(
+                f"[Faction Presence Timeseries Updated] {system.name} - {len(faction_presence_ts_dicts)} factions"
+            )
 
 
-def process_powerplay_entities(session: Session, model: journal_v1_0.Model, system: SystemsDB) -> None:
+def process_powerplay_entities(uow: UnitOfWork, model: journal_v1_0.Model, system: SystemsDB) -> None:
     """Process Powerplay related entries from the journal-v1.0 EDDN event"""
     power_conflict_progress_dicts = PowerConflictProgressTimeseries.to_dicts_from_eddn(model, system.id)
 
-    if power_conflict_progress_dicts:
-        try:
-            upsert_all(session, PowerConflictProgressTimeseries, power_conflict_progress_dicts)
-        except Exception:
-            logger.warning(traceback.format_exc())
-            logger.warning(pformat(power_conflict_progress_dicts))
-            return
-
+    if not power_conflict_progress_dicts:
+        return
+    with uow.isolated("power conflict progress"):
+        uow.upsert(PowerConflictProgressTimeseries, power_conflict_progress_dicts)
         logger.info(
             "[Power Conflict Progress Timeseries Updated] "
             f"{system.name} - {len(power_conflict_progress_dicts)} powers"
@@ -111,6 +215,13 @@ def process_model(session: Session, model: journal_v1_0.Model) -> None:
     Updates:
     - SystemsDB
     - SystemsTimeseries
+    - FactionsDB (new systems only)
+    - BodiesDB
+    - HotspotsDB
+    - ReinforcementMiningRoutesDB
+    - StationsDB (new stations only)
+    - CarrierPositionsDB
+    - CarrierJumpsTimeseries
     - FactionPresencesDB
     - FactionPresencesTimeseries
     - SignalsTimeseries
@@ -294,27 +405,331 @@ def process_model(session: Session, model: journal_v1_0.Model) -> None:
         'event': 'CarrierJump', 'horizons': True, 'odyssey': True, 'timestamp': '2025-05-22T00:52:11Z'}}
     - CodexEntry
     """
-    # if model.message.Factions is not None:
+    event_name = model.message.event.value
+    if event_name in ["Docked", "CarrierJump"]:
+        process_docked(session, model)
+        return
+
+    if event_name == "Scan":
+        process_scan(session, model)
+        return
+
+    if event_name == "SAASignalsFound":
+        process_saa_signals_found(session, model)
+        return
+
+    if event_name in COALESCED_EVENTS:
+        key = model.message.SystemAddress or cast(str, model.message.StarSystem)
+        if system_updates.offer(key, model, model.message.timestamp):
+            COALESCED_MESSAGES.inc(schema="journal/1", event=event_name)
+        return
+
+    process_system_update(session, model)
+
+
+def process_system_update(session: Session, model: journal_v1_0.Model) -> None:
+    """Writes everything a (possibly coalesced) system state event updates, in one transaction"""
+    system_address = model.message.SystemAddress
+    if (
+        system_address is not None
+        and not getattr(model.message, "Population", None)
+        and system_addresses.resolve(session, system_address) is None
+    ):
+        # Known-system filter: an unpopulated system we don't have won't be inserted below, so skip the lookup
+        UNKNOWN_ENTITY_DROPS.inc(schema="journal/1", entity="system")
+        return
+
+    if not in_unit_of_work(session, lambda uow: write_system_update(uow, model), "journal/1"):
+        return
+
+    if model.message.SystemAddress is not None:
+        scheduler.parent_written(session, SYSTEM, model.message.SystemAddress)
+
+
+def write_system_update(uow: UnitOfWork, model: journal_v1_0.Model) -> bool:
+    """Returns whether the system was (or now is) one we track"""
     system_name = cast(str, model.message.StarSystem)
     try:
-        system = SystemsAdapter().get_system(system_name)
+        system = SystemsAdapter(uow.session).get_system(system_name)
     except ValueError:
         # We currently only track systems with population > 0, so plenty of systems won't be found.
-        logger.debug(f"Encountered system we didn't know about! '{system_name}'")
-        return
+        # Populated ones are new colonies that haven't made it into a Spansh dump yet.
+        new_system = insert_new_system(uow, model)
+        if new_system is None:
+            logger.debug(f"Encountered system we didn't know about! '{system_name}'")
+            UNKNOWN_ENTITY_DROPS.inc(schema="journal/1", entity="system")
+            return False
+        system = new_system
 
     event_name = model.message.event.value
     logger.trace(f"Processing event {event_name}")
 
-    faction_id_mapping = model_to_faction_name_to_id_mapping(model)
+    sample_timeseries = timeseries_sampler.should_sample(system.id, model.message.timestamp)
+    TIMESERIES_SAMPLES.inc(outcome="written" if sample_timeseries else "skipped")
+
+    # Factions new to a system we already track (eg, player factions expanding) are inserted so their presences aren't
+    # dropped
+    faction_id_mapping = model_to_faction_name_to_id_mapping(uow.session, model, insert_missing=True)
     # Handle SystemsDB updates
     if event_name in ["FSDJump", "Location"]:
-        process_system_entities(session, model, system, faction_id_mapping)
+        process_system_entities(uow, model, system, faction_id_mapping, sample_timeseries)
 
     # Handle FactionPresences updates
     if event_name in ["FSDJump", "Location"]:
-        process_faction_entities(session, model, system, faction_id_mapping)
+        process_faction_entities(uow, model, system, faction_id_mapping, sample_timeseries)
+
+    # Handle Powerplay updates. Location carries the same powerplay fields, and with coalescing the latest event for a
+    # system may well be a Location.
+    if event_name in ["FSDJump", "Location"] and sample_timeseries:
+        process_powerplay_entities(uow, model, system)
+
+    return True
+
+
+def insert_new_system(uow: UnitOfWork, model: journal_v1_0.Model) -> SystemsDB | None:
+    """Inserts a populated system we don't have yet, along with its factions. Returns None for unpopulated systems."""
+    msg = model.message
+    if not getattr(msg, "Population", None) or msg.SystemAddress is None:
+        return None
+    system_address = msg.SystemAddress
+
+    factions = uow.upsert(FactionsDB, FactionsDB.to_dicts_from_eddn(model))
+    faction_id_mapping = {faction.name: faction.id for faction in factions}
+    controlling_faction_name = (getattr(msg, "SystemFaction", None) or {}).get("Name")
+    controlling_faction_id = faction_id_mapping.get(controlling_faction_name) if controlling_faction_name else None
+
+    system_dict = SystemsDB.to_dict_from_eddn(model, controlling_faction_id)
+    systems = uow.upsert(SystemsDB, [system_dict])
+    if len(systems) == 0:
+        raise RuntimeError("Upserted a system but got no object back!")
+    system_id = systems[0].id
+
+    # The ids only exist once the unit of work commits
+    def cache_ids() -> None:
+        for name, faction_id in faction_id_mapping.items():
+            faction_ids.add(name, faction_id)
+        system_addresses.add(system_address, system_id)
+
+    uow.on_commit(cache_ids)
+
+    logger.info(f"[System DB Inserted] {msg.StarSystem} - new system with {len(factions)} factions")
+    return systems[0]
+
+
+def process_docked(session: Session, model: journal_v1_0.Model) -> None:
+    """
+    Makes sure the docked station exists, then releases any market messages that were waiting on it
+
+    Handles CarrierJump too, which carries the same station fields for the carrier that jumped.
+    """
+    msg = model.message
+    market_id = getattr(msg, "MarketID", None)
+    station_name = getattr(msg, "StationName", None)
+    if market_id is None or station_name is None:
+        return
+
+    def write(uow: UnitOfWork) -> int | None:
+        station_id = market_stations.resolve(uow, market_id, cast(str, msg.StarSystem), station_name)
+        if station_id is None:
+            station_id = insert_docked_station(uow, model)
+            if station_id is None:
+                return None
+
+        if getattr(msg, "StationType", None) == "FleetCarrier" and msg.SystemAddress is not None:
+            process_carrier_position(uow, model, station_id)
+        return station_id
+
+    if in_unit_of_work(session, write, "journal/1 Docked") is None:
+        return
+
+    scheduler.parent_written(session, MARKET, market_id)
+
+
+def process_carrier_position(uow: UnitOfWork, model: journal_v1_0.Model, station_id: int) -> None:
+    """Moves the carrier in CarrierPositionsDB, recording a CarrierJumpsTimeseries row if it changed systems"""
+    session = uow.session
+    msg = model.message
+    system_address = cast(int, msg.SystemAddress)
+    previous_address, due = carrier_positions.check(session, station_id, system_address)
+    if not due:
+        CARRIER_POSITIONS.inc(outcome="unchanged")
+        return
+
+    # The first sighting of a carrier only counts as a jump if it's a CarrierJump
+    jumped = previous_address != system_address and (
+        previous_address is not None or model.message.event.value == "CarrierJump"
+    )
+    system_id = system_addresses.resolve(session, system_address)
+
+    position_dict = CarrierPositionsDB.to_dict_from_eddn(model, station_id, system_id)
+    stmt = pg_insert(CarrierPositionsDB).values(position_dict)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["station_id"],
+        set_={col: getattr(stmt.excluded, col) for col in ("system_address", "system_id", "updated_at")},
+        # Don't let a late message move the carrier back
+        where=CarrierPositionsDB.updated_at < stmt.excluded.updated_at,
+    )
+    session.execute(stmt)
+    if jumped and EDDN_RECORD_CARRIER_JUMPS:
+        jump_dict = CarrierJumpsTimeseries.to_dict_from_eddn(model, station_id, system_id)
+        session.execute(pg_insert(CarrierJumpsTimeseries).values(jump_dict))
+    uow.on_commit(lambda: carrier_positions.store(station_id, system_address))
+
+    CARRIER_POSITIONS.inc(outcome="jumped" if jumped else "refreshed")
+    if jumped:
+        carrier_name = getattr(msg, "StationName", station_id)
+        logger.info(f"[Carrier Positions DB Updated] {carrier_name} - jumped to {msg.StarSystem}")
+
+
+def insert_docked_station(uow: UnitOfWork, model: journal_v1_0.Model) -> int | None:
+    msg = model.message
+    system_name = cast(str, msg.StarSystem)
+    try:
+        system = SystemsAdapter(uow.session).get_system(system_name)
+    except ValueError:
+        if msg.SystemAddress is None:
+            UNKNOWN_ENTITY_DROPS.inc(schema="journal/1", entity="system")
+            return None
+        # Held until an FSDJump/Location for the system lets us insert it, or dropped on expiry
+        scheduler.park(SYSTEM, msg.SystemAddress, model)
+        return None
+
+    station_dict = StationsDB.to_dict_from_eddn(model, system.id)
+    station_id = uow.session.scalar(
+        pg_insert(StationsDB).values(station_dict).on_conflict_do_nothing().returning(StationsDB.id)
+    )
+    if station_id is None:
+        logger.warning(
+            f"Station '{station_dict['name']}' in '{system_name}' already exists under a different market id! "
+            f"Not adding {station_dict['market_id']}"
+        )
+        return None
+
+    market_id = station_dict["market_id"]
+    inserted_id = int(station_id)
+    uow.on_commit(lambda: market_stations.add(market_id, inserted_id))
+    logger.info(f"[Stations DB Inserted] {system_name} - {station_dict['name']} - market id {market_id}")
+    return inserted_id
+
+
+def process_scan(session: Session, model: journal_v1_0.Model) -> None:
+    msg = model.message
+    body_id = getattr(msg, "BodyID", None)
+    if msg.SystemAddress is None or body_id is None:
+        return
+
+    system_id = system_addresses.resolve(session, msg.SystemAddress)
+    if system_id is None:
+        UNKNOWN_ENTITY_DROPS.inc(schema="journal/1", entity="system")
+        return
+
+    if body_scans.offer((system_id, body_id), (system_id, model), msg.timestamp):
+        COALESCED_MESSAGES.inc(schema="journal/1", event="Scan")
+
+
+def write_body_scans(session: Session, scans: list[tuple[int, journal_v1_0.Model]]) -> None:
+    """Writes a batch of scans: one bulk UPDATE by id for bodies we know and one upsert for new ones"""
+    rows = [row for system_id, model in scans if (row := BodiesDB.to_dict_from_eddn(model, system_id)) is not None]
+    if not rows:
+        return
+
+    body_ids.load_systems(session, (row["system_id"] for row in rows))
+
+    digests: dict[tuple[int, int], str] = {}
+    updates: list[dict[str, Any]] = []
+    inserts: list[dict[str, Any]] = []
+    for row in rows:
+        key = (row["system_id"], row["body_id"])
+        digests[key] = body_digest(row)
+        cached = body_ids.get(*key)
+        if cached is None:
+            inserts.append(row)
+        elif cached[1] != digests[key]:
+            updates.append({"id": cached[0], **row})
+
+    def write(uow: UnitOfWork) -> list[BodiesDB]:
+        if updates:
+            uow.session.execute(update(BodiesDB), updates)
+        return uow.upsert(BodiesDB, inserts)
+
+    inserted = in_unit_of_work(session, write, "journal/1 Scan")
+
+    for row in updates:
+        body_ids.store(row["system_id"], row["body_id"], row["id"], digests[(row["system_id"], row["body_id"])])
+    for body in inserted:
+        if body.body_id is not None:
+            body_ids.store(body.system_id, body.body_id, body.id, digests[(body.system_id, body.body_id)])
+
+    unchanged = len(rows) - len(updates) - len(inserts)
+    BODY_ROWS.inc(len(inserts), outcome="inserted")
+    BODY_ROWS.inc(len(updates), outcome="updated")
+    BODY_ROWS.inc(unchanged, outcome="unchanged")
+    logger.info(f"[Bodies DB Updated] {len(inserts)} inserted, {len(updates)} updated, {unchanged} unchanged")
+
+
+def write_ring_signals(session: Session, signals: list[tuple[int, journal_v1_0.Model]]) -> None:
+    """Upserts the hotspots of a batch of ring signal messages, then refreshes what's derived from them"""
+    ring_ids.load_systems(session, (system_id for system_id, _ in signals))
+
+    hotspot_dicts: list[dict[str, Any]] = []
+    system_ids: set[int] = set()
+    for system_id, model in signals:
+        ring_name = cast(str, getattr(model.message, "BodyName"))
+        ring_id = ring_ids.get(system_id, ring_name)
+        if ring_id is None:
+            logger.debug(f"Encountered ring we didn't know about! '{ring_name}'")
+            UNKNOWN_ENTITY_DROPS.inc(schema="journal/1", entity="ring")
+            continue
+
+        dicts = HotspotsDB.to_dicts_from_eddn(model, ring_id)
+        if dicts:
+            hotspot_dicts.extend(dicts)
+            system_ids.add(system_id)
+
+    if not hotspot_dicts:
+        return
+
+    def write(uow: UnitOfWork) -> None:
+        uow.upsert(HotspotsDB, hotspot_dicts)
+        for refresh in hotspot_refreshers:
+            refresh(uow.session, system_ids, False)
+
+    in_unit_of_work(session, write, "journal/1 SAASignalsFound")
+    HOTSPOT_ROWS.inc(len(hotspot_dicts))
+    logger.info(f"[Hotspots DB Updated] {len(hotspot_dicts)} hotspots in {len(system_ids)} systems")
+
+
+def flush(session: Session, force: bool = False) -> None:
+    """Writes coalesced system updates, body scans and ring signals that are due, or all of them if `force`"""
+    updates = system_updates.drain() if force else system_updates.pop_due()
+    for model, lags in updates:
+        try:
+            process_system_update(session, model)
+            observe_ingest_lags(lags)
+        except Exception:
+            logger.error(traceback.format_exc())
+            session.rollback()
+
+    scans = body_scans.drain() if force else body_scans.pop_due()
+    if scans:
+        try:
+            write_body_scans(session, [scan for scan, _ in scans])
+            observe_ingest_lags(lag for _, lags in scans for lag in lags)
+        except Exception:
+            logger.error(traceback.format_exc())
+            session.rollback()
+
+    # After body scans, which may have just inserted the rings' parent bodies
+    signals = ring_signals.drain() if force else ring_signals.pop_due()
+    if signals:
+        try:
+            write_ring_signals(session, [signal for signal, _ in signals])
+            observe_ingest_lags(lag for _, lags in signals for lag in lags)
+        except Exception:
+            logger.error(traceback.format_exc())
+            session.rollback()
+
+
+hotspot_refreshers.append(ReinforcementMiningRoutesDB.refresh)
 
-    # Handle Powerplay updates
-    if event_name in ["FSDJump"]:
-        process_powerplay_entities(session, model, system)
+scheduler.register(SYSTEM, process_docked)
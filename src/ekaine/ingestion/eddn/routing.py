@@ -0,0 +1,63 @@
+from collections import Counter
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Any
+
+from ekaine.common.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class Route:
+    schema_ref: str
+    module: ModuleType
+    events: frozenset[str] | None = None  # None means every event of the schema is consumed
+
+
+class MessageRouter:
+    """Routes raw decoded EDDN messages to the generated model module that should validate them
+
+    The check only looks at `$schemaRef` and `message.event` on the raw dict so that messages nobody consumes
+    are discarded before the (comparatively expensive) Pydantic model validation.
+    """
+
+    def __init__(self) -> None:
+        self.routes: dict[str, Route] = {}
+
+        self.routed_count = 0
+        self.dropped_schemas: Counter[str] = Counter()
+        self.dropped_events: Counter[tuple[str, str]] = Counter()
+
+    def add_route(self, schema_ref: str, module: ModuleType, events: frozenset[str] | None = None) -> None:
+        self.routes[schema_ref] = Route(schema_ref, module, events)
+
+    def route(self, d: dict[str, Any]) -> Route | None:
+        schema = d.get("$schemaRef")
+        route = self.routes.get(schema) if isinstance(schema, str) else None
+        if route is None:
+            self.dropped_schemas[str(schema)] += 1
+            return None
+
+        if route.events is not None:
+            message = d.get("message")
+            event = message.get("event") if isinstance(message, dict) else None
+            if event not in route.events:
+                self.dropped_events[(route.schema_ref, str(event))] += 1
+                return None
+
+        self.routed_count += 1
+        return route
+
+    @property
+    def dropped_count(self) -> int:
+        return sum(self.dropped_schemas.values()) + sum(self.dropped_events.values())
+
+    def log_summary(self, top_n: int = 5) -> None:
+        logger.info(
+            f"[EDDN Router] Routed {self.routed_count} messages, dropped {self.dropped_count} before validation"
+        )
+        for schema, count in self.dropped_schemas.most_common(top_n):
+            logger.info(f"[EDDN Router] Dropped (no consumer for schema): {schema} - {count}")
+        for (schema, event), count in self.dropped_events.most_common(top_n):
+            logger.info(f"[EDDN Router] Dropped (no consumer for event): {schema} {event} - {count}")
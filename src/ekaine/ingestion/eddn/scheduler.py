@@ -0,0 +1,142 @@
+import time
+import traceback
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from sqlalchemy.orm import Session
+
+from ekaine.common.logging import get_logger
+from ekaine.ingestion.eddn.metrics import (
+    PENDING_CHILDREN,
+    PENDING_CHILDREN_SIZE,
+    PendingLag,
+    defer_ingest_lag,
+    ingest_lag_scope,
+)
+
+logger = get_logger(__name__)
+
+# Parent entity kinds children can wait on, and the key they're waited on by
+MARKET = "market"  # StationsDB by market id, eg for commodity messages
+SYSTEM = "system"  # SystemsDB by SystemAddress, eg for journal Docked messages
+
+
+class PendingChildren[K: Hashable, V]:
+    """Bounded map of messages waiting for a parent entity that isn't in the DB yet, keyed by the parent's key
+
+    Entries expire `ttl_seconds` after the first child for a key was parked. Past `max_keys` the oldest key is evicted,
+    and past `max_per_key` the oldest child for a key is.
+    """
+
+    def __init__(self, ttl_seconds: float = 15 * 60, max_keys: int = 10_000, max_per_key: int = 16) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self.max_per_key = max_per_key
+        self.pending: OrderedDict[K, tuple[float, list[V]]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.pending
+
+    def park(self, key: K, child: V) -> int:
+        """Parks `child` under `key`. Returns how many children were evicted to make room."""
+        evicted = 0
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = (time.monotonic(), [])
+            self.pending[key] = entry
+            while len(self.pending) > self.max_keys:
+                _, (_, children) = self.pending.popitem(last=False)
+                evicted += len(children)
+
+        children = entry[1]
+        children.append(child)
+        if len(children) > self.max_per_key:
+            children.pop(0)
+            evicted += 1
+        return evicted
+
+    def release(self, key: K) -> list[V]:
+        entry = self.pending.pop(key, None)
+        return entry[1] if entry is not None else []
+
+    def expire(self, now: float | None = None) -> int:
+        now = time.monotonic() if now is None else now
+        expired = 0
+        while self.pending:
+            key = next(iter(self.pending))
+            parked_at, children = self.pending[key]
+            if now - parked_at < self.ttl_seconds:
+                break
+            del self.pending[key]
+            expired += len(children)
+        return expired
+
+
+class WriteScheduler:
+    """Holds messages whose parent entity hasn't been written yet and replays them once it has
+
+    Processors park children with `park()` when a parent lookup misses, register how to (re)process a child with
+    `register()`, and call `parent_written()` after inserting or resolving a parent entity. A child's ingest lag is
+    observed once it's been reprocessed.
+    """
+
+    def __init__(self) -> None:
+        self.pending: dict[str, PendingChildren[Hashable, tuple[Any, PendingLag | None]]] = {}
+        self.handlers: dict[str, Callable[[Session, Any], None]] = {}
+
+    def register(
+        self,
+        kind: str,
+        handler: Callable[[Session, Any], None],
+        ttl_seconds: float = 15 * 60,
+        max_keys: int = 10_000,
+        max_per_key: int = 16,
+    ) -> None:
+        self.handlers[kind] = handler
+        self.pending[kind] = PendingChildren(ttl_seconds, max_keys, max_per_key)
+
+    def park(self, kind: str, key: Hashable, child: Any) -> None:
+        pending = self.pending[kind]
+        evicted = pending.park(key, (child, defer_ingest_lag()))
+        PENDING_CHILDREN.inc(kind=kind, outcome="parked")
+        if evicted:
+            PENDING_CHILDREN.inc(evicted, kind=kind, outcome="evicted")
+        PENDING_CHILDREN_SIZE.set(len(pending), kind=kind)
+
+    def is_waiting_on(self, kind: str, key: Hashable) -> bool:
+        return kind in self.pending and key in self.pending[kind]
+
+    def parent_written(self, session: Session, kind: str, key: Hashable) -> None:
+        pending = self.pending.get(kind)
+        if pending is None:
+            return
+
+        children = pending.release(key)
+        PENDING_CHILDREN_SIZE.set(len(pending), kind=kind)
+        if not children:
+            return
+
+        logger.info(f"[EDDN Scheduler] Releasing {len(children)} pending {kind} children for '{key}'")
+        PENDING_CHILDREN.inc(len(children), kind=kind, outcome="released")
+        for child, lag in children:
+            try:
+                with ingest_lag_scope(lag):
+                    self.handlers[kind](session, child)
+            except Exception:
+                logger.error(traceback.format_exc())
+                session.rollback()
+
+    def flush(self, session: Session, force: bool = False) -> None:
+        """Expires children that waited too long. Matches the listener's processor flush hook signature."""
+        for kind, pending in self.pending.items():
+            expired = pending.expire(float("inf") if force else None)
+            if expired:
+                PENDING_CHILDREN.inc(expired, kind=kind, outcome="expired")
+                logger.debug(f"[EDDN Scheduler] Expired {expired} pending {kind} children")
+            PENDING_CHILDREN_SIZE.set(len(pending), kind=kind)
+
+
+scheduler = WriteScheduler()
@@ -0,0 +1,133 @@
+import re
+import struct
+import time
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from ekaine.common.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Every record is a header of (receive timestamp as epoch seconds, frame length) followed by the raw frame bytes
+# exactly as received from the relay (ie, still zlib compressed).
+RECORD_HEADER = struct.Struct("<dI")
+
+SEGMENT_NAME_FMT = "eddn-{:010d}.spool"
+SEGMENT_NAME_RE = re.compile(r"^eddn-(?P<idx>\d{10})\.spool$")
+
+DEFAULT_MAX_SEGMENT_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_SEGMENT_AGE_SECONDS = 60 * 60
+
+
+def segment_index(path: Path) -> int | None:
+    match = SEGMENT_NAME_RE.match(path.name)
+    return int(match.group("idx")) if match is not None else None
+
+
+def list_segments(spool_dir: Path) -> list[Path]:
+    """Returns all spool segments in `spool_dir` ordered by segment index"""
+    if not spool_dir.exists():
+        return []
+    segments = [path for path in spool_dir.iterdir() if segment_index(path) is not None]
+    return sorted(segments, key=require_segment_index)
+
+
+def require_segment_index(path: Path) -> int:
+    idx = segment_index(path)
+    if idx is None:
+        raise ValueError(f"Not a spool segment: '{path}'")
+    return idx
+
+
+class SpoolWriter:
+    """Appends raw EDDN frames to rotating, segment-indexed spool files
+
+    Segments are rotated once they exceed `max_segment_bytes` or have been open for `max_segment_age_seconds`.
+    A new writer always starts a fresh segment after the highest existing index so previous runs are never appended to.
+    """
+
+    def __init__(
+        self,
+        spool_dir: Path,
+        max_segment_bytes: int = DEFAULT_MAX_SEGMENT_BYTES,
+        max_segment_age_seconds: float = DEFAULT_MAX_SEGMENT_AGE_SECONDS,
+    ) -> None:
+        self.spool_dir = spool_dir
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age_seconds = max_segment_age_seconds
+
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        existing = list_segments(self.spool_dir)
+        self.segment_idx = require_segment_index(existing[-1]) + 1 if existing else 0
+
+        self.file: BinaryIO | None = None
+        self.segment_bytes = 0
+        self.segment_opened_at = 0.0
+
+    @property
+    def segment_path(self) -> Path:
+        return self.spool_dir / SEGMENT_NAME_FMT.format(self.segment_idx)
+
+    def open_segment(self) -> BinaryIO:
+        self.file = open(self.segment_path, "ab")
+        self.segment_bytes = 0
+        self.segment_opened_at = time.time()
+        logger.info(f"[EDDN Spool] Writing to segment '{self.segment_path}'")
+        return self.file
+
+    def rotate(self) -> None:
+        self.close()
+        self.segment_idx += 1
+
+    def should_rotate(self, now: float) -> bool:
+        return (
+            self.segment_bytes >= self.max_segment_bytes or now - self.segment_opened_at >= self.max_segment_age_seconds
+        )
+
+    def append(self, frame: bytes, received_at: float | None = None) -> None:
+        now = received_at if received_at is not None else time.time()
+        if self.file is not None and self.should_rotate(now):
+            self.rotate()
+
+        f = self.file or self.open_segment()
+        f.write(RECORD_HEADER.pack(now, len(frame)))
+        f.write(frame)
+        f.flush()  # Frames must survive a listener crash; EDDN message rates make this cheap enough
+        self.segment_bytes += RECORD_HEADER.size + len(frame)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_segment(path: Path) -> Iterator[tuple[float, bytes]]:
+    """Yields (receive timestamp, raw frame) records from a single spool segment
+
+    A truncated trailing record (eg, the listener was killed mid-write) is logged and skipped.
+    """
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if not header:
+                return
+            if len(header) < RECORD_HEADER.size:
+                logger.warning(f"[EDDN Spool] Truncated record header at end of '{path}'")
+                return
+
+            received_at, length = RECORD_HEADER.unpack(header)
+            frame = f.read(length)
+            if len(frame) < length:
+                logger.warning(f"[EDDN Spool] Truncated record at end of '{path}'")
+                return
+
+            yield received_at, frame
+
+
+def read_spool(spool_dir: Path, start_segment: int = 0) -> Iterator[tuple[float, bytes]]:
+    """Yields (receive timestamp, raw frame) records from every segment at or after `start_segment`, in order"""
+    for path in list_segments(spool_dir):
+        if require_segment_index(path) < start_segment:
+            continue
+        logger.info(f"[EDDN Spool] Reading segment '{path}'")
+        yield from read_segment(path)
@@ -7,6 +7,8 @@ from typing import Any, Callable
 import aiofiles  # noqa: F401
 import ijson
 import yaml
+from sqlalchemy import text
+from sqlalchemy.orm import Session
 
 from ekaine.common.constants import (
     COMMODITIES_YAML_FMT,
@@ -35,20 +37,26 @@ from ekaine.postgresql.db import (
     HotspotsDB,
     MarketCommoditiesDB,
     OutfittingShipModulesDB,
+    ReinforcementMiningRoutesDB,
     RingsDB,
     ShipModulesDB,
     ShipsDB,
     ShipyardShipsDB,
     SignalsDB,
+    StationCommoditiesDB,
     StationsDB,
     SystemsDB,
 )
+from ekaine.postgresql.metrics import upsert_rows_summary
+from ekaine.postgresql.unit_of_work import UnitOfWork, in_unit_of_work
 from ekaine.postgresql.utils import upsert_all
 
 logger = get_logger(__name__)
 
 
-def insert_layer1(partitioner: "SpanshDataLayerPartitioner", input_systems: list[SystemSpansh]) -> None:
+def insert_layer1(
+    partitioner: "SpanshDataLayerPartitioner", uow: UnitOfWork, input_systems: list[SystemSpansh]
+) -> None:
     logger.info(f"Layer 1: Factions ({partitioner.total_running_str_fn()})")
 
     all_factions: dict[str, FactionSpansh | ControllingFactionSpansh] = {}
@@ -64,7 +72,7 @@ def insert_layer1(partitioner: "SpanshDataLayerPartitioner", input_systems: list
             all_factions[controlling.name] = controlling
             faction_dicts[controlling.name] = FactionsDB.to_dict_from_spansh(controlling)
 
-    faction_objects = upsert_all(partitioner.session, FactionsDB, list(faction_dicts.values()))
+    faction_objects = uow.upsert(FactionsDB, list(faction_dicts.values()))
     for faction_obj in faction_objects:
         spansh_faction = all_factions.get(faction_obj.name)
         if spansh_faction is None:
@@ -72,7 +80,9 @@ def insert_layer1(partitioner: "SpanshDataLayerPartitioner", input_systems: list
         partitioner.cache_spansh_entity_id(spansh_faction, faction_obj.id)
 
 
-def insert_layer2(partitioner: "SpanshDataLayerPartitioner", input_systems: list[SystemSpansh]) -> None:
+def insert_layer2(
+    partitioner: "SpanshDataLayerPartitioner", uow: UnitOfWork, input_systems: list[SystemSpansh]
+) -> None:
     logger.info(f"Layer 2: Systems ({partitioner.total_running_str_fn()})")
 
     systems = []
@@ -85,7 +95,7 @@ def insert_layer2(partitioner: "SpanshDataLayerPartitioner", input_systems: list
         )
         systems.append(SystemsDB.to_dict_from_spansh(system, controlling_id))
 
-    system_objects = upsert_all(partitioner.session, SystemsDB, systems)
+    system_objects = uow.upsert(SystemsDB, systems)
 
     for system_obj in system_objects:
         spansh_system = system_by_key.get(system_obj.to_cache_key())
@@ -94,7 +104,9 @@ def insert_layer2(partitioner: "SpanshDataLayerPartitioner", input_systems: list
         partitioner.cache_spansh_entity_id(spansh_system, system_obj.id)
 
 
-def insert_layer3(partitioner: "SpanshDataLayerPartitioner", input_systems: list[SystemSpansh]) -> None:
+def insert_layer3(
+    partitioner: "SpanshDataLayerPartitioner", uow: UnitOfWork, input_systems: list[SystemSpansh]
+) -> None:
     logger.info(f"Layer 3: FactionPresences and Bodies ({partitioner.total_running_str_fn()})")
 
     # --- FactionPresences ---
@@ -103,9 +115,9 @@ def insert_layer3(partitioner: "SpanshDataLayerPartitioner", input_systems: list
         system_id = partitioner.get_spansh_entity_id(system)
         for faction in system.factions or []:
             faction_id = partitioner.get_spansh_entity_id(faction)
-            presence_rows.append(FactionPresencesDB.to_dict_from_spansh(faction, system_id, faction_id))
+            presence_rows.append(FactionPresencesDB.to_dict_from_spansh(faction, system_id, faction_id, system.date))
 
-    upsert_all(partitioner.session, FactionPresencesDB, presence_rows)
+    uow.queue(FactionPresencesDB, presence_rows)
 
     # --- Bodies ---
     body_rows = []
@@ -116,11 +128,7 @@ def insert_layer3(partitioner: "SpanshDataLayerPartitioner", input_systems: list
             spansh_body_by_key[body.to_cache_key(system_id)] = body
             body_rows.append(BodiesDB.to_dict_from_spansh(body, system_id))
 
-    body_objects = upsert_all(
-        partitioner.session,
-        BodiesDB,
-        body_rows,
-    )
+    body_objects = uow.upsert(BodiesDB, body_rows)
 
     for body_obj in body_objects:
         spansh_body = spansh_body_by_key.get(body_obj.to_cache_key())
@@ -129,34 +137,68 @@ def insert_layer3(partitioner: "SpanshDataLayerPartitioner", input_systems: list
         partitioner.cache_spansh_entity_id_by_key(spansh_body.to_cache_key(body_obj.system_id), body_obj.id)
 
 
-def insert_layer4(partitioner: "SpanshDataLayerPartitioner", input_systems: list[SystemSpansh]) -> None:
+def release_moved_market_ids(session: Session, station_rows: list[dict[str, Any]]) -> None:
+    """Clears `market_id` on station rows other than the incoming ones holding the same market id
+
+    Carriers move between systems, which leaves their old row behind holding the (unique) market id.
+    """
+    incoming = [(row["market_id"], row["name"], row["owner_id"]) for row in station_rows if row["market_id"]]
+    if not incoming:
+        return
+
+    market_ids, names, owner_ids = map(list, zip(*incoming))
+    session.execute(
+        text(
+            """update core.stations as st
+            set market_id = null
+            from unnest(
+                cast(:market_ids as bigint[]), cast(:names as text[]), cast(:owner_ids as integer[])
+            ) as incoming (market_id, name, owner_id)
+            where st.market_id = incoming.market_id
+                and (st.name, st.owner_id) is distinct from (incoming.name, incoming.owner_id)"""
+        ),
+        {"market_ids": market_ids, "names": names, "owner_ids": owner_ids},
+    )
+
+
+def insert_layer4(
+    partitioner: "SpanshDataLayerPartitioner", uow: UnitOfWork, input_systems: list[SystemSpansh]
+) -> None:
     logger.info(f"Layer 4: Stations, Signals, Rings ({partitioner.total_running_str_fn()})")
 
     # --- Stations ---
     rows_by_key: dict[int, dict[str, Any]] = {}
     stations_by_key: dict[int, StationSpansh] = {}
+    key_by_market_id: dict[int, int] = {}
+
+    def add_station_row(cache_key: int, row: dict[str, Any], station: StationSpansh) -> None:
+        # Only the last row seen for a market id keeps it
+        previous_key = key_by_market_id.get(row["market_id"])
+        if previous_key is not None and previous_key != cache_key:
+            rows_by_key[previous_key]["market_id"] = None
+        key_by_market_id[row["market_id"]] = cache_key
+
+        rows_by_key[cache_key] = row
+        stations_by_key[cache_key] = station
 
     for system in input_systems:
         system_id = partitioner.get_spansh_entity_id(system)
 
         for station in system.stations or []:
             cache_key = station.to_cache_key(system_id)
-            row = StationsDB.to_dict_from_spansh(station, system_id, "system")
-
-            rows_by_key[cache_key] = row
-            stations_by_key[cache_key] = station
+            row = StationsDB.to_dict_from_spansh(station, system_id)
+            add_station_row(cache_key, row, station)
 
         for body in system.bodies or []:
             body_id = partitioner.get_spansh_entity_id_by_key(body.to_cache_key(system_id))
 
             for station in body.stations or []:
                 cache_key = station.to_cache_key(body_id)
-                row = StationsDB.to_dict_from_spansh(station, body_id, "body")
+                row = StationsDB.to_dict_from_spansh(station, system_id, body_id)
+                add_station_row(cache_key, row, station)
 
-                rows_by_key[cache_key] = row
-                stations_by_key[cache_key] = station
-
-    station_objects = upsert_all(partitioner.session, StationsDB, list(rows_by_key.values()))
+    release_moved_market_ids(uow.session, list(rows_by_key.values()))
+    station_objects = uow.upsert(StationsDB, list(rows_by_key.values()))
 
     for station_obj in station_objects:
         partitioner.cache_spansh_entity_id_by_key(station_obj.to_cache_key(), station_obj.id)
@@ -170,7 +212,7 @@ def insert_layer4(partitioner: "SpanshDataLayerPartitioner", input_systems: list
                 body_id = partitioner.get_spansh_entity_id_by_key(body.to_cache_key(system_id))
                 signal_rows.extend(SignalsDB.to_dicts_from_spansh(body.signals, body_id))
 
-    upsert_all(partitioner.session, SignalsDB, signal_rows)
+    uow.queue(SignalsDB, signal_rows)
 
     # --- Rings ---
     ring_rows = []
@@ -183,7 +225,7 @@ def insert_layer4(partitioner: "SpanshDataLayerPartitioner", input_systems: list
                 ring_rows.append(RingsDB.to_dict_from_spansh(ring, body_id))
                 rings_by_key[ring.to_cache_key(body_id)] = ring
 
-    ring_objects = upsert_all(partitioner.session, RingsDB, ring_rows)
+    ring_objects = uow.upsert(RingsDB, ring_rows)
 
     for ring_obj in ring_objects:
         spansh_ring = rings_by_key[ring_obj.to_cache_key()]
@@ -194,17 +236,24 @@ def insert_layer4(partitioner: "SpanshDataLayerPartitioner", input_systems: list
         partitioner.cache_spansh_entity_id_by_key(spansh_ring_key, ring_obj.id)
 
 
-def insert_layer5(partitioner: "SpanshDataLayerPartitioner", input_systems: list[SystemSpansh]) -> None:
+def insert_layer5(
+    partitioner: "SpanshDataLayerPartitioner", uow: UnitOfWork, input_systems: list[SystemSpansh]
+) -> None:
     logger.info(f"Layer 4: Market, Outfitting, Shipyard, Hotspots ({partitioner.total_running_str_fn()})")
 
     # --- Market ---
 
     commodities: dict[int, dict[str, Any]] = {}
+    # Every station in the batch, since layer 4 may have changed the station attributes StationCommoditiesDB copies
+    station_ids: set[int] = set()
 
     now = datetime.now(timezone.utc)
     max_data_age = timedelta(days=partitioner.max_market_data_age_days)
 
     def extract_commodities(owner_id: int, station: StationSpansh) -> None:
+        station_id = partitioner.get_spansh_entity_id_by_key(station.to_cache_key(owner_id))
+        station_ids.add(station_id)
+
         if station.market is None:
             return
         elif station.market.update_time is not None:
@@ -213,7 +262,6 @@ def insert_layer5(partitioner: "SpanshDataLayerPartitioner", input_systems: list
                 return
 
         logger.trace(pformat(station.to_cache_key_tuple(owner_id)))
-        station_id = partitioner.get_spansh_entity_id_by_key(station.to_cache_key(owner_id))
 
         for commodity in station.market.commodities or []:
             commodities[commodity.to_cache_key(station_id, commodity.symbol)] = MarketCommoditiesDB.to_dict_from_spansh(
@@ -229,11 +277,7 @@ def insert_layer5(partitioner: "SpanshDataLayerPartitioner", input_systems: list
             for station in body.stations:
                 extract_commodities(body_id, station)
 
-    upsert_all(
-        partitioner.session,
-        MarketCommoditiesDB,
-        list(commodities.values()),
-    )
+    uow.queue(MarketCommoditiesDB, list(commodities.values()))
 
     # --- Outfitting ---
 
@@ -257,7 +301,7 @@ def insert_layer5(partitioner: "SpanshDataLayerPartitioner", input_systems: list
             for station in body.stations:
                 extract_modules(body_id, station)
 
-    upsert_all(partitioner.session, OutfittingShipModulesDB, modules)
+    uow.queue(OutfittingShipModulesDB, modules)
 
     # --- Shipyard ---
     ships: list[dict[str, Any]] = []
@@ -279,7 +323,7 @@ def insert_layer5(partitioner: "SpanshDataLayerPartitioner", input_systems: list
             for station in body.stations:
                 extract_ships(body_id, station)
 
-    upsert_all(partitioner.session, ShipyardShipsDB, ships)
+    uow.queue(ShipyardShipsDB, ships)
 
     # --- Hotspots ---
     hotspots = []
@@ -296,7 +340,15 @@ def insert_layer5(partitioner: "SpanshDataLayerPartitioner", input_systems: list
                     continue
                 ring_id = partitioner.get_spansh_entity_id_by_key(ring.to_cache_key(body_id))
                 hotspots.extend(HotspotsDB.to_dicts_from_spansh(ring.signals, ring_id))
-    upsert_all(partitioner.session, HotspotsDB, hotspots)
+    uow.queue(HotspotsDB, hotspots)
+
+    # The derived tables are refreshed from what was just queued
+    uow.flush()
+    StationCommoditiesDB.refresh(uow.session, station_ids, commit=False)
+    # After the markets and hotspots it's built from. Layer 2 may also have changed the systems' powerplay state.
+    ReinforcementMiningRoutesDB.refresh(
+        uow.session, (partitioner.get_spansh_entity_id(system) for system in input_systems), commit=False
+    )
 
 
 type MetadataDB = CommoditiesDB | ShipsDB | ShipModulesDB
@@ -333,6 +385,7 @@ class SpanshDataLayerPartitioner:
       - ShipyardShipsDB
       - OutfittingShipModulesDB
       - HotspotsDB
+      - ReinforcementMiningRoutesDB
 
     """
 
@@ -425,11 +478,17 @@ class SpanshDataLayerPartitioner:
         logger.info(f"Imported {path.name} successfully")
 
     def insert_systems(self, input_systems: list[SystemSpansh]) -> None:
-        insert_layer1(self, input_systems)
-        insert_layer2(self, input_systems)
-        insert_layer3(self, input_systems)
-        insert_layer4(self, input_systems)
-        insert_layer5(self, input_systems)
+        """Writes a batch of systems and everything in them, committing once at the end"""
+
+        def insert(uow: UnitOfWork) -> None:
+            insert_layer1(self, uow, input_systems)
+            insert_layer2(self, uow, input_systems)
+            insert_layer3(self, uow, input_systems)
+            insert_layer4(self, uow, input_systems)
+            insert_layer5(self, uow, input_systems)
+
+        # A rerun after a deadlock re-caches every id, so ids cached from the rolled back attempt don't survive it
+        in_unit_of_work(self.session, insert, "spansh batch")
 
 
 class SpanshDataPipeline:
@@ -523,3 +582,5 @@ class SpanshDataPipeline:
             self.partitioner.load_metadata_yaml_into_pg(path)
 
         await self.load_and_process_data(self.process_data_batch)
+        # The importer isn't scraped, so this is where the rows upsert_all() didn't have to rewrite show up
+        logger.info(f"Upserted rows by table: {upsert_rows_summary()}")
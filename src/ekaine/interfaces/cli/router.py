@@ -1,15 +1,30 @@
 import asyncio
 import logging
 from argparse import ArgumentParser, Namespace
+from pathlib import Path
 from pprint import pformat
 from typing import Any
 
 from tabulate import tabulate
 
+from ekaine.common.constants import (
+    EDDN_ARCHIVE_DIR,
+    EDDN_CACHE_SNAPSHOT_FILE,
+    EDDN_SPOOL_DIR,
+)
 from ekaine.common.logging import configure_logger, get_logger
 from ekaine.common.timer import Timer
 from ekaine.common.utils import get_time_since
+from ekaine.ingestion.eddn.backfill import DEFAULT_CHUNK_LINES
+from ekaine.ingestion.eddn.backfill import main as invoke_eddn_backfill
+from ekaine.ingestion.eddn.benchmark import DEFAULT_RELAY_PORT
+from ekaine.ingestion.eddn.benchmark import main as invoke_eddn_benchmark
+from ekaine.ingestion.eddn.listener import EDDN_RELAY_URL
 from ekaine.ingestion.eddn.listener import main as invoke_eddn_listener
+from ekaine.ingestion.eddn.listener import main_replay as invoke_eddn_replay
+from ekaine.ingestion.eddn.partitioning import DEFAULT_PARTITION_BASE_PORT
+from ekaine.ingestion.eddn.partitioning import main as invoke_eddn_router
+from ekaine.ingestion.eddn.partitioning import partition_path, partition_url
 from ekaine.ingestion.spansh.pipeline import SpanshDataPipeline
 from ekaine.postgresql.adapter import (
     ApiCommandAdapter,
@@ -47,7 +62,35 @@ def print_hotspot_results(system_name: str, hotspots: list[HotspotResult]) -> No
 
 
 def run_eddn_listener(args: Namespace) -> None:
-    invoke_eddn_listener()
+    spool_dir = args.spool_dir if args.spool else None
+    spool_segment_bytes = args.spool_segment_mb * 1024 * 1024 if args.spool_segment_mb else None
+    relay_url = args.relay_url
+    metrics_port = args.metrics_port
+    cache_snapshot_file = EDDN_CACHE_SNAPSHOT_FILE
+    if args.partition is not None:
+        # Consumer of an eddn-router partition. Offset the metrics port, and give it its own spool and cache snapshot,
+        # so consumers on one host don't collide.
+        relay_url = partition_url(args.partition, args.partition_base_port)
+        metrics_port = metrics_port + args.partition if metrics_port is not None else None
+        spool_dir = partition_path(spool_dir, args.partition) if spool_dir is not None else None
+        cache_snapshot_file = partition_path(cache_snapshot_file, args.partition)
+    invoke_eddn_listener(spool_dir, spool_segment_bytes, relay_url, metrics_port, cache_snapshot_file)
+
+
+def run_eddn_router(args: Namespace) -> None:
+    invoke_eddn_router(args.relay_url, args.partitions, args.base_port, args.metrics_port)
+
+
+def run_eddn_replay(args: Namespace) -> None:
+    invoke_eddn_replay(args.spool_dir, args.speed, args.start_segment)
+
+
+def run_eddn_backfill(args: Namespace) -> None:
+    invoke_eddn_backfill(args.paths, args.workers, args.chunk_lines)
+
+
+def run_eddn_benchmark(args: Namespace) -> None:
+    invoke_eddn_benchmark(args.database_url, args.spool_dir, args.count, args.port, args.seed, args.allow_any_db)
 
 
 def run_import_spansh(args: Namespace) -> None:
@@ -72,8 +115,9 @@ def run_download_spansh(args: Namespace) -> None:
 
 
 def run_get_world(args: Namespace) -> None:
-    system = SystemsAdapter().get_system(args.name)
-    print(pformat(system))
+    with SystemsAdapter() as adapter:
+        system = adapter.get_system(args.name)
+        print(pformat(system))
 
 
 # API CLI
@@ -81,7 +125,8 @@ def run_get_world(args: Namespace) -> None:
 
 def run_get_acquirable_systems_in_range(args: Namespace) -> None:
     timer = Timer("Get Acquirable Systems In Range")
-    systems = ApiCommandAdapter().get_acquirable_systems_from_origin(args.system_name)
+    with ApiCommandAdapter() as adapter:
+        systems = adapter.get_acquirable_systems_from_origin(args.system_name)
 
     logger.info("")
     logger.info("====== CURRENT SYSTEM (ACQUIRING) ======")
@@ -106,7 +151,8 @@ def run_get_acquirable_systems_in_range(args: Namespace) -> None:
 
 def run_get_expandable_systems_in_range(args: Namespace) -> None:
     timer = Timer("Get Expandable Systems In Range")
-    systems = ApiCommandAdapter().get_expandable_systems_in_range(args.system_name)
+    with ApiCommandAdapter() as adapter:
+        systems = adapter.get_expandable_systems_in_range(args.system_name)
 
     logger.info("")
     logger.info("====== CURRENT UNOCCUPIED SYSTEM ======")
@@ -131,21 +177,24 @@ def run_get_expandable_systems_in_range(args: Namespace) -> None:
 
 def run_get_hotspots_by_commodities(args: Namespace) -> None:
     timer = Timer("Get Hotspots In System By Commodities")
-    hotspots = ApiCommandAdapter().get_hotspots_in_system_by_commodities(args.system_name, args.commodities_filter)
+    with ApiCommandAdapter() as adapter:
+        hotspots = adapter.get_hotspots_in_system_by_commodities(args.system_name, args.commodities_filter)
     print_hotspot_results(args.system_name, hotspots)
     timer.end()
 
 
 def run_get_hotspots(args: Namespace) -> None:
     timer = Timer("Get Hotspots In System")
-    hotspots = ApiCommandAdapter().get_hotspots_in_system(args.system_name)
+    with ApiCommandAdapter() as adapter:
+        hotspots = adapter.get_hotspots_in_system(args.system_name)
     print_hotspot_results(args.system_name, hotspots)
     timer.end()
 
 
 def run_get_mining_expandable_systems_in_range(args: Namespace) -> None:
     timer = Timer("Get Mining Expandable Systems In Range")
-    routes = ApiCommandAdapter().get_mining_expandable_systems_in_range(args.system_name)
+    with ApiCommandAdapter() as adapter:
+        routes = adapter.get_mining_expandable_systems_in_range(args.system_name)
 
     logger.info("")
     logger.info("====== DETAILS ======")
@@ -161,7 +210,8 @@ def run_get_mining_expandable_systems_in_range(args: Namespace) -> None:
 
 def run_get_systems_with_power(args: Namespace) -> None:
     timer = Timer("Get Systems With Power")
-    systems = ApiCommandAdapter().get_systems_with_power(args.power_name, args.power_states)
+    with ApiCommandAdapter() as adapter:
+        systems = adapter.get_systems_with_power(args.power_name, args.power_states)
 
     logger.info("")
     logger.info("====== DETAILS ======")
@@ -186,11 +236,11 @@ def run_get_systems_with_power(args: Namespace) -> None:
 
 
 def run_get_top_commodities(args: Namespace) -> None:
-    adapter = ApiCommandAdapter()
     timer = Timer("Get Top Commodities In System")
-    commodities = adapter.get_top_commodities_in_system(
-        args.system_name, args.comms_per_station, args.min_supplydemand, args.is_buying
-    )
+    with ApiCommandAdapter() as adapter:
+        commodities = adapter.get_top_commodities_in_system(
+            args.system_name, args.comms_per_station, args.min_supplydemand, args.is_buying
+        )
 
     logger.info("")
     logger.info("====== SYSTEM ======")
@@ -226,8 +276,63 @@ def configure_ingestion_parser(subparsers: Any) -> None:
 
     eddn_listener = ingestion_sub.add_parser("eddn-listener")
     eddn_listener.add_argument("-v", "--verbose", action="count", default=0)
+    eddn_listener.add_argument("--spool", action="store_true", default=False, help="Spool raw frames to disk")
+    eddn_listener.add_argument("--spool-dir", type=Path, default=EDDN_SPOOL_DIR)
+    eddn_listener.add_argument("--spool-segment-mb", type=int, default=None)
+    eddn_listener.add_argument("--relay-url", default=EDDN_RELAY_URL)
+    eddn_listener.add_argument(
+        "--metrics-port", type=int, default=None, help="Serve Prometheus metrics on this port (eg, 9108)"
+    )
+    eddn_listener.add_argument(
+        "--partition", type=int, default=None, help="Consume this partition of an eddn-router instead of the relay"
+    )
+    eddn_listener.add_argument("--partition-base-port", type=int, default=DEFAULT_PARTITION_BASE_PORT)
     eddn_listener.set_defaults(func=run_eddn_listener)
 
+    eddn_router = ingestion_sub.add_parser("eddn-router")
+    eddn_router.add_argument("-v", "--verbose", action="count", default=0)
+    eddn_router.add_argument("-n", "--partitions", type=int, default=2, help="Number of eddn-listener consumers")
+    eddn_router.add_argument("--relay-url", default=EDDN_RELAY_URL)
+    eddn_router.add_argument(
+        "--base-port", type=int, default=DEFAULT_PARTITION_BASE_PORT, help="Partition N is served on base port + N"
+    )
+    eddn_router.add_argument("--metrics-port", type=int, default=None)
+    eddn_router.set_defaults(func=run_eddn_router)
+
+    eddn_replay = ingestion_sub.add_parser("eddn-replay")
+    eddn_replay.add_argument("spool_dir", type=Path, nargs="?", default=EDDN_SPOOL_DIR)
+    eddn_replay.add_argument(
+        "--speed", type=float, default=0.0, help="Multiple of real time to replay at. 0 replays at max speed"
+    )
+    eddn_replay.add_argument("--start-segment", type=int, default=0)
+    eddn_replay.add_argument("-v", "--verbose", action="count", default=0)
+    eddn_replay.set_defaults(func=run_eddn_replay)
+
+    eddn_backfill = ingestion_sub.add_parser("eddn-backfill")
+    eddn_backfill.add_argument(
+        "paths", type=Path, nargs="*", default=[EDDN_ARCHIVE_DIR], help="EDDN archive files or dirs of them (JSONL)"
+    )
+    eddn_backfill.add_argument("-w", "--workers", type=int, default=4)
+    eddn_backfill.add_argument("--chunk-lines", type=int, default=DEFAULT_CHUNK_LINES)
+    eddn_backfill.add_argument("-v", "--verbose", action="count", default=0)
+    eddn_backfill.set_defaults(func=run_eddn_backfill)
+
+    eddn_benchmark = ingestion_sub.add_parser("eddn-benchmark")
+    eddn_benchmark.add_argument(
+        "--database-url", required=True, help="Scratch DB to benchmark against. It gets made up data written to it!"
+    )
+    eddn_benchmark.add_argument(
+        "--allow-any-db", action="store_true", help="Run even if the DB is remote or the configured one"
+    )
+    eddn_benchmark.add_argument(
+        "--spool-dir", type=Path, default=None, help="Replay a recorded spool instead of a synthetic corpus"
+    )
+    eddn_benchmark.add_argument("-n", "--count", type=int, default=5000, help="Messages to generate/replay")
+    eddn_benchmark.add_argument("--port", type=int, default=DEFAULT_RELAY_PORT, help="Local relay stand-in port")
+    eddn_benchmark.add_argument("--seed", type=int, default=0)
+    eddn_benchmark.add_argument("-v", "--verbose", action="count", default=0)
+    eddn_benchmark.set_defaults(func=run_eddn_benchmark)
+
     spansh_dl = ingestion_sub.add_parser("download-spansh")
     spansh_dl.add_argument("-v", "--verbose", action="count", default=0)
     spansh_dl.set_defaults(func=run_download_spansh)
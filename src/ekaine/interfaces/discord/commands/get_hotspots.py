@@ -6,6 +6,7 @@ from interactions import Embed, OptionType, SlashContext, slash_command, slash_o
 
 from ekaine.common.logging import get_logger
 from ekaine.interfaces.discord import send_error_embed
+from ekaine.postgresql import session_scope
 from ekaine.postgresql.adapter import (
     ApiCommandAdapter,
     SystemsAdapter,
@@ -22,13 +23,14 @@ logger = get_logger(__name__)
 async def get_hotspots(ctx: SlashContext, system_name: str) -> None:
     await ctx.defer(ephemeral=True)
 
-    try:
-        SystemsAdapter().get_system(system_name)
-    except ValueError:
-        await send_error_embed(ctx, f"Could not find system '{system_name}'!")
-        return
+    with session_scope() as session:
+        try:
+            SystemsAdapter(session).get_system(system_name)
+        except ValueError:
+            await send_error_embed(ctx, f"Could not find system '{system_name}'!")
+            return
 
-    hotspots = ApiCommandAdapter().get_hotspots_in_system(system_name)
+        hotspots = ApiCommandAdapter(session).get_hotspots_in_system(system_name)
 
     results_by_commodity: dict[str, list[HotspotResult]] = defaultdict(lambda: list())
     for hotspot in hotspots:
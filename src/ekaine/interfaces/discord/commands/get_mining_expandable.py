@@ -4,6 +4,7 @@ from interactions import Embed, OptionType, SlashContext, slash_command, slash_o
 
 from ekaine.common.logging import get_logger
 from ekaine.interfaces.discord import MineableDataDisplay, send_error_embed
+from ekaine.postgresql import session_scope
 from ekaine.postgresql.adapter import (
     ApiCommandAdapter,
     SystemsAdapter,
@@ -19,23 +20,24 @@ logger = get_logger(__name__)
 async def get_mining_expandable(ctx: SlashContext, system_name: str) -> None:
     await ctx.defer(ephemeral=True)
 
-    try:
-        system = SystemsAdapter().get_system(system_name)
-    except ValueError:
-        await send_error_embed(ctx, f"Could not find system '{system_name}'!")
-        return
+    with session_scope() as session:
+        try:
+            system = SystemsAdapter(session).get_system(system_name)
+        except ValueError:
+            await send_error_embed(ctx, f"Could not find system '{system_name}'!")
+            return
 
-    if system.power_state != "Unoccupied":
-        await send_error_embed(ctx, f"System '{system_name}' is not unoccupied!")
-        return
+        if system.power_state != "Unoccupied":
+            await send_error_embed(ctx, f"System '{system_name}' is not unoccupied!")
+            return
 
-    if "Nakato Kaine" not in (system.powers or []):
-        await send_error_embed(
-            ctx, f"Unoccupied system '{system_name}' is not within Councillor Kaine's sphere of influence!"
-        )
-        return
+        if "Nakato Kaine" not in (system.powers or []):
+            await send_error_embed(
+                ctx, f"Unoccupied system '{system_name}' is not within Councillor Kaine's sphere of influence!"
+            )
+            return
 
-    routes = ApiCommandAdapter().get_mining_expandable_systems_in_range(system_name)
+        routes = ApiCommandAdapter(session).get_mining_expandable_systems_in_range(system_name)
 
     mineable_data: dict[str, MineableDataDisplay] = {}
     for route in routes:
@@ -6,6 +6,7 @@ from tabulate import tabulate
 
 from ekaine.common.logging import get_logger
 from ekaine.interfaces.discord import send_error_embed
+from ekaine.postgresql import session_scope
 from ekaine.postgresql.adapter import (
     ApiCommandAdapter,
     SystemsAdapter,
@@ -36,15 +37,16 @@ async def get_top_commodities(
 ) -> None:
     await ctx.defer(ephemeral=True)
 
-    try:
-        SystemsAdapter().get_system(system_name)
-    except ValueError:
-        await send_error_embed(ctx, f"Could not find system '{system_name}'!")
-        return
+    with session_scope() as session:
+        try:
+            SystemsAdapter(session).get_system(system_name)
+        except ValueError:
+            await send_error_embed(ctx, f"Could not find system '{system_name}'!")
+            return
 
-    commodities = ApiCommandAdapter().get_top_commodities_in_system(
-        system_name, number_commodities, minimum_demand, False
-    )
+        commodities = ApiCommandAdapter(session).get_top_commodities_in_system(
+            system_name, number_commodities, minimum_demand, False
+        )
 
     commodities_by_station: dict[str, list[TopCommodityResult]] = defaultdict(lambda: list())
     for commodity in commodities:
@@ -1,4 +1,5 @@
-from typing import Sequence
+from types import TracebackType
+from typing import Iterable, Self, Sequence
 
 from sqlalchemy import RowMapping, select, text
 from sqlalchemy.orm import Session
@@ -6,7 +7,7 @@ from sqlalchemy.orm import Session
 from ekaine.common.logging import get_logger
 from ekaine.common.timer import Timer
 from ekaine.common.utils import dur_to_interval_str
-from ekaine.postgresql import SessionLocal
+from ekaine.postgresql import SessionFactory
 from ekaine.postgresql.db import FactionsDB, StationsDB, SystemsDB
 from ekaine.postgresql.types import (
     HotspotResult,
@@ -19,10 +20,30 @@ from ekaine.postgresql.types import (
 logger = get_logger(__name__)
 
 
-class ApiCommandAdapter:
-    def __init__(self) -> None:
-        self.session = SessionLocal()
+class SessionAdapter:
+    """Base for adapters, which run their queries on the session of whatever request (or listener batch) uses them
 
+    An adapter created without a session opens its own, and closes it on `close()` or when used as a context manager.
+    """
+
+    def __init__(self, session: Session | None = None) -> None:
+        self.owns_session = session is None
+        self.session = session if session is not None else SessionFactory()
+
+    def close(self) -> None:
+        if self.owns_session:
+            self.session.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc: BaseException | None, tb: TracebackType | None
+    ) -> None:
+        self.close()
+
+
+class ApiCommandAdapter(SessionAdapter):
     def get_acquirable_systems_from_origin(self, system_name: str) -> list[SystemResult]:
         stmt = text("SELECT * FROM api.get_acquirable_systems_from_origin(:system_name)")
 
@@ -157,10 +178,7 @@ class ApiCommandAdapter:
         return [TopCommodityResult(**row) for row in rows]
 
 
-class SystemsAdapter:
-    def __init__(self, session: Session | None = None) -> None:
-        self.session = session or SessionLocal()
-
+class SystemsAdapter(SessionAdapter):
     def get_system(self, system_name: str) -> SystemsDB:
         query = select(SystemsDB).where(SystemsDB.name == system_name)
         db_system = self.session.scalars(query).first()
@@ -168,11 +186,16 @@ class SystemsAdapter:
             raise ValueError(f"System '{system_name}' not found")
         return db_system
 
+    def get_systems(self, system_names: Iterable[str]) -> dict[str, int]:
+        """Returns `{name: id}` for every system in `system_names` we have, in a single query"""
+        names = sorted(set(system_names))
+        if not names:
+            return {}
+        stmt = text("SELECT name, id FROM core.systems WHERE name = ANY(:names)")
+        return {name: pk for name, pk in self.session.execute(stmt, {"names": names})}
 
-class StationsAdapter:
-    def __init__(self) -> None:
-        self.session = SessionLocal()
 
+class StationsAdapter(SessionAdapter):
     def get_station(self, station_name: str) -> StationsDB:
         query = select(StationsDB).where(StationsDB.name == station_name)
         db_station = self.session.scalars(query).first()
@@ -180,14 +203,67 @@ class StationsAdapter:
             raise ValueError(f"Station '{station_name}' not found")
         return db_station
 
+    def get_stations(self, station_keys: Iterable[tuple[str, int]]) -> dict[tuple[str, int], int]:
+        """Returns `{(name, owner_id): id}` for every station in `station_keys` we have, in a single query
 
-class FactionsAdapter:
-    def __init__(self) -> None:
-        self.session = SessionLocal()
+        Station names aren't unique, so stations are looked up by the same `(name, owner_id)` they're upserted by.
+        """
+        keys = sorted(set(station_keys))
+        if not keys:
+            return {}
+        stmt = text(
+            """SELECT st.name, st.owner_id, st.id
+            FROM core.stations st
+            JOIN unnest(CAST(:names AS text[]), CAST(:owner_ids AS integer[])) AS k(name, owner_id)
+                ON st.name = k.name AND st.owner_id = k.owner_id"""
+        )
+        result = self.session.execute(
+            stmt, {"names": [name for name, _ in keys], "owner_ids": [owner_id for _, owner_id in keys]}
+        )
+        return {(name, owner_id): pk for name, owner_id, pk in result}
 
+
+class FactionsAdapter(SessionAdapter):
     def get_faction(self, faction_name: str) -> FactionsDB:
         query = select(FactionsDB).where(FactionsDB.name == faction_name)
         db_station = self.session.scalars(query).first()
         if not db_station:
             raise ValueError(f"Faction '{faction_name}' not found")
         return db_station
+
+    def get_factions(self, faction_names: Iterable[str], insert_missing: bool = False) -> dict[str, int]:
+        """Returns `{name: id}` for every faction in `faction_names` we have, in a single query
+
+        With `insert_missing`, factions we don't have yet are inserted (by name only, the rest is filled in by the next
+        Spansh import) in that same query, plus a second one for any a concurrent writer inserted first. Nothing is
+        committed.
+        """
+        names = sorted(set(faction_names))
+        if not names:
+            return {}
+        select_stmt = text("SELECT name, id FROM core.factions WHERE name = ANY(:names)")
+        if not insert_missing:
+            return {name: pk for name, pk in self.session.execute(select_stmt, {"names": names})}
+
+        # The select only sees the factions that existed before the statement, the insert only returns the ones that
+        # didn't, so between them every name is returned once. Names are inserted in sorted order so concurrent writers
+        # take the unique index locks in the same order.
+        stmt = text(
+            """WITH inserted AS (
+                INSERT INTO core.factions (name)
+                SELECT unnest(CAST(:names AS text[]))
+                ON CONFLICT (name) DO NOTHING
+                RETURNING name, id
+            )
+            SELECT name, id FROM inserted
+            UNION ALL
+            SELECT name, id FROM core.factions WHERE name = ANY(:names)"""
+        )
+        factions = {name: pk for name, pk in self.session.execute(stmt, {"names": names})}
+
+        # A name inserted by a concurrent transaction is in neither: the insert waited for that transaction to commit
+        # and skipped the name, but the select's snapshot is from before it. A new statement sees it.
+        missing = [name for name in names if name not in factions]
+        if missing:
+            factions.update({name: pk for name, pk in self.session.execute(select_stmt, {"names": missing})})
+        return factions
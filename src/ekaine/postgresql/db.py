@@ -1,6 +1,7 @@
+import math
 from datetime import datetime
 from pprint import pformat
-from typing import Any, Optional, Tuple, Union, cast
+from typing import Any, Iterable, Optional, Tuple, Union, cast
 
 from geoalchemy2 import Geometry, WKBElement
 from geoalchemy2.shape import from_shape
@@ -12,12 +13,13 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     Text,
     UniqueConstraint,
     and_,
     literal,
-    select,
+    text,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, Session, foreign, mapped_column, relationship
@@ -44,6 +46,56 @@ from gen.eddn_models import commodity_v3_0, journal_v1_0
 logger = get_logger(__name__)
 
 
+# Journal Scan `PlanetClass`/`StarType` -> the body sub types Spansh uses. Unlisted values are kept as is.
+EDDN_PLANET_CLASSES = {
+    "Ammonia world": "Ammonia world",
+    "Earthlike body": "Earth-like world",
+    "Gas giant with ammonia based life": "Gas giant with ammonia-based life",
+    "Gas giant with water based life": "Gas giant with water-based life",
+    "Helium gas giant": "Helium gas giant",
+    "Helium rich gas giant": "Helium-rich gas giant",
+    "High metal content body": "High metal content world",
+    "Icy body": "Icy body",
+    "Metal rich body": "Metal-rich body",
+    "Rocky body": "Rocky body",
+    "Rocky ice body": "Rocky Ice world",
+    "Sudarsky class I gas giant": "Class I gas giant",
+    "Sudarsky class II gas giant": "Class II gas giant",
+    "Sudarsky class III gas giant": "Class III gas giant",
+    "Sudarsky class IV gas giant": "Class IV gas giant",
+    "Sudarsky class V gas giant": "Class V gas giant",
+    "Water giant": "Water giant",
+    "Water world": "Water world",
+}
+EDDN_STAR_TYPES = {
+    "O": "O (Blue-White) Star",
+    "B": "B (Blue-White) Star",
+    "A": "A (Blue-White) Star",
+    "F": "F (White) Star",
+    "G": "G (White-Yellow) Star",
+    "K": "K (Yellow-Orange) Star",
+    "M": "M (Red dwarf) Star",
+    "L": "L (Brown dwarf) Star",
+    "T": "T (Brown dwarf) Star",
+    "Y": "Y (Brown dwarf) Star",
+    "TTS": "T Tauri Star",
+    "N": "Neutron Star",
+    "H": "Black Hole",
+    "SupermassiveBlackHole": "Supermassive Black Hole",
+}
+EDDN_TERRAFORM_STATES = {"": "Not terraformable"}
+
+G = 9.80665  # m/s^2
+AU = 149_597_870_700  # m
+SOLAR_RADIUS = 695_700_000  # m
+ATMOSPHERE = 101_325  # Pa
+DAY = 24 * 60 * 60  # s
+
+
+def scale(value: float | None, divisor: float) -> float | None:
+    return value / divisor if value is not None else None
+
+
 class BodiesDB(BaseModelWithId):
     unique_columns = ("system_id", "name", "body_id")
     __tablename__ = "bodies"
@@ -159,6 +211,90 @@ class BodiesDB(BaseModelWithId):
             "distance_to_arrival_updated_at": getattr(spansh_body.timestamps, "distance_to_arrival", None),
         }
 
+    @staticmethod
+    def to_dict_from_eddn(eddn_model: journal_v1_0.Model, system_id: int) -> dict[str, Any] | None:
+        """
+        From a journal Scan event, in Spansh's units. Returns None for scans of belt clusters and rings.
+
+        Every column a Scan can carry is always present so rows from different bodies can share a statement.
+        """
+        msg = eddn_model.message
+        star_type = getattr(msg, "StarType", None)
+        planet_class = getattr(msg, "PlanetClass", None)
+        if star_type is None and planet_class is None:
+            return None
+
+        if star_type is not None:
+            sub_type = EDDN_STAR_TYPES.get(star_type, star_type)
+            subclass = getattr(msg, "Subclass", None)
+            spectral_class = f"{star_type}{subclass}" if subclass is not None else None
+        else:
+            sub_type = EDDN_PLANET_CLASSES.get(cast(str, planet_class), planet_class)
+            spectral_class = None
+
+        atmosphere = getattr(msg, "Atmosphere", None)
+        if atmosphere is not None:
+            atmosphere = atmosphere.removesuffix(" atmosphere").title() or "No atmosphere"
+        volcanism = getattr(msg, "Volcanism", None)
+        terraform_state = getattr(msg, "TerraformState", None)
+        reserve_level = getattr(msg, "ReserveLevel", None)
+        axial_tilt = getattr(msg, "AxialTilt", None)
+        radius = getattr(msg, "Radius", None)
+        distance_to_arrival = getattr(msg, "DistanceFromArrivalLS", None)
+
+        return {
+            "system_id": system_id,
+            "body_id": getattr(msg, "BodyID", None),
+            "name": getattr(msg, "BodyName", None),
+            "absolute_magnitude": getattr(msg, "AbsoluteMagnitude", None),
+            "age": getattr(msg, "Age_MY", None),
+            "arg_of_periapsis": getattr(msg, "Periapsis", None),
+            "ascending_node": getattr(msg, "AscendingNode", None),
+            "atmosphere_composition": {
+                component["Name"]: component["Percent"] for component in getattr(msg, "AtmosphereComposition", [])
+            }
+            or None,
+            "atmosphere_type": atmosphere,
+            "axial_tilt": math.degrees(axial_tilt) if axial_tilt is not None else None,
+            "distance_to_arrival": distance_to_arrival,
+            "earth_masses": getattr(msg, "MassEM", None),
+            "gravity": scale(getattr(msg, "SurfaceGravity", None), G),
+            "is_landable": getattr(msg, "Landable", None),
+            "luminosity": getattr(msg, "Luminosity", None),
+            "main_star": distance_to_arrival == 0 if star_type is not None else None,
+            "materials": {
+                material["Name"].capitalize(): material["Percent"] for material in getattr(msg, "Materials", [])
+            }
+            or None,
+            "mean_anomaly": getattr(msg, "MeanAnomaly", None),
+            "orbital_eccentricity": getattr(msg, "Eccentricity", None),
+            "orbital_inclination": getattr(msg, "OrbitalInclination", None),
+            "orbital_period": scale(getattr(msg, "OrbitalPeriod", None), DAY),
+            "parents": getattr(msg, "Parents", None),
+            "radius": scale(radius, 1000) if planet_class is not None else None,
+            "reserve_level": reserve_level.removesuffix("Resources") if reserve_level else None,
+            "rotational_period": scale(getattr(msg, "RotationPeriod", None), DAY),
+            "rotational_period_tidally_locked": getattr(msg, "TidalLock", None),
+            "semi_major_axis": scale(getattr(msg, "SemiMajorAxis", None), AU),
+            "solar_masses": getattr(msg, "StellarMass", None),
+            "solar_radius": scale(radius, SOLAR_RADIUS) if star_type is not None else None,
+            "solid_composition": {
+                component: fraction * 100 for component, fraction in (getattr(msg, "Composition", None) or {}).items()
+            }
+            or None,
+            "spectral_class": spectral_class,
+            "sub_type": sub_type,
+            "surface_pressure": scale(getattr(msg, "SurfacePressure", None), ATMOSPHERE),
+            "surface_temperature": getattr(msg, "SurfaceTemperature", None),
+            "terraforming_state": (
+                EDDN_TERRAFORM_STATES.get(terraform_state, terraform_state) if terraform_state is not None else None
+            ),
+            "type": "Star" if star_type is not None else "Planet",
+            "volcanism_type": (volcanism or "No volcanism") if volcanism is not None else None,
+            "mean_anomaly_updated_at": msg.timestamp,
+            "distance_to_arrival_updated_at": msg.timestamp,
+        }
+
     def __repr__(self) -> str:
         return f"<BodiesDB(id={self.id}, name={self.name!r})>"
 
@@ -255,10 +391,47 @@ class HotspotsDB(BaseModelWithId):
             for signal_type, count in spansh_signal.signals.items()
         ]
 
+    @staticmethod
+    def to_dicts_from_eddn(eddn_model: journal_v1_0.Model, ring_id: int) -> list[dict[str, Any]]:
+        """From a journal SAASignalsFound event for a ring"""
+        dicts: list[dict[str, Any]] = []
+        for signal in getattr(eddn_model.message, "Signals", None) or []:
+            symbol = get_symbol_by_eddn_name(signal["Type"])
+            if symbol is None:
+                logger.warning(f"Encountered a ring signal we didn't know about! Got: '{signal['Type']}'")
+                continue
+            dicts.append(
+                {
+                    "ring_id": ring_id,
+                    "commodity_sym": symbol,
+                    "count": signal["Count"],
+                    "updated_at": eddn_model.message.timestamp,
+                }
+            )
+        return dicts
+
     def __repr__(self) -> str:
         return f"<HotspotsDB(id={self.id}, commodity_sym={self.commodity_sym})>"
 
 
+# Journal `StationType` -> the station type names Spansh uses
+EDDN_STATION_TYPES = {
+    "AsteroidBase": "Asteroid base",
+    "Coriolis": "Coriolis Starport",
+    "CraterOutpost": "Planetary Outpost",
+    "CraterPort": "Planetary Port",
+    "FleetCarrier": "Drake-Class Carrier",
+    "MegaShip": "Mega ship",
+    "Ocellus": "Ocellus Starport",
+    "OnFootSettlement": "Settlement",
+    "Orbis": "Orbis Starport",
+    "Outpost": "Outpost",
+    "PlanetaryConstructionDepot": "Planetary Construction Depot",
+    "SpaceConstructionDepot": "Space Construction Depot",
+    "SurfaceStation": "Settlement",
+}
+
+
 class StationsDB(BaseModelWithId):
     unique_columns = ("name", "owner_id")
     __tablename__ = "stations"
@@ -267,10 +440,16 @@ class StationsDB(BaseModelWithId):
     id64: Mapped[Optional[int]] = mapped_column(BigInteger)
     id_spansh: Mapped[Optional[int]] = mapped_column(BigInteger)
     id_edsm: Mapped[Optional[int]] = mapped_column(BigInteger)
+    # Frontier market id (EDDN `marketId`/`MarketID`, Spansh station `id`). Stable for a station, including carriers
+    # that move between systems, so it's the preferred key when resolving stations from EDDN.
+    market_id: Mapped[Optional[int]] = mapped_column(BigInteger, unique=True, index=True)
     name: Mapped[str] = mapped_column(Text, nullable=False, index=True)  # Station name is NOT unique
 
     owner_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
     owner_type: Mapped[str] = mapped_column(Text, nullable=False, index=True)
+    # Denormalised from the owner so joining a station to its system doesn't go through core.bodies
+    system_id: Mapped[int] = mapped_column(ForeignKey("core.systems.id"), nullable=False, index=True)
+    body_id: Mapped[Optional[int]] = mapped_column(ForeignKey("core.bodies.id"), index=True)
 
     allegiance: Mapped[Optional[str]] = mapped_column(Text)
     controlling_faction: Mapped[Optional[str]] = mapped_column(Text)
@@ -304,7 +483,10 @@ class StationsDB(BaseModelWithId):
         return tup
 
     @staticmethod
-    def to_dict_from_spansh(spansh_station: StationSpansh, owner_id: int, owner_type: str) -> dict[str, Any]:
+    def to_dict_from_spansh(
+        spansh_station: StationSpansh, system_id: int, body_id: int | None = None
+    ) -> dict[str, Any]:
+        """Stations with a `body_id` are owned by that body, the rest by the system"""
         if spansh_station.landing_pads is not None:
             large_pads = spansh_station.landing_pads.get("large", 0)
             medium_pads = spansh_station.landing_pads.get("medium", 0)
@@ -315,8 +497,11 @@ class StationsDB(BaseModelWithId):
             small_pads = 0
         return {
             "id_spansh": spansh_station.id,
-            "owner_id": owner_id,
-            "owner_type": owner_type,
+            "market_id": spansh_station.id,
+            "owner_id": body_id if body_id is not None else system_id,
+            "owner_type": "body" if body_id is not None else "system",
+            "system_id": system_id,
+            "body_id": body_id,
             "name": spansh_station.name,
             "allegiance": spansh_station.allegiance,
             "controlling_faction": spansh_station.controlling_faction,
@@ -337,6 +522,41 @@ class StationsDB(BaseModelWithId):
             "spansh_updated_at": spansh_station.update_time,
         }
 
+    @staticmethod
+    def to_dict_from_eddn(eddn_model: journal_v1_0.Model, system_id: int) -> dict[str, Any]:
+        """From a journal Docked event. EDDN doesn't say which body a station orbits so it's owned by the system."""
+        msg = eddn_model.message
+        landing_pads = getattr(msg, "LandingPads", None) or {}
+        economies = getattr(msg, "StationEconomies", None) or []
+        primary_economy = getattr(msg, "StationEconomy", None)
+        government = getattr(msg, "StationGovernment", None)
+        station_type = getattr(msg, "StationType", None)
+
+        d = {
+            "market_id": getattr(msg, "MarketID", None),
+            "owner_id": system_id,
+            "owner_type": "system",
+            "system_id": system_id,
+            "name": getattr(msg, "StationName", None),
+            "allegiance": getattr(msg, "StationAllegiance", None),
+            "controlling_faction": (getattr(msg, "StationFaction", None) or {}).get("Name"),
+            "distance_to_arrival": getattr(msg, "DistFromStarLS", None),
+            "economies": {
+                get_symbol_by_eddn_name(economy["Name"]) or economy["Name"]: economy["Proportion"]
+                for economy in economies
+            },
+            "government": get_symbol_by_eddn_name(government) if government is not None else None,
+            "large_landing_pads": landing_pads.get("Large", 0),
+            "medium_landing_pads": landing_pads.get("Medium", 0),
+            "small_landing_pads": landing_pads.get("Small", 0),
+            "primary_economy": get_symbol_by_eddn_name(primary_economy) if primary_economy is not None else None,
+            "services": getattr(msg, "StationServices", None),
+            "type": EDDN_STATION_TYPES.get(station_type, station_type) if station_type is not None else None,
+            "eddn_updated_at": msg.timestamp,
+        }
+
+        return {k: v for k, v in d.items() if v is not None}
+
     # @staticmethod
     # def to_dicts_from_eddn(eddn_model: approachsettlement_v1_0.Model, system_id: int) -> list[dict[str, Any]]:
     #     dicts = []
@@ -372,12 +592,10 @@ class StationsDB(BaseModelWithId):
             raise Exception("Could not find a valid Session attached to StationsDB object!")
 
         parent: Optional[SystemsDB | BodiesDB] = None
-        if self.owner_type == "system":
-            parent = session.execute(select(SystemsDB).where(SystemsDB.id == self.owner_id)).scalar_one_or_none()
-        elif self.owner_type == "body":
-            parent = session.execute(select(BodiesDB).where(BodiesDB.id == self.owner_id)).scalar_one_or_none()
+        if self.body_id is not None:
+            parent = session.get(BodiesDB, self.body_id)
         else:
-            raise ValueError(f"Unknown owner_type: {self.owner_type}")
+            parent = session.get(SystemsDB, self.system_id)
 
         if parent is None:
             raise Exception("Could not find a valid parent object!")
@@ -385,6 +603,36 @@ class StationsDB(BaseModelWithId):
         return parent
 
 
+class CarrierPositionsDB(BaseModel):
+    """Where each fleet carrier currently is, kept apart from the wide `core.stations` row
+
+    Rewritten on every carrier jump or dock, so it's kept narrow with a low fillfactor, and `updated_at` isn't indexed
+    so refreshes that don't move the carrier are HOT updates.
+    """
+
+    unique_columns = ("station_id",)
+    __tablename__ = "carrier_positions"
+    __table_args__ = {"schema": "core", "postgresql_with": {"fillfactor": 50}}
+
+    station_id: Mapped[int] = mapped_column(ForeignKey("core.stations.id", ondelete="CASCADE"), primary_key=True)
+    system_address: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    system_id: Mapped[Optional[int]] = mapped_column(Integer, index=True)  # None while in a system we don't track
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    @staticmethod
+    def to_dict_from_eddn(eddn_model: journal_v1_0.Model, station_id: int, system_id: int | None) -> dict[str, Any]:
+        """From a journal CarrierJump or Docked (at a carrier) event"""
+        return {
+            "station_id": station_id,
+            "system_address": eddn_model.message.SystemAddress,
+            "system_id": system_id,
+            "updated_at": eddn_model.message.timestamp,
+        }
+
+    def __repr__(self) -> str:
+        return f"<CarrierPositionsDB(station_id={self.station_id}, system_address={self.system_address})>"
+
+
 class CommoditiesDB(BaseModel):
     unique_columns = ("symbol",)
     __tablename__ = "commodities"
@@ -411,6 +659,7 @@ class CommoditiesDB(BaseModel):
 
 class MarketCommoditiesDB(BaseModelWithId):
     unique_columns = ("station_id", "commodity_sym")
+    freshness_column = "updated_at"
     __tablename__ = "market_commodities"
     __table_args__ = (
         UniqueConstraint(*unique_columns, name="_station_market_commodity_uc"),
@@ -468,6 +717,117 @@ class MarketCommoditiesDB(BaseModelWithId):
         return f"<MarketCommoditiesDB(id={self.id}, station_id={self.station_id}, commodity_sym={self.commodity_sym})>"
 
 
+class StationCommoditiesDB(BaseModel):
+    """`core.market_commodities` rows with supply or demand, joined with their station and system
+
+    What `derived.station_commodities_view` reads from, so market queries don't redo the stations/bodies/systems joins.
+    Maintained per station by `derived.refresh_station_commodities()` whenever market rows are written.
+    """
+
+    unique_columns = ("station_id", "commodity_sym")
+    __tablename__ = "station_commodities"
+    __table_args__ = (
+        Index("ix_derived_station_commodities_commodity_sym_sell_price", "commodity_sym", "sell_price"),
+        {"schema": "derived"},
+    )
+
+    station_id: Mapped[int] = mapped_column(ForeignKey("core.stations.id", ondelete="CASCADE"), primary_key=True)
+    commodity_sym: Mapped[str] = mapped_column(Text, primary_key=True)
+
+    system_id: Mapped[Optional[int]] = mapped_column(Integer, index=True)
+    system_name: Mapped[Optional[str]] = mapped_column(Text)
+    station_name: Mapped[str] = mapped_column(Text, nullable=False)
+    type: Mapped[Optional[str]] = mapped_column(Text)
+    distance_to_arrival: Mapped[Optional[float]] = mapped_column(Float)
+
+    sell_price: Mapped[Optional[int]] = mapped_column(Integer)
+    demand: Mapped[Optional[int]] = mapped_column(Integer)
+    buy_price: Mapped[Optional[int]] = mapped_column(Integer)
+    supply: Mapped[Optional[int]] = mapped_column(Integer)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+    @staticmethod
+    def refresh(session: Session, station_ids: Iterable[int], commit: bool = True) -> None:
+        """Brings the rows for `station_ids` in line with their market, station and system rows"""
+        ids = sorted(set(station_ids))
+        if not ids:
+            return
+        session.execute(text("select derived.refresh_station_commodities(:station_ids)"), {"station_ids": ids})
+        if commit:
+            session.commit()
+
+    def __repr__(self) -> str:
+        return f"<StationCommoditiesDB(station_id={self.station_id}, commodity_sym={self.commodity_sym})>"
+
+
+class ReinforcementMiningRoutesDB(BaseModel):
+    """Ring hotspots in powerplay systems paired with a station in the same system that buys the hotspot commodity
+
+    What `api.get_top_reinforcement_mining_routes()` reads from. Maintained per system by
+    `derived.refresh_reinforcement_mining_routes()` whenever a system's hotspots, markets or powerplay state change.
+    """
+
+    unique_columns = ("ring_id", "station_id", "commodity_sym")
+    __tablename__ = "reinforcement_mining_routes"
+    __table_args__ = (
+        # Route queries filter on the power and take the most recently updated markets
+        Index("ix_derived_reinforcement_mining_routes_power_updated_at", "controlling_power", "updated_at"),
+        {"schema": "derived"},
+    )
+
+    ring_id: Mapped[int] = mapped_column(ForeignKey("core.rings.id", ondelete="CASCADE"), primary_key=True)
+    station_id: Mapped[int] = mapped_column(ForeignKey("core.stations.id", ondelete="CASCADE"), primary_key=True)
+    commodity_sym: Mapped[str] = mapped_column(Text, primary_key=True)
+
+    system_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    system_name: Mapped[str] = mapped_column(Text, nullable=False)
+    body_name: Mapped[str] = mapped_column(Text, nullable=False)
+    ring_name: Mapped[str] = mapped_column(Text, nullable=False)
+    ring_type: Mapped[Optional[str]] = mapped_column(Text)
+    count: Mapped[Optional[int]] = mapped_column(Integer)
+
+    controlling_power: Mapped[str] = mapped_column(Text, nullable=False)
+    power_state: Mapped[Optional[str]] = mapped_column(Text)
+
+    station_name: Mapped[str] = mapped_column(Text, nullable=False)
+    distance_to_arrival: Mapped[Optional[float]] = mapped_column(Float)
+    sell_price: Mapped[Optional[int]] = mapped_column(Integer)
+    demand: Mapped[Optional[int]] = mapped_column(Integer)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+    @staticmethod
+    def refresh(session: Session, system_ids: Iterable[int], commit: bool = True) -> None:
+        """Brings the routes in `system_ids` in line with their hotspot, market and system rows"""
+        ids = sorted(set(system_ids))
+        if not ids:
+            return
+        session.execute(text("select derived.refresh_reinforcement_mining_routes(:system_ids)"), {"system_ids": ids})
+        if commit:
+            session.commit()
+
+    @staticmethod
+    def refresh_stations(session: Session, station_ids: Iterable[int], commit: bool = True) -> None:
+        """`refresh()` for the systems of `station_ids`, eg after their markets were written"""
+        ids = sorted(set(station_ids))
+        if not ids:
+            return
+        session.execute(
+            text(
+                "select derived.refresh_reinforcement_mining_routes("
+                "array(select distinct st.system_id from core.stations st where st.id = any(:station_ids)))"
+            ),
+            {"station_ids": ids},
+        )
+        if commit:
+            session.commit()
+
+    def __repr__(self) -> str:
+        return (
+            f"<ReinforcementMiningRoutesDB(ring_id={self.ring_id}, station_id={self.station_id}, "
+            f"commodity_sym={self.commodity_sym})>"
+        )
+
+
 class ShipsDB(BaseModel):
     __tablename__ = "ships"
     __table_args__ = {"schema": "core"}
@@ -601,12 +961,25 @@ class FactionsDB(BaseModelWithId):
             "government": spansh_faction.government,
         }
 
+    @staticmethod
+    def to_dicts_from_eddn(eddn_model: journal_v1_0.Model) -> list[dict[str, Any]]:
+        return [
+            {
+                "name": faction.Name,
+                "allegiance": getattr(faction, "Allegiance", None),
+                "government": getattr(faction, "Government", None),
+            }
+            for faction in eddn_model.message.Factions or []
+            if faction.Name is not None
+        ]
+
     def __repr__(self) -> str:
         return f"<FactionsDB(id={self.id}, name={self.name})>"
 
 
 class FactionPresencesDB(BaseModelWithId):
     unique_columns = ("system_id", "faction_id")
+    freshness_column = "updated_at"
     __tablename__ = "faction_presences"
     __table_args__ = (
         UniqueConstraint(*unique_columns, name="_system_faction_presence_uc"),
@@ -628,12 +1001,16 @@ class FactionPresencesDB(BaseModelWithId):
     recovering_states: Mapped[Optional[list[str]]] = mapped_column(ARRAY(Text))
 
     @staticmethod
-    def to_dict_from_spansh(spansh_faction: FactionSpansh, system_id: int, faction_id: int) -> dict[str, Any]:
+    def to_dict_from_spansh(
+        spansh_faction: FactionSpansh, system_id: int, faction_id: int, updated_at: datetime
+    ) -> dict[str, Any]:
+        """Spansh factions don't have timestamps of their own, so `updated_at` is the system's"""
         return {
             "system_id": system_id,
             "faction_id": faction_id,
             "influence": spansh_faction.influence,
             "state": spansh_faction.state,
+            "updated_at": updated_at,
         }
 
     none_filter_bypass = ["happiness"]
@@ -680,8 +1057,17 @@ class FactionPresencesDB(BaseModelWithId):
 
 class SystemsDB(BaseModelWithId):
     unique_columns = ("name",)
+    freshness_column = "date"  # Spansh's last update of the system, or the EDDN message's timestamp
     __tablename__ = "systems"
-    __table_args__ = {"schema": "core"}
+    __table_args__ = (
+        Index(
+            "ix_core_systems_coords_nd",
+            "coords",
+            postgresql_using="gist",
+            postgresql_ops={"coords": "gist_geometry_ops_nd"},
+        ),
+        {"schema": "core"},
+    )
 
     name: Mapped[str] = mapped_column(Text, nullable=False, unique=True)
 
@@ -821,7 +1207,8 @@ class SystemsDB(BaseModelWithId):
             "coords": SystemsDB.starpos_to_wkbelement(starpos),
             "date": msg.timestamp,
             "government": get_symbol_by_eddn_name(cast(str, government)) if government is not None else None,
-            # "id64": msg.SystemAddress, # Never update id64?
+            # upsert_all() sets every updatable column, so leaving it out would null it
+            "id64": msg.SystemAddress,
             "name": msg.StarSystem,
             "population": getattr(msg, "Population", None),
             "primary_economy": (
@@ -0,0 +1,45 @@
+from ekaine.common.metrics import REGISTRY
+
+UPSERT_ROWS = REGISTRY.counter(
+    "db_upsert_rows_total",
+    "Rows passed to upsert_all(), by table and outcome (written/unchanged/stale)",
+    ("table", "outcome"),
+)
+DB_WRITE_RETRIES = REGISTRY.counter(
+    "db_write_retries_total",
+    "Writes retried after losing a deadlock or serialization failure to a concurrent transaction",
+    ("table", "reason"),
+)
+ISOLATED_GROUP_FAILURES = REGISTRY.counter(
+    "db_isolated_group_failures_total",
+    "Groups of writes rolled back to their savepoint without failing the rest of their unit of work",
+    ("group",),
+)
+
+DB_POOL_CHECKOUTS = REGISTRY.counter(
+    "db_pool_checkouts_total",
+    "Connections checked out of the pool, by outcome (ok/timeout/error)",
+    ("outcome",),
+)
+DB_POOL_CHECKOUT_SECONDS = REGISTRY.histogram(
+    "db_pool_checkout_seconds",
+    "Time spent getting a connection from the pool, incl. waiting for one to be returned and its pre-ping",
+)
+DB_POOL_CHECKED_OUT = REGISTRY.gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently checked out of the pool",
+)
+
+
+def upsert_rows_summary() -> str:
+    """`UPSERT_ROWS` per table as "<table>: <n> written, <n> unchanged, <n> stale", for processes that aren't scraped"""
+    totals: dict[str, dict[str, int]] = {}
+    with UPSERT_ROWS.lock:
+        items = list(UPSERT_ROWS.values.items())
+    for (table, outcome), value in items:
+        totals.setdefault(table, {})[outcome] = int(value)
+    return ", ".join(
+        f"{table}: {counts.get('written', 0)} written, {counts.get('unchanged', 0)} unchanged, "
+        f"{counts.get('stale', 0)} stale"
+        for table, counts in sorted(totals.items())
+    )
@@ -0,0 +1,42 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import PoolProxiedConnection, QueuePool
+
+from ekaine.postgresql.metrics import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_CHECKOUT_SECONDS,
+    DB_POOL_CHECKOUTS,
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """`QueuePool` that records how long checkouts take and how many connections are checked out
+
+    Slow checkouts (or timeouts) mean something is holding on to connections, usually a session that's never closed.
+    """
+
+    def connect(self) -> PoolProxiedConnection:
+        started_at = time.perf_counter()
+        outcome = "error"
+        try:
+            connection = super().connect()
+            outcome = "ok"
+            return connection
+        except PoolTimeoutError:
+            outcome = "timeout"
+            raise
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started_at)
+            DB_POOL_CHECKOUTS.inc(outcome=outcome)
+
+
+@event.listens_for(InstrumentedQueuePool, "checkout")
+def count_checkout(*args: object) -> None:
+    DB_POOL_CHECKED_OUT.inc()
+
+
+@event.listens_for(InstrumentedQueuePool, "checkin")
+def count_checkin(*args: object) -> None:
+    DB_POOL_CHECKED_OUT.dec()
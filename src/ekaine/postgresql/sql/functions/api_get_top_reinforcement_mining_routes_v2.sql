@@ -0,0 +1,54 @@
+-- v2: reads derived.reinforcement_mining_routes instead of joining systems,
+-- hotspots and markets on every call. Walks
+-- ix_derived_reinforcement_mining_routes_power_updated_at newest first.
+create or replace function api.get_top_reinforcement_mining_routes(
+    p_power_name text,
+    p_power_states text [],
+    p_commodity_names text [],
+    p_ignored_ring_types text [],
+    p_min_sell_price int,
+    p_min_demand int,
+    p_results int,
+    p_max_data_age_interval text
+)
+returns table (
+    system_name text,
+    body_name text,
+    ring_name text,
+    ring_type text,
+    commodity text,
+    count int,
+    power_state text,
+    station_name text,
+    distance_to_arrival float,
+    sell_price int,
+    demand int,
+    updated_at timestamp
+) as $$
+BEGIN
+    return query
+    select
+        mr.system_name,
+        mr.body_name,
+        mr.ring_name,
+        mr.ring_type,
+        mr.commodity_sym,
+        mr.count,
+        mr.power_state,
+        mr.station_name,
+        mr.distance_to_arrival,
+        mr.sell_price,
+        mr.demand,
+        mr.updated_at
+      from derived.reinforcement_mining_routes mr
+     where mr.controlling_power = p_power_name
+       and mr.power_state = any(p_power_states)
+       and mr.commodity_sym = any(p_commodity_names)
+       and not mr.ring_type = any(p_ignored_ring_types)
+       and mr.sell_price > p_min_sell_price -- Eventually make this % of galactic average per comm?
+       and mr.demand > p_min_demand
+       and mr.updated_at >= now() - p_max_data_age_interval::interval
+     order by mr.updated_at desc
+     limit p_results;
+END;
+$$ language plpgsql;
@@ -0,0 +1,108 @@
+-- brings derived.reinforcement_mining_routes in line with the hotspots,
+-- station markets and powerplay state of `p_system_ids`. Called after any
+-- of those are written, instead of every route query redoing the join.
+-- Only systems with a controlling power can be reinforced, so only they
+-- have routes.
+drop function if exists derived.refresh_reinforcement_mining_routes;
+create or replace function derived.refresh_reinforcement_mining_routes(
+    p_system_ids int []
+)
+returns void as $$
+    with routes as (
+        select
+            hs.ring_id,
+            sc.station_id,
+            hs.commodity_sym,
+            s.id as system_id,
+            s.name as system_name,
+            b.name as body_name,
+            r.name as ring_name,
+            r.type as ring_type,
+            hs.count,
+            s.controlling_power,
+            s.power_state,
+            sc.station_name,
+            sc.distance_to_arrival,
+            sc.sell_price,
+            sc.demand,
+            sc.updated_at
+        from core.systems s
+        inner join core.bodies b on b.system_id = s.id
+        inner join core.rings r on r.body_id = b.id
+        inner join core.hotspots hs on hs.ring_id = r.id
+        inner join derived.station_commodities sc
+            on sc.system_id = s.id
+            and sc.commodity_sym = hs.commodity_sym
+        where s.id = any(p_system_ids)
+        and s.controlling_power is not null
+        and sc.demand > 0
+    ),
+
+    removed as (
+        delete from derived.reinforcement_mining_routes mr
+        where mr.system_id = any(p_system_ids)
+        and not exists (
+            select 1
+            from routes
+            where routes.ring_id = mr.ring_id
+            and routes.station_id = mr.station_id
+            and routes.commodity_sym = mr.commodity_sym
+        )
+    )
+
+    insert into derived.reinforcement_mining_routes (
+        ring_id, station_id, commodity_sym, system_id, system_name,
+        body_name, ring_name, ring_type, count, controlling_power,
+        power_state, station_name, distance_to_arrival, sell_price, demand,
+        updated_at
+    )
+    select
+        ring_id, station_id, commodity_sym, system_id, system_name,
+        body_name, ring_name, ring_type, count, controlling_power,
+        power_state, station_name, distance_to_arrival, sell_price, demand,
+        updated_at
+    from routes
+    on conflict (ring_id, station_id, commodity_sym) do update set
+        system_id = excluded.system_id,
+        system_name = excluded.system_name,
+        body_name = excluded.body_name,
+        ring_name = excluded.ring_name,
+        ring_type = excluded.ring_type,
+        count = excluded.count,
+        controlling_power = excluded.controlling_power,
+        power_state = excluded.power_state,
+        station_name = excluded.station_name,
+        distance_to_arrival = excluded.distance_to_arrival,
+        sell_price = excluded.sell_price,
+        demand = excluded.demand,
+        updated_at = excluded.updated_at
+    where (
+        derived.reinforcement_mining_routes.system_id,
+        derived.reinforcement_mining_routes.system_name,
+        derived.reinforcement_mining_routes.body_name,
+        derived.reinforcement_mining_routes.ring_name,
+        derived.reinforcement_mining_routes.ring_type,
+        derived.reinforcement_mining_routes.count,
+        derived.reinforcement_mining_routes.controlling_power,
+        derived.reinforcement_mining_routes.power_state,
+        derived.reinforcement_mining_routes.station_name,
+        derived.reinforcement_mining_routes.distance_to_arrival,
+        derived.reinforcement_mining_routes.sell_price,
+        derived.reinforcement_mining_routes.demand,
+        derived.reinforcement_mining_routes.updated_at
+    ) is distinct from (
+        excluded.system_id,
+        excluded.system_name,
+        excluded.body_name,
+        excluded.ring_name,
+        excluded.ring_type,
+        excluded.count,
+        excluded.controlling_power,
+        excluded.power_state,
+        excluded.station_name,
+        excluded.distance_to_arrival,
+        excluded.sell_price,
+        excluded.demand,
+        excluded.updated_at
+    );
+$$ language sql;
@@ -0,0 +1,79 @@
+-- brings derived.station_commodities in line with core.market_commodities
+-- (and the station/system attributes denormalised into it) for
+-- `p_station_ids`. Called after market rows are written, instead of every
+-- market query redoing the join.
+-- v2: joins core.stations directly now that it has system_id.
+drop function if exists derived.refresh_station_commodities;
+create or replace function derived.refresh_station_commodities(
+    p_station_ids int []
+)
+returns void as $$
+    delete from derived.station_commodities sc
+    where sc.station_id = any(p_station_ids)
+    and not exists (
+        select 1
+        from core.market_commodities mc
+        where mc.station_id = sc.station_id
+        and mc.commodity_sym = sc.commodity_sym
+        and (mc.supply > 0 or mc.demand > 0)
+    );
+
+    insert into derived.station_commodities (
+        station_id, commodity_sym, system_id, system_name, station_name,
+        type, distance_to_arrival, sell_price, demand, buy_price, supply,
+        updated_at
+    )
+    select
+        mc.station_id,
+        mc.commodity_sym,
+        st.system_id,
+        sy.name,
+        st.name,
+        st.type,
+        st.distance_to_arrival,
+        mc.sell_price,
+        mc.demand,
+        mc.buy_price,
+        mc.supply,
+        mc.updated_at
+    from core.market_commodities mc
+    inner join core.stations st on mc.station_id = st.id
+    left join core.systems sy on st.system_id = sy.id
+    where mc.station_id = any(p_station_ids)
+    and (mc.supply > 0 or mc.demand > 0)
+    on conflict (station_id, commodity_sym) do update set
+        system_id = excluded.system_id,
+        system_name = excluded.system_name,
+        station_name = excluded.station_name,
+        type = excluded.type,
+        distance_to_arrival = excluded.distance_to_arrival,
+        sell_price = excluded.sell_price,
+        demand = excluded.demand,
+        buy_price = excluded.buy_price,
+        supply = excluded.supply,
+        updated_at = excluded.updated_at
+    -- Most refreshes only touch a few of a station's commodities
+    where (
+        derived.station_commodities.system_id,
+        derived.station_commodities.system_name,
+        derived.station_commodities.station_name,
+        derived.station_commodities.type,
+        derived.station_commodities.distance_to_arrival,
+        derived.station_commodities.sell_price,
+        derived.station_commodities.demand,
+        derived.station_commodities.buy_price,
+        derived.station_commodities.supply,
+        derived.station_commodities.updated_at
+    ) is distinct from (
+        excluded.system_id,
+        excluded.system_name,
+        excluded.station_name,
+        excluded.type,
+        excluded.distance_to_arrival,
+        excluded.sell_price,
+        excluded.demand,
+        excluded.buy_price,
+        excluded.supply,
+        excluded.updated_at
+    );
+$$ language sql;
@@ -0,0 +1,19 @@
+-- v2: reads from the derived.station_commodities table instead of joining
+-- core.market_commodities with the stations and systems on every query.
+-- Same columns as v1 plus station_id and system_id, appended so this can
+-- replace v1 in place.
+create or replace view derived.station_commodities_view as
+select
+    sc.system_name,
+    sc.station_name,
+    sc.type,
+    sc.distance_to_arrival,
+    sc.commodity_sym,
+    sc.sell_price,
+    sc.demand,
+    sc.buy_price,
+    sc.supply,
+    sc.updated_at,
+    sc.station_id,
+    sc.system_id
+from derived.station_commodities as sc;
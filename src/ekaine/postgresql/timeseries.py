@@ -333,3 +333,35 @@ class SystemsTimeseries(BaseModel):
 
     def __repr__(self) -> str:
         return f"<SystemsTimeseries(id={self.id}, name={self.name})>"
+
+
+class CarrierJumpsTimeseries(BaseModel):
+    # History of core.carrier_positions. Only written when a carrier is seen in a different system than before.
+    unique_columns = ("id", "timestamp")
+    __tablename__ = "carrier_jumps"
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "timestamp"),
+        {"schema": "timescaledb"},
+    )
+
+    id: Mapped[int] = mapped_column(Integer, autoincrement=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+    station_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    system_address: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    system_id: Mapped[Optional[int]] = mapped_column(Integer)
+
+    is_backfilled: Mapped[bool] = mapped_column(Boolean, nullable=False)
+
+    @staticmethod
+    def to_dict_from_eddn(eddn_model: journal_v1_0.Model, station_id: int, system_id: int | None) -> dict[str, Any]:
+        return {
+            "timestamp": eddn_model.message.timestamp,
+            "station_id": station_id,
+            "system_address": eddn_model.message.SystemAddress,
+            "system_id": system_id,
+            "is_backfilled": False,
+        }
+
+    def __repr__(self) -> str:
+        return f"<CarrierJumpsTimeseries(id={self.id}, station_id={self.station_id})>"
@@ -0,0 +1,107 @@
+import traceback
+from contextlib import contextmanager
+from types import TracebackType
+from typing import Any, Callable, Iterator, Type, cast
+
+from sqlalchemy import Table
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import sort_tables
+
+from ekaine.common.logging import get_logger
+from ekaine.postgresql import BaseModel
+from ekaine.postgresql.metrics import ISOLATED_GROUP_FAILURES
+from ekaine.postgresql.utils import retry_reason, upsert_all, with_write_retries
+
+logger = get_logger(__name__)
+
+
+class UnitOfWork:
+    """Writes everything one logical update (a Spansh batch, an EDDN message) changes in a single transaction
+
+    `upsert()` writes immediately, for rows whose ids are needed by what's written next. `queue()` defers rows until
+    `flush()` (or the commit), which writes everything queued in foreign key order. Nothing is committed until the unit
+    of work exits without an exception, so a failure part way through leaves no half-written update behind, and the
+    whole update costs a single commit. Work that should only happen once the writes are durable (eg updating caches
+    with new ids) goes in `on_commit()`.
+
+    `isolated()` runs a group of writes in a savepoint, so a group that fails is rolled back on its own instead of
+    taking the rest of the unit of work with it.
+    """
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+        self.queued: list[tuple[Type[BaseModel], list[dict[str, Any]], dict[str, Any]]] = []
+        self.commit_callbacks: list[Callable[[], None]] = []
+
+    def upsert[T: BaseModel](self, model: Type[T], rows: list[dict[str, Any]], **kwargs: Any) -> list[T]:
+        return upsert_all(self.session, model, rows, commit=False, **kwargs)
+
+    def queue(self, model: Type[BaseModel], rows: list[dict[str, Any]], **kwargs: Any) -> None:
+        if rows:
+            self.queued.append((model, rows, kwargs))
+
+    def on_commit(self, callback: Callable[[], None]) -> None:
+        self.commit_callbacks.append(callback)
+
+    def flush(self) -> None:
+        if not self.queued:
+            return
+        # Every table comes after the queued tables it has foreign keys to
+        tables = {cast(Table, model.__table__) for model, _, _ in self.queued}
+        table_order = {table: idx for idx, table in enumerate(sort_tables(tables))}
+        # Stable, so rows queued for the same table are still written in the order they were queued
+        queued = sorted(self.queued, key=lambda item: table_order[cast(Table, item[0].__table__)])
+        self.queued = []
+        for model, rows, kwargs in queued:
+            upsert_all(self.session, model, rows, commit=False, **kwargs)
+
+    @contextmanager
+    def isolated(self, group: str) -> Iterator[None]:
+        """Rolls back only this group's writes if it fails, and carries on with the rest of the unit of work
+
+        Only covers what the group writes itself (with `upsert()`), not rows it queues. Deadlocks and serialization
+        failures are still raised, since they abort the whole transaction anyway.
+        """
+        try:
+            with self.session.begin_nested():
+                yield
+        except Exception as e:
+            if isinstance(e, DBAPIError) and retry_reason(e) is not None:
+                raise
+            ISOLATED_GROUP_FAILURES.inc(group=group)
+            logger.warning(traceback.format_exc())
+            logger.warning(f"[Unit Of Work] Rolled back '{group}'")
+
+    def commit(self) -> None:
+        self.flush()
+        self.session.commit()
+        callbacks, self.commit_callbacks = self.commit_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self) -> None:
+        self.queued = []
+        self.commit_callbacks = []
+        self.session.rollback()
+
+    def __enter__(self) -> "UnitOfWork":
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc: BaseException | None, tb: TracebackType | None
+    ) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+def in_unit_of_work[R](session: Session, work: Callable[[UnitOfWork], R], label: str) -> R:
+    """Runs `work` in a unit of work and commits it, rerunning all of it if it loses a deadlock"""
+
+    def attempt() -> R:
+        with UnitOfWork(session) as uow:
+            return work(uow)
+
+    return with_write_retries(session, attempt, label)
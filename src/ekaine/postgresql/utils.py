@@ -1,23 +1,106 @@
+import io
+import json
+import random
 import re
-from typing import Any, Type
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Type, cast
 
+from sqlalchemy import ColumnElement, Table, and_, or_, select, tuple_
 from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import Session
 
 from ekaine.common.logging import get_logger
 from ekaine.postgresql import BaseModel
+from ekaine.postgresql.metrics import DB_WRITE_RETRIES, UPSERT_ROWS
 
 logger = get_logger(__name__)
 
 
+def utc_naive(value: Any) -> Any:
+    """Aware datetimes as naive UTC, so they compare with what `DateTime` columns (timestamp without time zone) hold"""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def is_stale(incoming: Any, existing: Any) -> bool:
+    """Whether a row with freshness `incoming` loses to one with `existing`. Undated rows lose to dated ones."""
+    if existing is None:
+        return False
+    return incoming is None or utc_naive(incoming) < utc_naive(existing)
+
+
+# Postgres errors that only mean we lost a race with a concurrent transaction, and the labels they're counted under
+RETRYABLE_PGCODES = {"40P01": "deadlock", "40001": "serialization"}
+MAX_WRITE_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 0.05
+RETRY_MAX_SECONDS = 2.0
+
+
+def conflict_sort_key(row: dict[str, Any], conflict_cols: list[str]) -> tuple[tuple[bool, Any], ...]:
+    """Orders rows the same way in every writer, with NULLs last like Postgres' default"""
+    return tuple((row.get(col) is None, row.get(col)) for col in conflict_cols)
+
+
+def retry_reason(e: DBAPIError) -> str | None:
+    return RETRYABLE_PGCODES.get(getattr(e.orig, "pgcode", None) or "")
+
+
+def retry_backoff_seconds(attempt: int) -> float:
+    """Exponential backoff with full jitter, so writers that failed together don't all retry together"""
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2**attempt))
+
+
+def with_write_retries[R](session: Session, write: Callable[[], R], table: str) -> R:
+    """Runs `write`, retrying it on deadlocks and serialization failures
+
+    The transaction is rolled back before each retry, so `write` has to redo (and commit) everything it needs.
+    """
+    attempt = 0
+    while True:
+        try:
+            return write()
+        except DBAPIError as e:
+            reason = retry_reason(e)
+            attempt += 1
+            if reason is None or attempt >= MAX_WRITE_ATTEMPTS:
+                raise
+            session.rollback()
+            delay = retry_backoff_seconds(attempt)
+            DB_WRITE_RETRIES.inc(table=table, reason=reason)
+            logger.warning(f"[DB Retry] {table} - {reason} on attempt {attempt}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+def is_bookkeeping_column(model: Type[BaseModel], col: str) -> bool:
+    """Columns recording when a row was last seen rather than what it holds, which every new message moves forward"""
+    return col == model.freshness_column or col == "updated_at" or col.endswith("_updated_at")
+
+
 def upsert_all[T: BaseModel](
     session: Session,
     model: Type[T],
     rows: list[dict[str, Any]],
     exclude_update_cols: list[str] | None = None,
     debug_print_extra_cols: list[str] | None = None,
+    skip_unchanged: bool = True,
+    commit: bool = True,
 ) -> list[T]:
-    """Upserts a list of dicts representing sqlalchemy objects"""
+    """Upserts a list of dicts representing sqlalchemy objects
+
+    With `skip_unchanged`, conflicting rows whose updatable columns already hold the incoming values aren't updated,
+    which saves writing a new (identical) row version, its index entries and WAL. Timestamps (the `freshness_column`
+    and `*_updated_at` columns) aren't compared, since every message carries new ones, but are still updated along
+    with the rest of a row that did change. If `model` has a `freshness_column`,
+    conflicting rows that are newer than the incoming row aren't updated either, so a Spansh dump can't overwrite what
+    EDDN wrote since (or a late EDDN message what a newer one did). Rows that weren't updated are still returned.
+
+    Rows are written in conflict key order, so concurrent writers (eg a Spansh import and the EDDN listener) lock the
+    rows they share in the same order instead of deadlocking. Deadlocks and serialization failures are retried anyway,
+    unless `commit` is False: the rest of the transaction is the caller's (usually a `UnitOfWork`), and so is retrying.
+    """
     if not rows:
         return []
     debug_print_extra_cols = debug_print_extra_cols or []
@@ -35,18 +118,107 @@ def upsert_all[T: BaseModel](
         if col.name not in conflict_cols and col.name not in exclude_update_cols
     ]
 
-    stmt = (
-        pg_insert(model)
-        .values(rows)
-        .on_conflict_do_update(
-            index_elements=conflict_cols, set_={col: getattr(pg_insert(model).excluded, col) for col in updatable_cols}
+    insert = pg_insert(model)
+    guards: list[ColumnElement[bool]] = []
+    freshness_col = model.freshness_column
+    if freshness_col is not None:
+        existing_freshness = model.__table__.c[freshness_col]
+        guards.append(or_(existing_freshness.is_(None), insert.excluded[freshness_col] >= existing_freshness))
+    compared_cols = [col for col in updatable_cols if not is_bookkeeping_column(model, col)]
+    if skip_unchanged and compared_cols:
+        guards.append(
+            tuple_(*(model.__table__.c[col] for col in compared_cols)).is_distinct_from(
+                tuple_(*(insert.excluded[col] for col in compared_cols))
+            )
         )
+    rows = sorted(rows, key=lambda row: conflict_sort_key(row, conflict_cols))
+    stmt = insert.values(rows).on_conflict_do_update(
+        index_elements=conflict_cols,
+        set_={col: insert.excluded[col] for col in updatable_cols},
+        where=and_(*guards) if guards else None,
     )
 
-    results = session.scalars(stmt.returning(model), execution_options={"populate_existing": True})
-    session.commit()
+    table = cast(Table, model.__table__).fullname
+
+    def write() -> tuple[list[T], int, int]:
+        results = list(session.scalars(stmt.returning(model), execution_options={"populate_existing": True}).all())
+        written = len(results)
+        stale = 0
+        if written < len(rows):
+            # Skipped rows aren't RETURNed, so they're read back for callers that need every row's object (eg ids)
+            written_keys = {tuple(getattr(obj, col) for col in conflict_cols) for obj in results}
+            skipped_rows = {
+                key: row for row in rows if (key := tuple(row.get(col) for col in conflict_cols)) not in written_keys
+            }
+            written_objs = set(results)
+            skipped_objs = session.scalars(
+                select(model).where(tuple_(*(getattr(model, col) for col in conflict_cols)).in_(list(skipped_rows)))
+            ).all()
+            for obj in skipped_objs:
+                if obj in written_objs:
+                    continue
+                results.append(obj)
+                row = skipped_rows.get(tuple(getattr(obj, col) for col in conflict_cols))
+                if freshness_col is not None and row is not None:
+                    stale += is_stale(row.get(freshness_col), getattr(obj, freshness_col))
+        if commit:
+            session.commit()
+        return results, written, stale
+
+    results, written, stale = with_write_retries(session, write, table) if commit else write()
+
+    unchanged = len(rows) - written - stale
+    UPSERT_ROWS.inc(written, table=table, outcome="written")
+    UPSERT_ROWS.inc(unchanged, table=table, outcome="unchanged")
+    UPSERT_ROWS.inc(stale, table=table, outcome="stale")
+    logger.debug(f"[Upsert] {table}: {written} written, {unchanged} unchanged, {stale} stale")
+
+    return results
+
+
+def copy_text_value(value: Any) -> str:
+    """Formats `value` as a field of a `COPY ... FROM STDIN` in the default text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        text = "t" if value else "f"
+    elif isinstance(value, datetime):
+        text = value.isoformat()
+    elif isinstance(value, (list, tuple)):
+        text = "{" + ",".join(copy_array_element(element) for element in value) + "}"
+    elif isinstance(value, dict):
+        text = json.dumps(value)
+    else:
+        text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def copy_array_element(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def copy_rows(session: Session, table: str, columns: list[str], rows: list[dict[str, Any]]) -> int:
+    """COPYs `rows` into `table` in the session's transaction. Columns missing from a row are written as NULL."""
+    if not rows:
+        return 0
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_text_value(row.get(col)) for col in columns))
+        buffer.write("\n")
+    buffer.seek(0)
 
-    return list(iter(results.all()))
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table} ({column_list}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+    logger.debug(f"Copied {len(rows)} rows into {table}")
+    return len(rows)
 
 
 dollar_string_to_db_val_re = re.compile(r"\$\w+_(?P<val>.*)")
@@ -0,0 +1,27 @@
+import bz2
+import gzip
+from pathlib import Path
+
+import pytest
+
+from ekaine.ingestion.eddn.archives import list_archives, read_archive_chunks
+
+
+def test_archives_are_read_in_deterministic_chunks(tmp_path: Path) -> None:
+    lines = [f'{{"idx": {idx}}}'.encode() for idx in range(5)]
+    with gzip.open(tmp_path / "Journal.FSDJump-2025-05-02.jsonl.gz", "wb") as f:
+        f.write(b"\n".join(lines[:3]) + b"\n\n")
+    with bz2.open(tmp_path / "Journal.FSDJump-2025-05-01.jsonl.bz2", "wb") as f:
+        f.write(b"\n".join(lines[3:]))
+    (tmp_path / "notes.txt").write_text("not an archive")
+
+    archives = list_archives([tmp_path])
+    assert [path.name for path in archives] == [
+        "Journal.FSDJump-2025-05-01.jsonl.bz2",
+        "Journal.FSDJump-2025-05-02.jsonl.gz",
+    ]
+    assert list(read_archive_chunks(archives[0], chunk_lines=2)) == [lines[3:]]
+    assert list(read_archive_chunks(archives[1], chunk_lines=2)) == [lines[:2], lines[2:3]]
+
+    with pytest.raises(ValueError):
+        list_archives([tmp_path / "notes.txt"])
@@ -0,0 +1,49 @@
+from pathlib import Path
+from typing import Any, cast
+
+from sqlalchemy.orm import Session
+
+from ekaine.ingestion.eddn.cache_snapshot import (
+    SNAPSHOT_HEADER,
+    CacheSnapshotter,
+    read_snapshot,
+    write_snapshot,
+)
+
+
+class FakeCache:
+    def __init__(self, name: str, ids: dict[int, int] | None = None) -> None:
+        self.name = name
+        self.ids = ids or {}
+        self.restored: dict[str, Any] | None = None
+
+    def snapshot(self) -> dict[str, Any] | None:
+        return {"keys": list(self.ids), "ids": list(self.ids.values())} if self.ids else None
+
+    def restore(self, session: Session, snapshot: dict[str, Any]) -> int | None:
+        self.restored = snapshot
+        return 0
+
+
+def test_snapshot_round_trips_and_rejects_unknown_formats(tmp_path: Path) -> None:
+    path = tmp_path / "caches.snapshot"
+    assert read_snapshot(path) is None
+
+    snapshots = {"system_addresses": {"watermark": {"max_id": 2, "count": 2}, "keys": [10, 20], "ids": [1, 2]}}
+    write_snapshot(path, snapshots)
+    assert read_snapshot(path) == snapshots
+    assert [p.name for p in tmp_path.iterdir()] == ["caches.snapshot"]
+
+    path.write_bytes(SNAPSHOT_HEADER.pack(b"EKCS", 999) + b"garbage")
+    assert read_snapshot(path) is None
+
+
+def test_snapshotter_restores_only_caches_in_the_snapshot(tmp_path: Path) -> None:
+    path = tmp_path / "caches.snapshot"
+    session = cast(Session, None)
+    CacheSnapshotter(path, [FakeCache("market_ids", {3955798530: 7}), FakeCache("factions")]).flush(session, force=True)
+
+    market_ids, factions = FakeCache("market_ids"), FakeCache("factions")
+    CacheSnapshotter(path, [market_ids, factions]).restore(session)
+    assert market_ids.restored == {"keys": [3955798530], "ids": [7]}
+    assert factions.restored is None
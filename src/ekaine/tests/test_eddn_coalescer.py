@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone
+
+from ekaine.ingestion.eddn.coalescer import LatestByKeyCoalescer, TimeseriesSampler
+from ekaine.ingestion.eddn.metrics import (
+    INGEST_LAG,
+    ingest_lag_scope,
+    observe_ingest_lags,
+)
+
+T0 = datetime(2025, 5, 22, 0, 52, 11)
+
+
+def test_coalescer_keeps_latest_value_per_key_until_due() -> None:
+    coalescer: LatestByKeyCoalescer[int, str] = LatestByKeyCoalescer(window_seconds=30)
+
+    assert not coalescer.offer(1, "first", T0)
+    assert coalescer.offer(1, "latest", T0 + timedelta(seconds=5))
+    assert coalescer.offer(1, "out of order", T0 + timedelta(seconds=1))
+    assert not coalescer.offer(2, "other", T0)
+
+    assert coalescer.pop_due() == []
+    assert [value for value, _ in coalescer.pop_due(now=float("inf"))] == ["latest", "other"]
+    assert len(coalescer) == 0
+
+
+def test_coalescer_releases_oldest_keys_past_max_pending() -> None:
+    coalescer: LatestByKeyCoalescer[int, int] = LatestByKeyCoalescer(window_seconds=30, max_pending=2)
+    for key in range(3):
+        coalescer.offer(key, key, T0)
+
+    assert [value for value, _ in coalescer.pop_due()] == [0]
+    assert [value for value, _ in coalescer.drain()] == [1, 2]
+
+
+def test_coalescer_windows_are_measured_in_message_time() -> None:
+    coalescer: LatestByKeyCoalescer[int, str] = LatestByKeyCoalescer(window_seconds=30)
+
+    # Replayed faster than real time: all offered well within 30s of wall time
+    for seconds in [0, 10, 31, 40, 65]:
+        coalescer.offer(1, f"t+{seconds}", T0 + timedelta(seconds=seconds))
+
+    # Every 30s window of message time gets its own write of its latest value
+    assert [value for value, _ in coalescer.pop_due()] == ["t+10", "t+40"]
+    assert [value for value, _ in coalescer.drain()] == ["t+65"]
+
+
+def test_coalescer_releases_keys_once_message_time_passes_their_window() -> None:
+    coalescer: LatestByKeyCoalescer[int, str] = LatestByKeyCoalescer(window_seconds=30)
+    coalescer.offer(1, "quiet system", T0)
+    coalescer.offer(2, "busy system", T0 + timedelta(seconds=10))
+    assert coalescer.pop_due() == []
+
+    coalescer.offer(2, "busy system", T0 + timedelta(seconds=35))
+    assert [value for value, _ in coalescer.pop_due()] == ["quiet system"]
+
+
+def test_coalesced_messages_lag_is_observed_once_written_not_when_offered() -> None:
+    coalescer: LatestByKeyCoalescer[int, str] = LatestByKeyCoalescer(window_seconds=30)
+    gateway_dt = datetime.now(timezone.utc) - timedelta(seconds=45)
+    observed_before = INGEST_LAG.get_count(schema="journal/1")
+
+    for value in ["first", "latest"]:
+        with ingest_lag_scope(("journal/1", gateway_dt)):
+            coalescer.offer(1, value, T0)
+    assert INGEST_LAG.get_count(schema="journal/1") == observed_before
+
+    [(value, lags)] = coalescer.drain()
+    assert value == "latest"
+    observe_ingest_lags(lags)
+    # Both messages were committed by the one write
+    assert INGEST_LAG.get_count(schema="journal/1") == observed_before + 2
+
+
+def test_timeseries_sampler_allows_one_sample_per_bucket() -> None:
+    sampler: TimeseriesSampler[int] = TimeseriesSampler(granularity_seconds=300)
+    bucket_start = datetime.fromtimestamp(300 * (int(T0.timestamp()) // 300))
+
+    assert sampler.should_sample(1, bucket_start)
+    assert not sampler.should_sample(1, bucket_start + timedelta(seconds=299))
+    assert sampler.should_sample(2, bucket_start)
+    assert sampler.should_sample(1, bucket_start + timedelta(seconds=300))
+    assert not sampler.should_sample(1, bucket_start)
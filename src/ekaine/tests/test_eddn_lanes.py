@@ -0,0 +1,44 @@
+from ekaine.ingestion.eddn.lanes import DEFAULT_LANE, SHED, Lane, PriorityLanes
+
+LANES = (
+    Lane("market", 3, ("commodity/3",)),
+    Lane("signals", 1, ("fsssignaldiscovered/1",), degraded_policy=SHED),
+    Lane(DEFAULT_LANE, 1),
+)
+
+
+def test_lanes_classify_by_schema_and_event() -> None:
+    lanes: PriorityLanes[str] = PriorityLanes(
+        (*LANES, Lane("system", 2, ("journal/1:FSDJump",))), degraded_lag_seconds=60
+    )
+
+    assert lanes.classify("commodity/3", None) == "market"
+    assert lanes.classify("journal/1", "FSDJump") == "system"
+    assert lanes.classify("journal/1", "Scan") == DEFAULT_LANE
+    assert lanes.classify("codexentry/1", None) == DEFAULT_LANE
+
+
+def test_lanes_drain_by_weight() -> None:
+    lanes: PriorityLanes[str] = PriorityLanes(LANES, degraded_lag_seconds=60)
+    for idx in range(4):
+        lanes.put("market", f"m{idx}")
+        lanes.put("signals", f"s{idx}")
+
+    order = [lanes.get(timeout=0) for _ in range(8)]
+    assert [item for _, item in filter(None, order[:4])] == ["m0", "m1", "s0", "m2"]
+    assert lanes.get(timeout=0) is None
+
+
+def test_degraded_lanes_shed_low_priority_messages() -> None:
+    lanes: PriorityLanes[str] = PriorityLanes(LANES, degraded_lag_seconds=0)
+    lanes.put("market", "queued before lag")
+    lanes.put("signals", "queued before lag")
+
+    # Anything queued makes the lag exceed a threshold of 0
+    assert not lanes.put("signals", "shed on the way in")
+    assert lanes.put("market", "kept")
+
+    drained = []
+    while (next_item := lanes.get(timeout=0)) is not None:
+        drained.append(next_item[1])
+    assert drained == ["queued before lag", "kept"]
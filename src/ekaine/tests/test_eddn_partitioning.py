@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any
+
+import zmq
+
+from ekaine.ingestion.eddn.partitioning import (
+    PartitionRouter,
+    partition_for,
+    partition_key,
+    partition_path,
+    partition_url,
+)
+
+JOURNAL_SCHEMA = "https://eddn.edcd.io/schemas/journal/1"
+COMMODITY_SCHEMA = "https://eddn.edcd.io/schemas/commodity/3"
+
+
+def journal(event: str, system_address: int, market_id: int | None = None) -> dict[str, Any]:
+    message: dict[str, Any] = {"event": event, "SystemAddress": system_address, "StarSystem": "HIP 69230"}
+    if market_id is not None:
+        message["MarketID"] = market_id
+    return {"$schemaRef": JOURNAL_SCHEMA, "message": message}
+
+
+def test_partition_key_uses_market_for_market_messages_and_system_otherwise() -> None:
+    commodity = {"$schemaRef": COMMODITY_SCHEMA, "message": {"marketId": 3955798530, "systemName": "HIP 69230"}}
+
+    assert partition_key(commodity) == 3955798530
+    assert partition_key(journal("Docked", 1487946156395, 3955798530)) == 3955798530
+    # Location carries the MarketID when docked, but its writes are to the system
+    assert partition_key(journal("Location", 1487946156395, 3955798530)) == 1487946156395
+    assert partition_for(3955798530, 4) == partition_for(3955798530, 4)
+    assert partition_for(None, 4) == 0
+
+
+def test_router_sends_every_message_for_an_entity_to_one_consumer() -> None:
+    ctx: zmq.Context[Any] = zmq.Context()
+    relay = ctx.socket(zmq.PUB)
+    relay_port = relay.bind_to_random_port("tcp://127.0.0.1")
+
+    base_port = 19510
+    router = PartitionRouter(ctx, f"tcp://127.0.0.1:{relay_port}", partitions=2, base_port=base_port)
+    stop = threading.Event()
+    thread = threading.Thread(target=router.run, args=(stop,), daemon=True)
+    thread.start()
+
+    consumers = []
+    for partition in range(2):
+        sub = ctx.socket(zmq.SUB)
+        sub.connect(partition_url(partition, base_port))
+        sub.setsockopt_string(zmq.SUBSCRIBE, "")
+        consumers.append(sub)
+    time.sleep(0.5)  # ZMQ slow joiners
+
+    messages = [journal("FSDJump", system_address) for system_address in range(20)] * 2
+    for message in messages:
+        relay.send_multipart([zlib.compress(json.dumps(message).encode("utf-8"))])
+
+    received: dict[int, list[int]] = {0: [], 1: []}
+    deadline = time.monotonic() + 5
+    while sum(map(len, received.values())) < len(messages) and time.monotonic() < deadline:
+        for partition, sub in enumerate(consumers):
+            if sub.poll(50):
+                d = json.loads(zlib.decompress(sub.recv_multipart()[0]))
+                received[partition].append(d["message"]["SystemAddress"])
+
+    stop.set()
+    thread.join()
+    for sock in [relay, *consumers]:
+        sock.close(linger=0)
+    ctx.term()
+
+    assert sorted(received[0] + received[1]) == sorted(m["message"]["SystemAddress"] for m in messages)
+    assert received[0] and received[1]
+    assert not set(received[0]) & set(received[1])
+
+
+def test_partition_path_gives_each_consumer_its_own_spool_and_snapshot() -> None:
+    assert partition_path(Path("data/eddn_spool"), 1) == Path("data/eddn_spool_p1")
+    assert partition_path(Path("data/eddn_caches.snapshot"), 0) == Path("data/eddn_caches_p0.snapshot")
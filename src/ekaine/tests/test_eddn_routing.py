@@ -0,0 +1,40 @@
+from types import ModuleType
+
+from ekaine.ingestion.eddn.routing import MessageRouter
+
+JOURNAL_SCHEMA = "https://eddn.edcd.io/schemas/journal/1"
+COMMODITY_SCHEMA = "https://eddn.edcd.io/schemas/commodity/3"
+
+
+def make_router() -> MessageRouter:
+    router = MessageRouter()
+    router.add_route(JOURNAL_SCHEMA, ModuleType("journal_v1_0"), frozenset({"FSDJump", "Location"}))
+    router.add_route(COMMODITY_SCHEMA, ModuleType("commodity_v3_0"))
+    return router
+
+
+def test_router_routes_consumed_schemas_and_events() -> None:
+    router = make_router()
+
+    journal_route = router.route({"$schemaRef": JOURNAL_SCHEMA, "message": {"event": "FSDJump"}})
+    commodity_route = router.route({"$schemaRef": COMMODITY_SCHEMA, "message": {"commodities": []}})
+
+    assert journal_route is not None and journal_route.module.__name__ == "journal_v1_0"
+    assert commodity_route is not None and commodity_route.module.__name__ == "commodity_v3_0"
+    assert router.routed_count == 2
+    assert router.dropped_count == 0
+
+
+def test_router_counts_dropped_messages() -> None:
+    router = make_router()
+
+    assert router.route({"$schemaRef": JOURNAL_SCHEMA, "message": {"event": "Scan"}}) is None
+    assert router.route({"$schemaRef": JOURNAL_SCHEMA, "message": {"event": "Scan"}}) is None
+    assert router.route({"$schemaRef": JOURNAL_SCHEMA, "message": {}}) is None
+    assert router.route({"$schemaRef": "https://eddn.edcd.io/schemas/codexentry/1", "message": {}}) is None
+
+    assert router.dropped_events[(JOURNAL_SCHEMA, "Scan")] == 2
+    assert router.dropped_events[(JOURNAL_SCHEMA, "None")] == 1
+    assert router.dropped_schemas["https://eddn.edcd.io/schemas/codexentry/1"] == 1
+    assert router.dropped_count == 4
+    assert router.routed_count == 0
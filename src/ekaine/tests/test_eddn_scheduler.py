@@ -0,0 +1,52 @@
+from datetime import datetime, timezone
+from typing import Any, cast
+
+from sqlalchemy.orm import Session
+
+from ekaine.ingestion.eddn.metrics import INGEST_LAG, ingest_lag_scope
+from ekaine.ingestion.eddn.scheduler import PendingChildren, WriteScheduler
+
+
+def test_pending_children_are_bounded_and_expire() -> None:
+    pending: PendingChildren[int, str] = PendingChildren(ttl_seconds=60, max_keys=2, max_per_key=2)
+
+    assert pending.park(1, "a") == 0
+    assert pending.park(1, "b") == 0
+    assert pending.park(1, "c") == 1  # Oldest child for the key is evicted
+    assert pending.park(2, "d") == 0
+    assert pending.park(3, "e") == 2  # Oldest key is evicted with both its children
+
+    assert 1 not in pending
+    assert pending.expire() == 0
+    assert pending.expire(now=float("inf")) == 2
+    assert len(pending) == 0
+
+
+def test_scheduler_replays_children_once_parent_is_written() -> None:
+    handled: list[Any] = []
+    scheduler = WriteScheduler()
+    scheduler.register("market", lambda session, child: handled.append(child), max_per_key=1)
+    session = cast(Session, None)
+
+    scheduler.park("market", 3955798530, "stale market")
+    scheduler.park("market", 3955798530, "latest market")
+    scheduler.parent_written(session, "market", 1234)
+    assert handled == []
+
+    scheduler.parent_written(session, "market", 3955798530)
+    assert handled == ["latest market"]
+    assert not scheduler.is_waiting_on("market", 3955798530)
+
+
+def test_parked_childs_lag_is_observed_once_it_is_replayed() -> None:
+    scheduler = WriteScheduler()
+    scheduler.register("market", lambda session, child: None)
+    session = cast(Session, None)
+    observed_before = INGEST_LAG.get_count(schema="commodity/3")
+
+    with ingest_lag_scope(("commodity/3", datetime.now(timezone.utc))):
+        scheduler.park("market", 3955798530, "market")
+    assert INGEST_LAG.get_count(schema="commodity/3") == observed_before
+
+    scheduler.parent_written(session, "market", 3955798530)
+    assert INGEST_LAG.get_count(schema="commodity/3") == observed_before + 1
@@ -0,0 +1,40 @@
+from pathlib import Path
+
+from ekaine.ingestion.eddn.spool import SpoolWriter, list_segments, read_spool
+
+
+def test_spool_round_trips_frames_across_segments(tmp_path: Path) -> None:
+    writer = SpoolWriter(tmp_path, max_segment_bytes=50)
+    frames = [bytes([idx]) * 40 for idx in range(5)]
+    for idx, frame in enumerate(frames):
+        writer.append(frame, received_at=1000.0 + idx)
+    writer.close()
+
+    assert len(list_segments(tmp_path)) == 5
+    assert list(read_spool(tmp_path)) == [(1000.0 + idx, frame) for idx, frame in enumerate(frames)]
+    assert [frame for _, frame in read_spool(tmp_path, start_segment=3)] == frames[3:]
+
+
+def test_spool_writer_never_appends_to_previous_segments(tmp_path: Path) -> None:
+    first = SpoolWriter(tmp_path)
+    first.append(b"first", received_at=1.0)
+    first.close()
+
+    second = SpoolWriter(tmp_path)
+    second.append(b"second", received_at=2.0)
+    second.close()
+
+    assert [path.name for path in list_segments(tmp_path)] == ["eddn-0000000000.spool", "eddn-0000000001.spool"]
+    assert list(read_spool(tmp_path)) == [(1.0, b"first"), (2.0, b"second")]
+
+
+def test_spool_skips_truncated_trailing_record(tmp_path: Path) -> None:
+    writer = SpoolWriter(tmp_path)
+    writer.append(b"complete", received_at=1.0)
+    writer.append(b"truncated", received_at=2.0)
+    writer.close()
+
+    segment = list_segments(tmp_path)[0]
+    segment.write_bytes(segment.read_bytes()[:-3])
+
+    assert list(read_spool(tmp_path)) == [(1.0, b"complete")]
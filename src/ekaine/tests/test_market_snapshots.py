@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from typing import Any
+
+from ekaine.ingestion.eddn.market_snapshots import MarketSnapshotCache
+
+T0 = datetime(2025, 5, 22, 0, 52, 11)
+
+
+def make_row(commodity_sym: str, sell_price: int, updated_at: datetime = T0) -> dict[str, Any]:
+    return {
+        "station_id": 1,
+        "commodity_sym": commodity_sym,
+        "buy_price": 0,
+        "sell_price": sell_price,
+        "supply": 0,
+        "demand": 100,
+        "updated_at": updated_at,
+    }
+
+
+def test_snapshot_cache_skips_duplicates_and_writes_changed_rows() -> None:
+    cache = MarketSnapshotCache()
+
+    first = cache.diff(1, [make_row("gold", 100), make_row("silver", 50)], T0)
+    assert first.outcome == "full" and len(first.rows) == 2 and first.snapshot is not None
+    cache.store(1, first.snapshot)
+
+    t1 = T0 + timedelta(minutes=1)
+    resend = cache.diff(1, [make_row("silver", 50, t1), make_row("gold", 100, t1)], t1)
+    assert resend.outcome == "duplicate" and resend.skipped
+
+    changed = cache.diff(1, [make_row("gold", 120, t1), make_row("silver", 50, t1)], t1)
+    assert changed.outcome == "changed"
+    assert [row["commodity_sym"] for row in changed.rows] == ["gold"]
+
+    stale = cache.diff(1, [make_row("gold", 90)], T0 - timedelta(minutes=1))
+    assert stale.outcome == "stale" and stale.skipped
+
+
+def test_snapshot_cache_is_bounded_and_forces_full_writes() -> None:
+    cache = MarketSnapshotCache(max_stations=2, full_write_every_seconds=0)
+    for station_id in range(3):
+        diff = cache.diff(station_id, [make_row("gold", 100)], T0)
+        assert diff.snapshot is not None
+        cache.store(station_id, diff.snapshot)
+
+    assert len(cache) == 2
+    assert cache.diff(0, [make_row("gold", 100)], T0).outcome == "full"  # Evicted
+    assert cache.diff(2, [make_row("gold", 100)], T0).outcome == "full"  # Full write interval elapsed
+
+
+def test_snapshot_cache_drops_stale_snapshots_after_the_full_write_interval() -> None:
+    cache = MarketSnapshotCache(full_write_every_seconds=0)
+    t1 = T0 + timedelta(minutes=1)
+    first = cache.diff(1, [make_row("gold", 100, t1)], t1)
+    assert first.snapshot is not None
+    cache.store(1, first.snapshot)
+
+    late = cache.diff(1, [make_row("gold", 90)], T0)
+    assert late.outcome == "stale" and late.skipped
+    assert cache.diff(1, [make_row("gold", 100, t1)], t1).outcome == "full"
@@ -0,0 +1,39 @@
+import urllib.request
+
+from ekaine.common.metrics import MetricsRegistry, start_metrics_server
+
+
+def test_registry_renders_prometheus_text_format() -> None:
+    registry = MetricsRegistry()
+    messages = registry.counter("messages_total", "Messages", ("schema",))
+    lag = registry.histogram("lag_seconds", "Lag", buckets=(1.0, 5.0))
+
+    messages.inc(schema="journal/1")
+    messages.inc(2, schema="journal/1")
+    lag.observe(0.5)
+    lag.observe(3.0)
+    lag.observe(60.0)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE messages_total counter" in lines
+    assert 'messages_total{schema="journal/1"} 3' in lines
+    assert "# TYPE lag_seconds histogram" in lines
+    assert 'lag_seconds_bucket{le="1"} 1' in lines
+    assert 'lag_seconds_bucket{le="5"} 2' in lines
+    assert 'lag_seconds_bucket{le="+Inf"} 3' in lines
+    assert "lag_seconds_sum 63.5" in lines
+    assert "lag_seconds_count 3" in lines
+
+
+def test_metrics_server_serves_registry() -> None:
+    registry = MetricsRegistry()
+    registry.gauge("queue_depth", "Depth").set(7)
+
+    server = start_metrics_server(0, "127.0.0.1", registry)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as response:
+            body = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+
+    assert "queue_depth 7" in body.splitlines()
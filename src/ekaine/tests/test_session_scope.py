@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import cast
+
+import pytest
+from sqlalchemy import QueuePool, create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from ekaine.postgresql import session_scope
+from ekaine.postgresql.metrics import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_CHECKOUT_SECONDS,
+    DB_POOL_CHECKOUTS,
+)
+from ekaine.postgresql.pool import InstrumentedQueuePool
+
+THREADS = 16
+REQUESTS_PER_THREAD = 25
+
+
+def test_session_scope_returns_every_connection_under_concurrent_load(tmp_path: Path) -> None:
+    # Far fewer connections than threads, so a leaked connection shows up as a checkout timing out
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=2,
+        max_overflow=2,
+        pool_timeout=5,
+    )
+    factory = sessionmaker(bind=engine, autoflush=False)
+    checked_out_before = DB_POOL_CHECKED_OUT.get()
+    checkouts_before = DB_POOL_CHECKOUTS.get(outcome="ok")
+    waits_before = DB_POOL_CHECKOUT_SECONDS.get_count()
+
+    def request(idx: int) -> None:
+        for n in range(REQUESTS_PER_THREAD):
+            try:
+                with session_scope(factory) as session:
+                    session.execute(text("select 1"))
+                    # Every other request fails part way through, which mustn't leak its connection either
+                    if (idx + n) % 2:
+                        raise RuntimeError("request failed")
+            except RuntimeError:
+                pass
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(request, range(THREADS)))
+
+    assert cast(QueuePool, engine.pool).checkedout() == 0
+    assert DB_POOL_CHECKED_OUT.get() == checked_out_before
+    assert DB_POOL_CHECKOUTS.get(outcome="ok") - checkouts_before == THREADS * REQUESTS_PER_THREAD
+    assert DB_POOL_CHECKOUT_SECONDS.get_count() - waits_before == THREADS * REQUESTS_PER_THREAD
+    assert DB_POOL_CHECKOUTS.get(outcome="timeout") == 0
+    engine.dispose()
+
+
+def test_session_scope_rolls_back_what_was_not_committed(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'rollback.db'}", poolclass=InstrumentedQueuePool)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    with session_scope(factory) as session:
+        session.execute(text("create table t (id integer)"))
+        session.commit()
+
+    with pytest.raises(RuntimeError):
+        with session_scope(factory) as session:
+            session.execute(text("insert into t values (1)"))
+            raise RuntimeError("request failed")
+
+    with session_scope(factory) as session:
+        assert session.execute(text("select count(*) from t")).scalar_one() == 0
+    assert cast(QueuePool, engine.pool).checkedout() == 0
+    engine.dispose()
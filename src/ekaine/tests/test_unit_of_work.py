@@ -0,0 +1,112 @@
+from pathlib import Path
+from typing import Any, cast
+
+import pytest
+from sqlalchemy import ForeignKey, MetaData, create_engine, insert, select
+from sqlalchemy.orm import Mapped, Session, mapped_column, sessionmaker
+
+from ekaine.postgresql import BaseModel, BaseModelWithId, session_scope, unit_of_work
+from ekaine.postgresql.metrics import ISOLATED_GROUP_FAILURES
+from ekaine.postgresql.unit_of_work import UnitOfWork
+
+
+class UowTestModel(BaseModelWithId):
+    """Keeps the test tables out of `BaseModel.metadata`, which migrations are autogenerated from"""
+
+    __abstract__ = True
+    metadata = MetaData()
+
+
+class UowParent(UowTestModel):
+    __tablename__ = "test_uow_parents"
+
+
+class UowChild(UowTestModel):
+    __tablename__ = "test_uow_children"
+
+    parent_id: Mapped[int] = mapped_column(ForeignKey("test_uow_parents.id"))
+
+
+class RecordingSession:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    def commit(self) -> None:
+        self.calls.append("commit")
+
+    def rollback(self) -> None:
+        self.calls.append("rollback")
+
+
+@pytest.fixture
+def session(monkeypatch: pytest.MonkeyPatch) -> RecordingSession:
+    session = RecordingSession()
+
+    def upsert_all(
+        session: RecordingSession, model: type[BaseModel], rows: list[dict[str, Any]], commit: bool = True
+    ) -> list[dict[str, Any]]:
+        session.calls.append(f"upsert {model.__name__} {len(rows)} commit={commit}")
+        return rows
+
+    monkeypatch.setattr(unit_of_work, "upsert_all", upsert_all)
+    return session
+
+
+def test_writes_are_committed_once_and_callbacks_run_after(session: RecordingSession) -> None:
+    with UnitOfWork(cast(Session, session)) as uow:
+        uow.upsert(UowParent, [{"id": 1}, {"id": 2}])
+        uow.upsert(UowParent, [{"id": 3}])
+        uow.on_commit(lambda: session.calls.append("callback"))
+        assert session.calls == ["upsert UowParent 2 commit=False", "upsert UowParent 1 commit=False"]
+
+    assert session.calls[2:] == ["commit", "callback"]
+
+
+def test_a_failure_rolls_back_everything_and_skips_callbacks(session: RecordingSession) -> None:
+    with pytest.raises(RuntimeError):
+        with UnitOfWork(cast(Session, session)) as uow:
+            uow.upsert(UowParent, [{"id": 1}])
+            uow.on_commit(lambda: session.calls.append("callback"))
+            raise RuntimeError("bad row")
+
+    assert session.calls == ["upsert UowParent 1 commit=False", "rollback"]
+
+
+def test_queued_rows_are_flushed_parents_first_before_the_commit(session: RecordingSession) -> None:
+    with UnitOfWork(cast(Session, session)) as uow:
+        uow.queue(UowChild, [{"id": 1, "parent_id": 1}])
+        uow.queue(UowParent, [{"id": 1}])
+        uow.queue(UowChild, [{"id": 2, "parent_id": 1}, {"id": 3, "parent_id": 1}])
+        uow.queue(UowParent, [])
+        assert session.calls == []
+
+    assert session.calls == [
+        "upsert UowParent 1 commit=False",
+        "upsert UowChild 1 commit=False",
+        "upsert UowChild 2 commit=False",
+        "commit",
+    ]
+
+
+def test_a_failed_isolated_group_leaves_the_rest_of_the_unit_of_work(tmp_path: Path) -> None:
+    # Without autocommit=False, pysqlite doesn't emit the BEGIN that SAVEPOINTs need
+    engine = create_engine(f"sqlite:///{tmp_path / 'uow.db'}", connect_args={"autocommit": False})
+    UowTestModel.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    failures_before = ISOLATED_GROUP_FAILURES.get(group="children")
+
+    with session_scope(factory) as session:
+        with UnitOfWork(session) as uow:
+            session.execute(insert(UowParent).values(id=1))
+            with uow.isolated("children"):
+                session.execute(insert(UowChild).values(id=1, parent_id=1))
+                raise RuntimeError("bad child")
+            with uow.isolated("more children"):
+                session.execute(insert(UowChild).values(id=2, parent_id=1))
+
+    with session_scope(factory) as session:
+        assert session.scalars(select(UowParent.id)).all() == [1]
+        assert session.scalars(select(UowChild.id)).all() == [2]
+    assert ISOLATED_GROUP_FAILURES.get(group="children") == failures_before + 1
+    assert ISOLATED_GROUP_FAILURES.get(group="more children") == 0
+    engine.dispose()
@@ -0,0 +1,73 @@
+from typing import Any, cast
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from ekaine.postgresql import utils
+from ekaine.postgresql.metrics import DB_WRITE_RETRIES
+from ekaine.postgresql.utils import conflict_sort_key, with_write_retries
+
+
+class PgError(Exception):
+    def __init__(self, pgcode: str) -> None:
+        super().__init__(pgcode)
+        self.pgcode = pgcode
+
+
+class RollbackCountingSession:
+    def __init__(self) -> None:
+        self.rollbacks = 0
+
+    def rollback(self) -> None:
+        self.rollbacks += 1
+
+
+def test_rows_are_sorted_by_conflict_key_with_nulls_last() -> None:
+    rows: list[dict[str, Any]] = [
+        {"system_id": 2, "body_id": 1},
+        {"system_id": 1, "body_id": None},
+        {"system_id": 1, "body_id": 3},
+        {"system_id": 1, "body_id": 2},
+    ]
+    ordered = sorted(rows, key=lambda row: conflict_sort_key(row, ["system_id", "body_id"]))
+    assert [(row["system_id"], row["body_id"]) for row in ordered] == [(1, 2), (1, 3), (1, None), (2, 1)]
+
+
+def test_deadlocks_are_retried_and_counted(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(utils, "retry_backoff_seconds", lambda attempt: 0.0)
+    session = RollbackCountingSession()
+    failures = [PgError("40P01"), PgError("40001")]
+
+    def write() -> str:
+        if failures:
+            raise DBAPIError("insert ...", {}, failures.pop(0))
+        return "written"
+
+    before = DB_WRITE_RETRIES.get(table="core.test", reason="deadlock")
+    assert with_write_retries(cast(Session, session), write, "core.test") == "written"
+    assert session.rollbacks == 2
+    assert DB_WRITE_RETRIES.get(table="core.test", reason="deadlock") == before + 1
+    assert DB_WRITE_RETRIES.get(table="core.test", reason="serialization") >= 1
+
+
+def test_other_errors_and_exhausted_retries_are_raised(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(utils, "retry_backoff_seconds", lambda attempt: 0.0)
+    session = RollbackCountingSession()
+
+    def unique_violation() -> None:
+        raise DBAPIError("insert ...", {}, PgError("23505"))
+
+    with pytest.raises(DBAPIError):
+        with_write_retries(cast(Session, session), unique_violation, "core.test")
+    assert session.rollbacks == 0
+
+    def deadlock() -> None:
+        raise DBAPIError("insert ...", {}, PgError("40P01"))
+
+    with pytest.raises(DBAPIError):
+        with_write_retries(cast(Session, session), deadlock, "core.test")
+    assert session.rollbacks == utils.MAX_WRITE_ATTEMPTS - 1
+
+    for attempt in range(10):
+        assert 0 <= utils.retry_backoff_seconds(attempt) <= utils.RETRY_MAX_SECONDS